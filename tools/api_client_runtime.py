@@ -0,0 +1,310 @@
+"""
+Runtime of the API clients generated by client_generator.py, copied into
+every generated package as _runtime.py. It only depends on requests.
+
+Clients share a rate limiter per access token (or per IP address, for APIs
+limited by IP) within a process, so any number of clients and threads using
+the same token together stay within the documented limit. Requests
+answered with a 429 are retried after their Retry-After, and the shared
+limiter waits it out too.
+"""
+import asyncio
+import email.utils
+import hashlib
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timezone
+from functools import partial
+from urllib.parse import quote, urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Statuses retried for every method, as the request wasn't processed, and
+# the ones retried for idempotent methods only
+RETRY_STATUSES = (429,)
+RETRY_IDEMPOTENT_STATUSES = (502, 503, 504)
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+# Seconds to wait before the first retry when there's no Retry-After, doubled for every further one
+RETRY_BACKOFF = 0.5
+
+
+class ApiError(Exception):
+    """An API request failed; status and body are those of its response."""
+
+    def __init__(self, response):
+        self.response = response
+        self.status = response.status_code
+        try:
+            self.body = response.json()
+        except ValueError:
+            self.body = response.text
+        super().__init__("{} {}: {} {}".format(
+            response.request.method, response.url, response.status_code, str(self.body)[:200]
+        ))
+
+
+class RateLimiter:
+    """
+    Lets ``rate`` requests a second through, allowing ``burst`` at once, as
+    a token bucket would (GCRA). Requests are spaced (1 + margin) / rate
+    seconds apart, so no second holds more than rate of them even if they
+    arrive up to margin seconds late. Thread safe; reserve() only takes the
+    lock briefly, so threads and event loops can share one limiter.
+    """
+
+    def __init__(self, rate, burst=1, margin=0.0):
+        self.interval = (1 + margin) / rate
+        self.burst = burst
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """Reserves the next slot and returns the seconds to wait for it."""
+        with self._lock:
+            now = time.monotonic()
+            start = max(self._next, now - (self.burst - 1) * self.interval)
+            self._next = start + self.interval
+            return max(0.0, start - now)
+
+    def pause(self, seconds):
+        """Holds back every request for seconds, e.g. after a 429."""
+        with self._lock:
+            self._next = max(self._next, time.monotonic() + seconds)
+
+    def acquire(self):
+        time.sleep(self.reserve())
+
+    async def acquire_async(self):
+        await asyncio.sleep(self.reserve())
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def shared_limiter(key, rate, burst=1, margin=0.0):
+    """Returns the process wide limiter of key, creating it on first use."""
+    with _limiters_lock:
+        if (key, rate, burst, margin) not in _limiters:
+            _limiters[key, rate, burst, margin] = RateLimiter(rate, burst, margin)
+        return _limiters[key, rate, burst, margin]
+
+
+def retry_after(response, attempt):
+    """Seconds to wait before retrying response, from its Retry-After if any."""
+    value = response.headers.get("Retry-After")
+    if value:
+        try:
+            seconds = float(value)
+        except ValueError:
+            seconds = None
+        # float() also takes "nan" and "inf", which are no delays at all
+        if seconds is not None and math.isfinite(seconds):
+            return max(0.0, seconds)
+        try:
+            date = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError, IndexError, OverflowError):
+            date = None
+        if date is not None:
+            # -0000 dates are naive, they're UTC all the same
+            if date.tzinfo is None:
+                date = date.replace(tzinfo=timezone.utc)
+            return max(0.0, date.timestamp() - time.time())
+    return RETRY_BACKOFF * 2 ** attempt
+
+
+def file_positions(files):
+    """
+    Positions of the file objects among multipart files, to rewind them to
+    before a retry, or None if one of them can't be rewound.
+    """
+    positions = []
+    items = files.items() if isinstance(files, dict) else files or ()
+    for _, value in items:
+        # Either a file, or a (filename, file, content type, headers) tuple
+        f = value[1] if isinstance(value, (tuple, list)) else value
+        if hasattr(f, "read"):
+            try:
+                if not f.seekable():
+                    return None
+                positions.append((f, f.tell()))
+            except (AttributeError, OSError, ValueError):
+                return None
+    return positions
+
+
+def decode(response):
+    if response.status_code >= 400:
+        raise ApiError(response)
+    if response.status_code == 204 or not response.content:
+        return None
+    if "json" in response.headers.get("Content-Type", ""):
+        return response.json()
+    return response.text
+
+
+class BaseClient:
+    """
+    Pooled, rate limited client of an API. Generated clients subclass it
+    and set the class attributes below from the spec and config.
+    """
+
+    # Server URL template and its variables' defaults
+    server_url = ""
+    server_variables = {}
+    # Header and value naming the API version, if the API is versioned
+    version_header = None
+    api_version = None
+    # "bearer" sends the token as "Authorization: Bearer <token>", otherwise as is in auth_header
+    auth_scheme = "bearer"
+    auth_header = "Authorization"
+    # "token" limits requests per token, "ip" per server (i.e. this machine's address)
+    limit_by = "token"
+    rate_limit = 4
+    rate_limit_burst = 1
+    rate_limit_margin = 0.0
+    retries = 3
+
+    def __init__(self, token, base_url=None, pool_size=4, timeout=30, rate_limit=None, burst=None, margin=None,
+                 retries=None, **variables):
+        self.base_url = (base_url or self.server_url.format(**dict(self.server_variables, **variables))).rstrip("/")
+        self.timeout = timeout
+        self.retries = self.retries if retries is None else retries
+        self.headers = {"Accept": "application/json"}
+        if self.version_header:
+            self.headers[self.version_header] = self.api_version
+        if token:
+            self.headers[self.auth_header] = "Bearer " + token if self.auth_scheme == "bearer" else token
+
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        if self.limit_by == "token" and token:
+            key = "token:" + hashlib.sha256(token.encode()).hexdigest()
+        else:
+            key = "ip:" + urlparse(self.base_url).netloc
+        self.limiter = shared_limiter(
+            key, rate_limit or self.rate_limit, burst or self.rate_limit_burst,
+            self.rate_limit_margin if margin is None else margin,
+        )
+
+    def url(self, path, path_params=None):
+        for name, value in (path_params or {}).items():
+            path = path.replace("{" + name + "}", quote(str(value), safe=""))
+        return self.base_url + path
+
+    def _request_args(self, method, url, params, json, files, headers):
+        headers = {name: str(value) for name, value in (headers or {}).items() if value is not None}
+        return dict(
+            method=method, url=url, json=json, files=files, timeout=self.timeout,
+            params={name: value for name, value in (params or {}).items() if value is not None},
+            headers=dict(self.headers, **headers),
+        )
+
+    def _retry_delay(self, response, attempt, positions=()):
+        """
+        Seconds to wait before retrying response, or None if it's final. The
+        files at positions are rewound for the retry; positions is None when
+        they can't be, so the request isn't retried.
+        """
+        retry = response.status_code in RETRY_STATUSES or (
+            response.status_code in RETRY_IDEMPOTENT_STATUSES and response.request.method in IDEMPOTENT_METHODS
+        )
+        if not retry or positions is None or attempt >= self.retries:
+            return None
+        delay = retry_after(response, attempt)
+        if response.status_code == 429:
+            self.limiter.pause(delay)
+        for f, position in positions:
+            f.seek(position)
+        return delay
+
+    def send(self, method, url, params=None, json=None, files=None, headers=None):
+        """
+        Sends a request, with a JSON body or multipart files, retrying 429s
+        and transient errors. Returns the response.
+        """
+        args = self._request_args(method, url, params, json, files, headers)
+        positions = file_positions(files)
+        attempt = 0
+        while True:
+            self.limiter.acquire()
+            response = self.session.request(**args)
+            delay = self._retry_delay(response, attempt, positions)
+            if delay is None:
+                return response
+            time.sleep(delay)
+            attempt += 1
+
+    def request(self, method, path, path_params=None, params=None, json=None, files=None, headers=None):
+        return decode(self.send(method, self.url(path, path_params), params, json, files, headers))
+
+    def paginate(self, method, path, path_params=None, params=None, headers=None):
+        """Yields the results of every page of a cursor paginated list, following next."""
+        url = self.url(path, path_params)
+        while url:
+            page = decode(self.send(method, url, params, headers=headers))
+            yield from page.get("results", [])
+            # next carries the cursor and every other parameter
+            url, params = page.get("next"), None
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class AsyncBaseClient(BaseClient):
+    """
+    asyncio variant of BaseClient. Waiting for the rate limiter and retries
+    doesn't block the event loop; requests run on a thread per pooled
+    connection.
+    """
+
+    def __init__(self, token, base_url=None, pool_size=4, **options):
+        super().__init__(token, base_url, pool_size, **options)
+        self.executor = ThreadPoolExecutor(pool_size)
+
+    async def send(self, method, url, params=None, json=None, files=None, headers=None):
+        args = self._request_args(method, url, params, json, files, headers)
+        positions = file_positions(files)
+        loop = asyncio.get_running_loop()
+        attempt = 0
+        while True:
+            await self.limiter.acquire_async()
+            response = await loop.run_in_executor(self.executor, partial(self.session.request, **args))
+            delay = self._retry_delay(response, attempt, positions)
+            if delay is None:
+                return response
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def request(self, method, path, path_params=None, params=None, json=None, files=None, headers=None):
+        return decode(await self.send(method, self.url(path, path_params), params, json, files, headers))
+
+    async def paginate(self, method, path, path_params=None, params=None, headers=None):
+        url = self.url(path, path_params)
+        while url:
+            page = decode(await self.send(method, url, params, headers=headers))
+            for item in page.get("results", []):
+                yield item
+            url, params = page.get("next"), None
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+        super().close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
@@ -0,0 +1,207 @@
+"""
+Local stand-in for the Admin and Campaigns APIs.
+
+Answers every operation of a processed spec with an example response and
+enforces the documented rate limit, so generated clients (see
+client_generator.py) can be run and timed without a store:
+
+    python api_server.py ../public/api/admin/unstable.yaml --port 8200 --items 95
+    Client("token", base_url="http://127.0.0.1:8200").orders_list_iter()
+
+Like the APIs, each access token (the Authorization header) or IP address,
+as API_RATE_LIMIT_BY says for the API, may send API_RATE_LIMIT requests in
+any second; further requests are answered with a 429 and a Retry-After.
+Cursor paginated lists hold --items results, --page-size per page.
+--latency delays every accepted request.
+"""
+import argparse
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+
+from client_generator import page_item_schema, response_schema
+from config import API_RATE_LIMIT, API_RATE_LIMIT_BY
+from shards import operations
+from spec_diff import load_spec
+from webhooks import SchemaResolver
+
+
+class ApiServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, spec, rate_limit=API_RATE_LIMIT, limit_by="token", items=50, page_size=20,
+                 latency=0.0, quiet=False):
+        super().__init__(address, ApiRequestHandler)
+        self.spec = spec
+        self.rate_limit = rate_limit
+        self.limit_by = limit_by
+        self.items = items
+        self.page_size = page_size
+        self.latency = latency
+        self.quiet = quiet
+        self.resolver = SchemaResolver(spec)
+        self.routes = []
+        for operation_id, method, path, operation in operations(spec):
+            pattern = re.sub(r"\\{(\w+)\\}", r"(?P<\1>[^/]+)", re.escape(path))
+            self.routes.append((method.upper(), re.compile("^{}$".format(pattern)), operation))
+        # Start times of the accepted requests of every client in the last second
+        self.history = {}
+        self.accepted = 0
+        self.throttled = 0
+        self._lock = threading.Lock()
+        self._examples = {}
+
+    @property
+    def url(self):
+        return "http://{}:{}".format(*self.server_address[:2])
+
+    def throttle(self, key):
+        """Records a request of key; returns the seconds to wait if it's over the limit, else None."""
+        with self._lock:
+            now = time.monotonic()
+            history = self.history.setdefault(key, deque())
+            while history and history[0] <= now - 1:
+                history.popleft()
+            if len(history) >= self.rate_limit:
+                self.throttled += 1
+                return 1 - (now - history[0])
+            history.append(now)
+            self.accepted += 1
+            return None
+
+    def example(self, schema):
+        """An example of a response schema, with the component it references resolved."""
+        if not isinstance(schema, dict):
+            return {}
+        key = json.dumps(schema, sort_keys=True)
+        if key not in self._examples:
+            with self._lock:
+                if "$ref" in schema:
+                    schema = self.resolver.resolve(schema["$ref"]) or {}
+                self._examples[key] = self.resolver.examples.generate(schema)
+        return self._examples[key]
+
+    def route(self, method, path):
+        for route_method, pattern, operation in self.routes:
+            if route_method == method and pattern.match(path):
+                return operation
+        return None
+
+
+class ApiRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def send(self, status, body=None, headers=None):
+        content = json.dumps(body).encode() if body is not None else b""
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if body is not None:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def page(self, operation, url):
+        """A page of a cursor paginated list, the cursor being the offset of its first result."""
+        query = parse_qs(url.query)
+        offset = int(query.get("cursor", ["0"])[0] or 0)
+        item = self.server.example(page_item_schema(self.server.spec, operation))
+        results = []
+        for number in range(offset, min(offset + self.server.page_size, self.server.items)):
+            result = dict(item) if isinstance(item, dict) else item
+            if isinstance(result, dict) and "id" in result:
+                result["id"] = number + 1
+            results.append(result)
+
+        def link(cursor):
+            query["cursor"] = [str(cursor)]
+            return "http://{}{}?{}".format(self.headers.get("Host"), url.path, urlencode(query, doseq=True))
+
+        end = offset + len(results)
+        return {
+            "next": link(end) if end < self.server.items else None,
+            "previous": link(max(0, offset - self.server.page_size)) if offset else None,
+            "results": results,
+        }
+
+    def handle_request(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        key = self.client_address[0]
+        if self.server.limit_by == "token":
+            key = self.headers.get("Authorization") or key
+        wait = self.server.throttle(key)
+        if wait is not None:
+            return self.send(429, {"detail": "Request was throttled."}, {"Retry-After": str(math.ceil(wait))})
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        url = urlparse(self.path)
+        operation = self.server.route(self.command, url.path)
+        if operation is None:
+            return self.send(404, {"detail": "Not found."})
+        if body and "json" in self.headers.get("Content-Type", ""):
+            try:
+                json.loads(body)
+            except ValueError:
+                return self.send(400, {"detail": "JSON parse error."})
+
+        status = next((code for code in sorted(operation.get("responses", {})) if code.startswith("2")), "200")
+        if status == "204":
+            return self.send(204)
+        if page_item_schema(self.server.spec, operation) is not None:
+            return self.send(int(status), self.page(operation, url))
+        self.send(int(status), self.server.example(response_schema(operation)))
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = handle_request
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+
+def serve(spec, host="127.0.0.1", port=0, quiet=True, **options):
+    """
+    Starts an ApiServer for a parsed spec on a background thread and
+    returns it; port=0 picks a free port (see server.url). Stop it with
+    server.shutdown().
+    """
+    server = ApiServer((host, port), spec, quiet=quiet, **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a local stand-in of an API from its processed spec")
+    parser.add_argument("spec", help="processed spec (YAML or JSON)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8200)
+    parser.add_argument("--type", help="API type, e.g. admin (default the spec's directory name)")
+    parser.add_argument("--rate-limit", type=int, default=API_RATE_LIMIT, help="requests a second per client")
+    parser.add_argument("--items", type=int, default=50, help="results of every paginated list")
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds to delay every response")
+    args = parser.parse_args(argv)
+
+    api_type = args.type or os.path.basename(os.path.dirname(os.path.abspath(args.spec)))
+    server = ApiServer(
+        (args.host, args.port), load_spec(args.spec), args.rate_limit, API_RATE_LIMIT_BY.get(api_type, "token"),
+        args.items, args.page_size, args.latency,
+    )
+    print("Serving a stand-in of {} at {}".format(server.spec["info"]["title"], server.url))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
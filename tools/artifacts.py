@@ -0,0 +1,274 @@
+import gzip
+import hashlib
+import json
+import os
+import re
+import tempfile
+import zlib
+from collections.abc import Mapping
+
+try:
+    import brotli
+except ImportError:  # brotli variants are skipped without it
+    brotli = None
+
+from config import BASE_API_FILES_PATH, SPEC_COMPRESSION, SPEC_MANIFEST_FILE
+
+# Bytes read at a time when compressing a finished file
+CHUNK_SIZE = 1 << 20
+
+
+def write_atomic(path, data):
+    """
+    Writes text or bytes to a temporary file next to path and moves it into
+    place, so readers never see a partially written file.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb" if isinstance(data, bytes) else "w") as f:
+            f.write(data)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def load_json(path):
+    """The JSON document at path, or {} when there's none."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def minified_json(value):
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+
+def spec_json(spec):
+    """Canonical minified JSON: sorted keys, no whitespace, UTF-8."""
+    return minified_json(spec).encode()
+
+
+class JsonMapping(Mapping):
+    """
+    Read-only mapping of keys to values held as minified JSON, each parsed
+    again whenever it's looked up. Iterating over its items holds one
+    parsed value at a time, e.g. one webhook of a streamed spec.
+    """
+
+    def __init__(self, items=()):
+        self.data = dict(items)
+
+    def __getitem__(self, key):
+        return json.loads(self.data[key])
+
+    def __iter__(self):
+        return iter(self.data)
+
+    def __len__(self):
+        return len(self.data)
+
+
+def compress(data, encoding):
+    if encoding == "gz":
+        # mtime=0 keeps the output identical for identical input
+        return gzip.compress(data, compresslevel=9, mtime=0)
+    if encoding == "br":
+        return brotli.compress(data, quality=11) if brotli else None
+    raise ValueError("Unknown compression: {}".format(encoding))
+
+
+class ArtifactWriter:
+    """
+    Streaming counterpart of write_atomic plus the compressed variants of
+    write_spec_artifacts: chunks are compressed and hashed as they arrive,
+    so the whole file is never held in memory. The brotli variant is only
+    compressed on close(), from the finished file in chunks, as a brotli
+    compressor at quality 11 holds tens of MB and writers are often open
+    side by side (see update_api_docs.stream_spec). close() moves every
+    file into place and returns their manifest entries, abort() discards
+    them.
+    """
+
+    def __init__(self, path, encodings=SPEC_COMPRESSION):
+        self.outputs = []
+        try:
+            self._open(path, None)
+            for encoding in encodings:
+                if encoding == "gz":
+                    # wbits=31 writes a gzip container, with mtime 0
+                    compressor = zlib.compressobj(9, zlib.DEFLATED, 31)
+                    self._open(path + ".gz", (compressor.compress, compressor.flush))
+                elif encoding == "br":
+                    if brotli:
+                        self._open(path + ".br", None)
+                        self.outputs[-1]["deferred"] = True
+                else:
+                    raise ValueError("Unknown compression: {}".format(encoding))
+        except BaseException:
+            self.abort()
+            raise
+
+    def _open(self, path, compressor):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+        self.outputs.append({
+            "path": path,
+            "tmp_path": tmp_path,
+            "file": os.fdopen(fd, "wb"),
+            "compressor": compressor,
+            "sha256": hashlib.sha256(),
+            "size": 0,
+        })
+
+    @staticmethod
+    def _write(output, data):
+        if data:
+            output["file"].write(data)
+            output["sha256"].update(data)
+            output["size"] += len(data)
+
+    def write(self, chunk):
+        if isinstance(chunk, str):
+            chunk = chunk.encode()
+        for output in self.outputs:
+            compressor = output["compressor"]
+            if not output.get("deferred"):
+                self._write(output, compressor[0](chunk) if compressor else chunk)
+
+    def _compress_deferred(self):
+        """Compresses the finished file into the deferred (brotli) outputs."""
+        for output in self.outputs:
+            if output.get("deferred"):
+                source = self.outputs[0]
+                source["file"].flush()
+                compressor = brotli.Compressor(quality=11)
+                with open(source["tmp_path"], "rb") as f:
+                    for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                        self._write(output, compressor.process(chunk))
+                self._write(output, compressor.finish())
+
+    def close(self):
+        entries = {}
+        try:
+            self._compress_deferred()
+            for output in self.outputs:
+                if output["compressor"]:
+                    self._write(output, output["compressor"][1]())
+                output["file"].close()
+                os.chmod(output["tmp_path"], 0o644)
+                os.replace(output["tmp_path"], output["path"])
+                entries[os.path.relpath(output["path"], BASE_API_FILES_PATH)] = {
+                    "size": output["size"],
+                    "sha256": output["sha256"].hexdigest(),
+                }
+        except BaseException:
+            self.abort()
+            raise
+        self.outputs = []
+        return entries
+
+    def abort(self):
+        for output in self.outputs:
+            output["file"].close()
+            if os.path.exists(output["tmp_path"]):
+                os.unlink(output["tmp_path"])
+        self.outputs = []
+
+
+def manifest_entry(data):
+    return {"size": len(data), "sha256": hashlib.sha256(data).hexdigest()}
+
+
+def write_artifact(path, data, write=True):
+    """
+    Writes data and its compressed variants. Returns their manifest entries,
+    keyed by path relative to BASE_API_FILES_PATH. With write=False data is
+    assumed to be written to path already and only the variants are.
+
+    When path already holds data and its variants exist they are kept as
+    they are, compressing large artifacts is slow.
+    """
+    encodings = [encoding for encoding in SPEC_COMPRESSION if encoding != "br" or brotli]
+    existing = [path] + ["{}.{}".format(path, encoding) for encoding in encodings]
+    if write and all(os.path.exists(p) for p in existing):
+        with open(path, "rb") as f:
+            unchanged = f.read() == data
+        if unchanged:
+            entries = {}
+            for variant_path in existing:
+                with open(variant_path, "rb") as f:
+                    entries[os.path.relpath(variant_path, BASE_API_FILES_PATH)] = manifest_entry(f.read())
+            return entries
+
+    variants = {path: data}
+    for encoding in encodings:
+        variants["{}.{}".format(path, encoding)] = compress(data, encoding)
+    entries = {}
+    for variant_path, variant_data in variants.items():
+        if write or variant_path != path:
+            write_atomic(variant_path, variant_data)
+        entries[os.path.relpath(variant_path, BASE_API_FILES_PATH)] = manifest_entry(variant_data)
+    return entries
+
+
+def write_spec_artifacts(api_file, yaml_text, spec):
+    """
+    Writes the minified JSON of a spec next to its YAML file, plus gzip and
+    brotli variants of both. Returns the manifest entries for every file
+    written, keyed by path relative to BASE_API_FILES_PATH.
+    """
+    entries = write_artifact(api_file, yaml_text.encode(), write=False)
+    entries.update(write_artifact(os.path.splitext(api_file)[0] + ".json", spec_json(spec)))
+    return entries
+
+
+def version_file(version_key, path):
+    """
+    Whether a manifest path belongs to the version keyed "<type>/<version>":
+    its spec files and their variants, or anything in its shard directory.
+    """
+    return path.startswith(version_key + "/") or re.fullmatch(
+        re.escape(version_key) + r"\.(yaml|json)(\.\w+)?", path
+    ) is not None
+
+
+def load_manifest():
+    if not os.path.exists(SPEC_MANIFEST_FILE):
+        return {"files": {}}
+    with open(SPEC_MANIFEST_FILE, "r") as f:
+        return json.load(f)
+
+
+def save_manifest(manifest, files):
+    """Writes the manifest with files, only when they changed."""
+    if files == manifest["files"]:
+        return
+    manifest["files"] = dict(sorted(files.items()))
+    write_atomic(SPEC_MANIFEST_FILE, json.dumps(manifest, indent=2) + "\n")
+
+
+def update_manifest(entries, replace=()):
+    """
+    Merges entries into the manifest, only rewriting it when it changed. The
+    files of the versions in replace ("<type>/<version>" keys) are replaced
+    by entries rather than merged into, dropping those no longer written.
+    """
+    manifest = load_manifest()
+    files = {
+        path: entry for path, entry in manifest["files"].items()
+        if not any(version_file(version_key, path) for version_key in replace)
+    }
+    files.update(entries)
+    save_manifest(manifest, files)
+
+
+def prune_manifest(version_keys):
+    """Drops the files of every version but those keyed in version_keys from the manifest."""
+    manifest = load_manifest()
+    files = {
+        path: entry for path, entry in manifest["files"].items()
+        if any(version_file(version_key, path) for version_key in version_keys)
+    }
+    save_manifest(manifest, files)
@@ -0,0 +1,262 @@
+"""
+Benchmarks for the spec toolchain.
+
+Runs offline against the committed specs in public/api/ and synthetic specs
+scaled by schema count, nesting depth and number of webhook events, and
+reports wall time and peak memory for each stage:
+
+    python benchmark.py
+    python benchmark.py --synthetic schemas=800,depth=8,events=200
+    python benchmark.py --output results.json --baseline benchmark_baseline.json
+
+Use --save-baseline to store the results as the new baseline. Stages that
+are slower or use more memory than the baseline by more than --threshold
+are flagged and make the run exit with status 1.
+"""
+import argparse
+import json
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import yaml
+
+from config import API_VERSIONS, WEBHOOKS
+from spec_cache import SpecCache, content_digest
+from spec_yaml import SpecDumper, SpecLoader
+from update_api_docs import spec_file_path
+from webhooks import ExampleGenerator, SchemaResolver, webhook_schema_generator
+
+DEFAULT_SYNTHETIC = (
+    "schemas=100,depth=3,events=25",
+    "schemas=400,depth=3,events=25",
+    "schemas=400,depth=6,events=25",
+    "schemas=400,depth=3,events=200",
+)
+
+# Differences below this are treated as noise rather than regressions
+MIN_TIME_DELTA = 0.002
+MIN_MEMORY_DELTA = 256 * 1024
+
+
+def synthetic_spec(schemas=100, depth=3, events=25):
+    """
+    Returns a spec with ``schemas`` component schemas spread over ``depth``
+    levels, each referencing the next level through $ref and one of items,
+    allOf or oneOf, and ``events`` webhook events on the top level schemas.
+    """
+    levels = [[] for _ in range(depth)]
+    for i in range(schemas):
+        levels[i % depth].append("Schema{}".format(i))
+
+    components = {}
+    for level, names in enumerate(levels):
+        children = levels[level + 1] if level + 1 < depth else []
+        for i, name in enumerate(names):
+            properties = {
+                "id": {"type": "integer", "readOnly": True},
+                "name": {"type": "string", "maxLength": 255},
+                "created_at": {"type": "string", "format": "date-time", "readOnly": True},
+                "price": {"type": "string", "format": "decimal"},
+                "is_active": {"type": "boolean"},
+            }
+            if children:
+                # Two nested refs per schema, rotating through the ref kinds
+                # the resolver follows, so inlined size grows as 2 ** depth
+                ref = "#/components/schemas/" + children[i % len(children)]
+                other = "#/components/schemas/" + children[(i + 1) % len(children)]
+                properties["child"] = {"$ref": ref, "description": "Nested object."}
+                kind = i % 3
+                if kind == 0:
+                    properties["children"] = {"type": "array", "items": {"$ref": other}}
+                elif kind == 1:
+                    properties["merged"] = {
+                        "allOf": [{"$ref": other}, {"properties": {"extra": {"type": "string"}}}]
+                    }
+                else:
+                    properties["variant"] = {"oneOf": [{"$ref": other}]}
+            components[name] = {"type": "object", "properties": properties}
+
+    spec = {
+        "openapi": "3.1.0",
+        "info": {"title": "Synthetic", "version": "synthetic"},
+        "paths": {},
+        "components": {"schemas": components},
+    }
+    webhooks = [
+        {
+            "event": "object{}.created".format(i),
+            "object": "object{}".format(i),
+            "schema_ref": "#/components/schemas/" + levels[0][i % len(levels[0])],
+            "tag": "synthetic",
+            "description": "Synthetic event.",
+        }
+        for i in range(events)
+    ]
+    return spec, webhooks
+
+
+def parse_synthetic(value):
+    params = {}
+    for part in value.split(","):
+        key, _, number = part.partition("=")
+        params[key.strip()] = int(number)
+    return params
+
+
+def measure(func, repeat):
+    """Returns (result, best wall time, peak traced memory) for func()."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    # Memory is measured on a separate run, tracemalloc skews timings
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return result, best, peak
+
+
+def run_stages(raw, events, repeat):
+    """
+    Benchmarks each stage on a spec given as YAML text, returning
+    {stage: {"time": seconds, "peak_memory": bytes}}.
+    """
+    stages = {}
+
+    def record(name, func):
+        result, elapsed, peak = measure(func, repeat)
+        stages[name] = {"time": round(elapsed, 6), "peak_memory": peak}
+        return result
+
+    spec = record("yaml_load", lambda: yaml.load(raw, Loader=SpecLoader))
+    refs = sorted({each["schema_ref"] for each in events if each["schema_ref"]})
+    if refs:
+        def resolve():
+            resolver = SchemaResolver(spec)
+            return [resolver.resolve(ref) for ref in refs]
+
+        resolved = record("resolve_schemas", resolve)
+        def examples():
+            generator = ExampleGenerator()
+            return [generator.generate(schema) for schema in resolved]
+
+        record("generate_example", examples)
+    else:
+        resolved = []
+
+    # A warm start: the parsed spec and resolved schemas back from the spec cache
+    cache = SpecCache(tempfile.mkdtemp(prefix="spec-cache-"))
+    digest = content_digest(raw)
+    cache.save("raw", digest, {"spec": spec, "resolved": resolved})
+    record("spec_cache_load", lambda: cache.load("raw", digest))
+    shutil.rmtree(cache.directory)
+
+    if refs:
+        spec["webhooks"] = record("webhook_schema_generator", lambda: webhook_schema_generator(spec, "inline", events))
+    record("yaml_dump", lambda: yaml.dump(spec, Dumper=SpecDumper))
+    return stages
+
+
+def run(synthetic, repeat):
+    scenarios = {}
+    for version in API_VERSIONS:
+        path = spec_file_path(version["type"], version["version"])
+        with open(path, "rb") as f:
+            raw = f.read()
+        events = WEBHOOKS if version["type"] == "admin" else []
+        name = "{}/{}".format(version["type"], version["version"])
+        print("Benchmarking {}".format(name), file=sys.stderr)
+        scenarios[name] = {"bytes": len(raw), "stages": run_stages(raw, events, repeat)}
+
+    for value in synthetic:
+        params = parse_synthetic(value)
+        spec, events = synthetic_spec(**params)
+        raw = yaml.dump(spec, Dumper=SpecDumper).encode()
+        name = "synthetic/" + ",".join("{}={}".format(k, v) for k, v in sorted(params.items()))
+        print("Benchmarking {}".format(name), file=sys.stderr)
+        scenarios[name] = {"bytes": len(raw), "stages": run_stages(raw, events, repeat)}
+
+    return {
+        "python": platform.python_version(),
+        "libyaml": SpecLoader is not yaml.SafeLoader,
+        "repeat": repeat,
+        "scenarios": scenarios,
+    }
+
+
+def find_regressions(results, baseline, threshold):
+    """Returns a list of (scenario, stage, metric, baseline, current)."""
+    regressions = []
+    for scenario, data in results["scenarios"].items():
+        base_stages = baseline.get("scenarios", {}).get(scenario, {}).get("stages", {})
+        for stage, metrics in data["stages"].items():
+            base = base_stages.get(stage)
+            if not base:
+                continue
+            for metric, min_delta in (("time", MIN_TIME_DELTA), ("peak_memory", MIN_MEMORY_DELTA)):
+                current, previous = metrics[metric], base[metric]
+                if current > previous * (1 + threshold) and current - previous > min_delta:
+                    regressions.append((scenario, stage, metric, previous, current))
+    return regressions
+
+
+def print_report(results, regressions):
+    flagged = {(r[0], r[1], r[2]) for r in regressions}
+    print("{:<48} {:<26} {:>10} {:>12}".format("scenario", "stage", "time (ms)", "peak (KiB)"))
+    for scenario, data in results["scenarios"].items():
+        for stage, metrics in data["stages"].items():
+            marks = "".join(
+                " <- {} regression".format(metric)
+                for metric in ("time", "peak_memory")
+                if (scenario, stage, metric) in flagged
+            )
+            print("{:<48} {:<26} {:>10.1f} {:>12.0f}{}".format(
+                scenario, stage, metrics["time"] * 1000, metrics["peak_memory"] / 1024, marks
+            ))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--synthetic", action="append", metavar="schemas=N,depth=N,events=N",
+                        help="synthetic spec to benchmark, may be repeated")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per stage, the best time is kept")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--baseline", help="baseline results to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="write the results to --baseline")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="allowed slowdown/memory growth over the baseline (default 0.25)")
+    args = parser.parse_args(argv)
+
+    results = run(args.synthetic or DEFAULT_SYNTHETIC, args.repeat)
+
+    regressions = []
+    if args.baseline and not args.save_baseline:
+        with open(args.baseline, "r") as f:
+            regressions = find_regressions(results, json.load(f), args.threshold)
+    results["regressions"] = [
+        {"scenario": s, "stage": st, "metric": m, "baseline": b, "current": c}
+        for s, st, m, b, c in regressions
+    ]
+
+    print_report(results, regressions)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline and args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,355 @@
+"""
+Generates typed Python API clients from the processed specs.
+
+Writes a package per spec with a TypedDict or alias per component schema, a
+Client and an AsyncClient with a method per operation, and their runtime
+(api_client_runtime.py):
+
+    python client_generator.py ../public/api/admin/unstable.yaml --output build/clients
+    python client_generator.py ../public/api/campaigns/v1.json --package campaigns
+
+    from admin_unstable_client import Client
+    with Client(token, store="example") as client:
+        order = client.orders_retrieve("10001")
+        for order in client.orders_list_iter(status="open"):
+            ...
+
+Cursor paginated list operations also get a ``<method>_iter`` variant that
+yields the results of every page. Clients pool their connections, share a
+rate limiter per access token (or IP address, see API_RATE_LIMIT_BY) that
+keeps to API_RATE_LIMIT, and retry 429 responses after their Retry-After.
+Run them against api_server.py to try them without a store.
+"""
+import argparse
+import keyword
+import os
+import re
+
+from config import (
+    API_CLIENT_RETRIES, API_RATE_LIMIT, API_RATE_LIMIT_BURST, API_RATE_LIMIT_BY, API_RATE_LIMIT_MARGIN, CACHE_DIR,
+)
+from search_index import summary
+from shards import operations
+from spec_diff import load_spec
+from validator_compiler import module_name
+
+RUNTIME_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "api_client_runtime.py")
+SCALAR_TYPES = {"string": "str", "integer": "int", "number": "float", "boolean": "bool"}
+# Methods of the client base classes that operations can't be named after
+RESERVED = {"close", "paginate", "request", "send", "url"}
+
+
+def identifier(name):
+    """A Python identifier for a parameter, property or operation name, e.g. clientId -> client_id."""
+    name = re.sub(r"([a-z0-9])([A-Z])", r"\1_\2", name)
+    name = re.sub(r"\W", "_", name).strip("_").lower() or "_"
+    if name[0].isdigit():
+        name = "_" + name
+    return name + "_" if keyword.iskeyword(name) else name
+
+
+def type_expr(schema):
+    """The type annotation of values of schema, with component names as forward references."""
+    if not isinstance(schema, dict):
+        return "Any"
+    if "$ref" in schema:
+        return repr(schema["$ref"].split("/")[-1])
+    if "enum" in schema:
+        values = [value for value in schema["enum"] if value is not None]
+        expr = "Literal[{}]".format(", ".join(repr(value) for value in values)) if values else "None"
+        return "Optional[{}]".format(expr) if None in schema["enum"] or schema.get("nullable") else expr
+    for keyword_ in ("oneOf", "anyOf", "allOf"):
+        if schema.get(keyword_):
+            exprs = list(dict.fromkeys(type_expr(each) for each in schema[keyword_]))
+            if keyword_ == "allOf" and len(exprs) > 1:
+                return "Dict[str, Any]"
+            return exprs[0] if len(exprs) == 1 else "Union[{}]".format(", ".join(exprs))
+
+    types = schema.get("type") or ("object" if "properties" in schema else None)
+    types = [types] if isinstance(types, str) else list(types or [])
+    nullable = "null" in types or schema.get("nullable")
+    exprs = []
+    for each in types:
+        if each == "array":
+            exprs.append("List[{}]".format(type_expr(schema.get("items"))))
+        elif each == "object":
+            values = schema.get("additionalProperties")
+            exprs.append("Dict[str, {}]".format(type_expr(values) if isinstance(values, dict) else "Any"))
+        elif each == "string" and schema.get("format") == "binary":
+            exprs.append("Any")
+        elif each in SCALAR_TYPES:
+            exprs.append(SCALAR_TYPES[each])
+    if not exprs:
+        return "Any"
+    expr = exprs[0] if len(exprs) == 1 else "Union[{}]".format(", ".join(exprs))
+    return "Optional[{}]".format(expr) if nullable else expr
+
+
+def docstring(text, indent):
+    """Lines of a docstring holding the summary of text, or [] if there is none."""
+    text = " ".join(summary(text).replace("\\", "\\\\").replace('"""', "'''").split())
+    if not text:
+        return []
+    if len(indent) + len(text) + 6 <= 79:
+        return ['{}"""{}"""'.format(indent, text)]
+    lines = [indent + '"""']
+    line = ""
+    for word in text.split():
+        if line and len(indent) + len(line) + len(word) >= 79:
+            lines.append(indent + line)
+            line = ""
+        line = (line + " " + word).strip()
+    return lines + [indent + line, indent + '"""']
+
+
+def generate_models(spec, header):
+    """Source of the models module: a TypedDict per object schema, an alias per other one."""
+    lines = ['"""', header, '"""', "from typing import Any, Dict, List, Literal, Optional, TypedDict, Union"]
+    for name, schema in sorted(spec.get("components", {}).get("schemas", {}).items()):
+        lines += ["", ""]
+        properties = schema.get("properties") if isinstance(schema, dict) else None
+        if properties is None:
+            lines.append("{} = {}".format(name, type_expr(schema)))
+            continue
+        fields = [(field, type_expr(value)) for field, value in properties.items()]
+        if all(field.isidentifier() and not keyword.iskeyword(field) for field, _ in fields):
+            lines.append("class {}(TypedDict, total=False):".format(name))
+            body = docstring(schema.get("description"), "    ")
+            body += ["    {}: {}".format(field, expr) for field, expr in fields]
+            lines.extend(body or ["    pass"])
+        else:
+            lines.append("{} = TypedDict({!r}, {{".format(name, name))
+            lines.extend("    {!r}: {},".format(field, expr) for field, expr in fields)
+            lines.append("}, total=False)")
+    return "\n".join(lines) + "\n"
+
+
+def response_schema(operation):
+    """The JSON schema of an operation's success response, or None."""
+    for status, response in sorted(operation.get("responses", {}).items()):
+        if status.startswith("2"):
+            content = (response or {}).get("content") or {}
+            return next((value.get("schema") for media, value in content.items() if "json" in media), None)
+    return None
+
+
+def page_item_schema(spec, operation):
+    """The schema of the results of a cursor paginated operation, None if it isn't paginated."""
+    if not any(parameter.get("name") == "cursor" for parameter in operation.get("parameters", [])):
+        return None
+    schema = response_schema(operation) or {}
+    if "$ref" in schema:
+        schema = spec["components"]["schemas"].get(schema["$ref"].split("/")[-1], {})
+    properties = schema.get("properties", {})
+    if "next" not in properties or properties.get("results", {}).get("type") != "array":
+        return None
+    return properties["results"].get("items", {})
+
+
+class ClientGenerator:
+    """Generates the client module of a spec: an operation method per spec operation."""
+
+    def __init__(self, spec, api_type):
+        self.spec = spec
+        self.api_type = api_type
+        self.version_header = None
+        self.methods = set()
+
+    def auth(self):
+        """(scheme, header) of the spec's security scheme, see BaseClient."""
+        schemes = self.spec.get("components", {}).get("securitySchemes", {})
+        for requirement in self.spec.get("security", []):
+            for name in requirement:
+                scheme = schemes.get(name, {})
+                if scheme.get("type") == "apiKey" and scheme.get("in") == "header":
+                    return "header", scheme["name"]
+        return "bearer", "Authorization"
+
+    def method_name(self, operation_id):
+        name = identifier(operation_id)
+        while name in self.methods or name in RESERVED:
+            name += "_"
+        self.methods.add(name)
+        return name
+
+    def parameters(self, operation):
+        """Returns (path, query, header) lists of (python name, name, type, required) of an operation."""
+        groups = {"path": [], "query": [], "header": []}
+        names = set()
+        for parameter in operation.get("parameters", []):
+            location = parameter.get("in")
+            if location not in groups:
+                continue
+            if location == "header" and parameter["name"].lower().endswith("api-version"):
+                self.version_header = parameter["name"]
+                continue
+            name = identifier(parameter["name"])
+            while name in names or name in ("self", "data"):
+                name += "_"
+            names.add(name)
+            required = parameter.get("required", False) or location == "path"
+            groups[location].append((name, parameter["name"], type_expr(parameter.get("schema")), required))
+        return groups["path"], groups["query"], groups["header"]
+
+    def operation(self, operation_id, method, path, operation, is_async):
+        """Source lines of an operation's method, and of its _iter variant when paginated."""
+        path_params, query, headers = self.parameters(operation)
+        body = operation.get("requestBody")
+        content = (body or {}).get("content", {})
+        media = "application/json" if "application/json" in content else next(iter(content), None)
+        body_kind = "json" if media and "json" in media else "files"
+
+        signature = ["self"] + ["{}: {}".format(name, expr) for name, _, expr, _ in path_params]
+        if body and body.get("required"):
+            signature.append("data: {}".format(type_expr(content[media].get("schema"))))
+        keyword_only = []
+        if body and not body.get("required"):
+            keyword_only.append("data: Optional[{}] = None".format(type_expr(content[media].get("schema"))))
+        for name, _, expr, required in query + headers:
+            keyword_only.append("{}: {}".format(name, expr if required else "Optional[{}] = None".format(expr)))
+        if keyword_only:
+            signature += ["*"] + keyword_only
+
+        # Positional arguments, and keyword arguments mapping a parameter's name to its variable
+        args = [repr(method.upper()), repr(path)]
+        keywords = [
+            (keyword_, [(original, name) for name, original, _, _ in params])
+            for keyword_, params in (("path_params", path_params), ("params", query), ("headers", headers))
+            if params
+        ]
+        item = page_item_schema(self.spec, operation)
+        name = self.method_name(operation_id)
+        title = operation.get("summary") or operation.get("description") or "{} {}".format(method.upper(), path)
+        returns = response_schema(operation)
+        lines = self.method(
+            name, signature, type_expr(returns) if returns else "None", title,
+            "request", args, keywords + ([(body_kind, "data")] if body else []), is_async,
+        )
+        if item is not None:
+            lines += self.method(
+                self.method_name(operation_id + "Iter"), signature,
+                "{}[{}]".format("AsyncIterator" if is_async else "Iterator", type_expr(item)),
+                "Yields the results of every page of {}.".format(name), "paginate", args, keywords, is_async,
+                iterator=True,
+            )
+        return lines
+
+    @staticmethod
+    def method(name, signature, returns, title, call, args, keywords, is_async, iterator=False):
+        """
+        Source lines of a method calling self.<call>(*args, **keywords), where
+        keyword values are variable names or lists of (key, variable name).
+        """
+        prefix = "async " if is_async and not iterator else ""
+        definition = "    {}def {}({}) -> {}:".format(prefix, name, ", ".join(signature), returns)
+        if len(definition) > 120:
+            parameters = "\n".join("        {},".format(each) for each in signature)
+            definition = "    {}def {}(\n{}\n    ) -> {}:".format(prefix, name, parameters, returns)
+
+        def value(items, indent):
+            if isinstance(items, str):
+                return items
+            if indent is None:
+                return "{" + ", ".join("{!r}: {}".format(key, each) for key, each in items) + "}"
+            return "{\n" + "".join("{}    {!r}: {},\n".format(indent, key, each) for key, each in items) + indent + "}"
+
+        start = "        return {}self.{}(".format("await " if is_async and not iterator else "", call)
+        arguments = args + ["{}={}".format(key, value(items, None)) for key, items in keywords]
+        invocation = start + ", ".join(arguments) + ")"
+        if len(invocation) > 120:
+            invocation = start + "\n" + "".join(
+                "            {},\n".format(each)
+                for each in args + ["{}={}".format(key, value(items, "            ")) for key, items in keywords]
+            ) + "        )"
+        return ["", definition] + docstring(title, "        ") + [invocation]
+
+    def generate(self, header):
+        version = self.spec["info"]["version"]
+        server = (self.spec.get("servers") or [{"url": ""}])[0]
+        scheme, auth_header = self.auth()
+        classes = {}
+        for is_async in (False, True):
+            self.methods = set()
+            body = []
+            for operation_id, method, path, operation in operations(self.spec):
+                body += self.operation(operation_id, method, path, operation, is_async)
+            classes[is_async] = body
+
+        attributes = [
+            "    server_url = {!r}".format(server["url"]),
+            "    server_variables = {!r}".format({
+                name: variable.get("default", "") for name, variable in (server.get("variables") or {}).items()
+            }),
+            "    version_header = {!r}".format(self.version_header),
+            "    api_version = {!r}".format(version if self.version_header else None),
+            "    auth_scheme = {!r}".format(scheme),
+            "    auth_header = {!r}".format(auth_header),
+            "    limit_by = {!r}".format(API_RATE_LIMIT_BY.get(self.api_type, "token")),
+            "    rate_limit = {!r}".format(API_RATE_LIMIT),
+            "    rate_limit_burst = {!r}".format(API_RATE_LIMIT_BURST),
+            "    rate_limit_margin = {!r}".format(API_RATE_LIMIT_MARGIN),
+            "    retries = {!r}".format(API_CLIENT_RETRIES),
+        ]
+        lines = [
+            '"""', header, '"""',
+            "from typing import Any, AsyncIterator, Dict, Iterator, List, Literal, Optional, Union",
+            "",
+            "from ._runtime import AsyncBaseClient, BaseClient",
+            "from .models import *  # noqa: F401,F403",
+            "",
+            "",
+            "class _Settings:",
+        ] + attributes + [
+            "",
+            "",
+            "class Client(_Settings, BaseClient):",
+            '    """{} API client, version {}."""'.format(self.api_type.capitalize(), version),
+        ] + classes[False] + [
+            "",
+            "",
+            "class AsyncClient(_Settings, AsyncBaseClient):",
+            '    """{} API asyncio client, version {}."""'.format(self.api_type.capitalize(), version),
+        ] + classes[True]
+        return "\n".join(lines) + "\n"
+
+
+def generate_client(spec, output, package, api_type):
+    """Writes a client package for a parsed spec. Returns the package directory."""
+    version = spec["info"]["version"]
+    directory = os.path.join(output, package)
+    os.makedirs(directory, exist_ok=True)
+    header = "{} API {}, version {}. Generated by client_generator.py, do not edit."
+
+    with open(os.path.join(directory, "models.py"), "w") as f:
+        f.write(generate_models(spec, header.format(api_type.capitalize(), "models", version)))
+    with open(os.path.join(directory, "client.py"), "w") as f:
+        f.write(ClientGenerator(spec, api_type).generate(header.format(api_type.capitalize(), "client", version)))
+    with open(RUNTIME_FILE, "r") as source, open(os.path.join(directory, "_runtime.py"), "w") as f:
+        f.write(source.read())
+    with open(os.path.join(directory, "__init__.py"), "w") as f:
+        f.write("\n".join([
+            '"""', header.format(api_type.capitalize(), "client package", version), '"""',
+            "from ._runtime import ApiError, RateLimiter",
+            "from .client import AsyncClient, Client",
+            "",
+        ]))
+    return directory
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a typed API client from a processed spec")
+    parser.add_argument("spec", help="processed spec (YAML or JSON)")
+    parser.add_argument("--output", default=os.path.join(CACHE_DIR, "clients"), help="directory for the package")
+    parser.add_argument("--package", help="package name (default <type>_<version>_client from the spec file)")
+    parser.add_argument("--type", help="API type, e.g. admin (default the spec's directory name)")
+    args = parser.parse_args(argv)
+
+    spec = load_spec(args.spec)
+    parent, file_name = os.path.split(os.path.abspath(args.spec))
+    api_type = args.type or os.path.basename(parent)
+    package = args.package or module_name("{}_{}_client".format(api_type, os.path.splitext(file_name)[0]))
+    print("Wrote {}".format(generate_client(spec, args.output, package, api_type)))
+
+
+if __name__ == "__main__":
+    main()
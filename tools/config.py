@@ -101,6 +101,53 @@ Rate limiting is required to prevent the network and application services from b
 Setting a rate limit helps to prevent API abuse and provide overall fairness of use across the platform.
 """
 
+# Spec Download Settings
+FETCH_WORKERS = 4  # concurrent downloads, also the connection pool size
+FETCH_TIMEOUT = 30  # seconds, per request
+FETCH_RETRIES = 3
+# Processes generating versions, and each version's webhook events, in
+# parallel; 1 generates serially
+GENERATE_WORKERS = 1
+EVENT_WORKERS = 1
+# Search records and inverted index written next to each version's shards,
+# and how deep nested schema fields are indexed
+SEARCH_INDEX_FILE = "search.json"
+SEARCH_MAX_FIELD_DEPTH = 4
+# Search backend index name and records per upload batch (search_sync.py)
+SEARCH_INDEX_NAME = "api_reference"
+SEARCH_BATCH_SIZE = 500
+# Clients generated by client_generator.py, and api_server.py standing in
+# for the APIs, keep to the documented rate limit: requests a second per
+# access token (admin) or IP address (campaigns), with how many may be
+# sent at once. Clients leave the margin (seconds a second) for requests
+# arriving late, and retry 429 responses up to API_CLIENT_RETRIES times.
+API_RATE_LIMIT = 4
+API_RATE_LIMIT_BY = {"admin": "token", "campaigns": "ip"}
+API_RATE_LIMIT_BURST = 1
+API_RATE_LIMIT_MARGIN = 0.02
+API_CLIENT_RETRIES = 3
+# Write specs section by section and webhook by webhook instead of dumping
+# the whole spec at once, trading some speed for a lower peak memory
+SPEC_STREAM = False
+# ETags, content and input hashes from the last refresh, used to skip
+# versions that haven't changed
+SPEC_STATE_FILE = "spec_state.json"
+# Each spec is also written as minified JSON, and both the YAML and JSON
+# as precompressed variants ("gz", and "br" when brotli is installed),
+# all listed with their sizes and hashes in the manifest
+SPEC_COMPRESSION = ("gz", "br")
+SPEC_MANIFEST_FILE = BASE_API_FILES_PATH + "manifest.json"
+# Intermediate results reused between runs, e.g. generated webhook events
+CACHE_DIR = ".cache"
+# Parsed specs and resolved webhook schemas, pickled by content hash and
+# tool version (spec_cache.py), and how many are kept; None disables it
+SPEC_CACHE_DIR = CACHE_DIR + "/specs"
+SPEC_CACHE_ENTRIES = 32
+# Watch mode (watch_specs.py) polls for changes every interval seconds and
+# writes compressed variants, shards and search once edits have settled
+WATCH_INTERVAL = 0.2
+WATCH_SETTLE = 2.0
+
 API_VERSIONS = [
     {
         "type": "campaigns",
@@ -132,6 +179,37 @@ API_VERSIONS = [
     },
 ]
 
+# Webhook Payload Schema Output
+# "inline" embeds the full data schema in every webhook event's requestBody.
+# "components" emits each data schema once under components.schemas
+# (e.g. OrderWebhookData) and references it from every event that uses it.
+WEBHOOK_SCHEMA_OUTPUT = "inline"
+
+# Size budget of each generated webhook payload example; nested objects
+# are expanded as deep as the budget allows
+EXAMPLE_MAX_NODES = 400
+EXAMPLE_MAX_BYTES = 8192
+
+# Synthetic webhook events for receiver load tests (webhook_events.py):
+# arrays get a geometric number of items with this mean, up to the maximum,
+# and objects nested deeper than the maximum depth only get their required
+# properties
+WEBHOOK_EVENT_ARRAY_MEAN = 2
+WEBHOOK_EVENT_ARRAY_MAX = 10
+WEBHOOK_EVENT_MAX_DEPTH = 6
+
+# Webhook payload size reports (payload_sizes.py) written next to each
+# version's shards. Worst cases assume strings without a length limit hold
+# up to PAYLOAD_STRING_MAX characters and arrays without maxItems up to
+# PAYLOAD_ARRAY_MAX items; typical sizes are measured over PAYLOAD_SAMPLES
+# synthetic events per event. Reports list each event's PAYLOAD_DRIVERS
+# largest fields.
+PAYLOAD_SIZES_FILE = "payload_sizes.json"
+PAYLOAD_STRING_MAX = 1000
+PAYLOAD_ARRAY_MAX = WEBHOOK_EVENT_ARRAY_MAX
+PAYLOAD_SAMPLES = 200
+PAYLOAD_DRIVERS = 10
+
 # Custom Webhook Event Payloads
 # These payloads don't follow their respective object data schema.
 CUSTOM_WEBHOOK_EVENT_PAYLOADS = [
@@ -0,0 +1,27 @@
+"""
+HTTP session shared by the tools downloading specs or uploading records.
+"""
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from config import FETCH_RETRIES, FETCH_WORKERS
+
+
+def create_session(workers=FETCH_WORKERS):
+    """
+    Returns a keep-alive session shared by all spec downloads. Failed
+    requests are retried with backoff, honouring Retry-After on 429/503.
+    """
+    retries = Retry(
+        total=FETCH_RETRIES,
+        backoff_factor=0.5,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=("GET",),
+        respect_retry_after_header=True,
+    )
+    adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers, max_retries=retries)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
@@ -0,0 +1,86 @@
+import cProfile
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+
+class RefreshReport:
+    """
+    Collects per-version, per-stage wall time, peak memory and counters for
+    a spec refresh, and writes them out as a JSON report.
+
+    Peak memory is only tracked with ``trace_memory`` (tracemalloc slows the
+    refresh down noticeably) and covers the whole process, so it includes
+    downloads still running in other threads. With ``profile_path`` every
+    stage is profiled and the stats of the slowest one are dumped there.
+    """
+
+    def __init__(self, trace_memory=False, profile_path=None):
+        self.trace_memory = trace_memory
+        self.profile_path = profile_path
+        self.versions = {}
+        self.started = time.perf_counter()
+        self._slowest = None
+
+    def start(self):
+        if self.trace_memory:
+            tracemalloc.start()
+
+    def stop(self):
+        if self.trace_memory:
+            tracemalloc.stop()
+        if self._slowest:
+            self._slowest[3].dump_stats(self.profile_path)
+
+    def version(self, key):
+        return self.versions.setdefault(key, {"status": None, "stages": {}, "counters": {}})
+
+    def record(self, key, stage, seconds, peak_memory=None):
+        self.version(key)["stages"][stage] = {"seconds": round(seconds, 6), "peak_memory": peak_memory}
+
+    def count(self, key, **counters):
+        version_counters = self.version(key)["counters"]
+        for name, value in counters.items():
+            version_counters[name] = version_counters.get(name, 0) + value
+
+    def merge(self, key, version_report):
+        """Merges the stages and counters a worker process recorded for a version."""
+        self.version(key)["stages"].update(version_report["stages"])
+        self.count(key, **version_report["counters"])
+
+    @contextmanager
+    def stage(self, key, stage):
+        """Times the wrapped block as ``stage`` of version ``key``."""
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        profile = cProfile.Profile() if self.profile_path else None
+        start = time.perf_counter()
+        if profile:
+            profile.enable()
+        try:
+            yield
+        finally:
+            if profile:
+                profile.disable()
+            seconds = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1] if self.trace_memory else None
+            self.record(key, stage, seconds, peak)
+            if profile and (self._slowest is None or seconds > self._slowest[2]):
+                self._slowest = (key, stage, seconds, profile)
+
+    def as_dict(self):
+        report = {
+            "total_seconds": round(time.perf_counter() - self.started, 6),
+            "trace_memory": self.trace_memory,
+            "versions": self.versions,
+        }
+        if self._slowest:
+            key, stage, seconds, _ = self._slowest
+            report["profile"] = {"version": key, "stage": stage, "seconds": round(seconds, 6), "path": self.profile_path}
+        return report
+
+    def write(self, path):
+        with open(path, "w") as f:
+            json.dump(self.as_dict(), f, indent=2)
+            f.write("\n")
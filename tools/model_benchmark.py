@@ -0,0 +1,134 @@
+"""
+Benchmarks the slotted payload models of model_generator.py against the
+plain dicts of json.loads, in decode time and in the memory each decoded
+event holds:
+
+    python model_benchmark.py ../public/api/admin/unstable.json
+    python model_benchmark.py ../public/api/admin/unstable.json --events "order.*" --count 2000
+
+Payloads are synthetic events from webhook_events.py. Models are measured
+as a receiver typically uses them, reading the top level fields of data
+and leaving nested objects undecoded, and fully decoded. Every model is
+checked to turn back into its payload.
+"""
+import argparse
+import fnmatch
+import gc
+import importlib
+import json
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from model_generator import generate_models
+from spec_diff import load_spec
+from webhook_events import WebhookEventGenerator
+
+
+def decode_dict(body):
+    return json.loads(body)
+
+
+def covers(value, payload):
+    """Whether value holds everything payload does; models read missing keys as None."""
+    if isinstance(payload, dict):
+        return isinstance(value, dict) and all(key in value and covers(value[key], payload[key]) for key in payload)
+    if isinstance(payload, list):
+        return isinstance(value, list) and len(value) == len(payload) and all(map(covers, value, payload))
+    return value == payload
+
+
+def decode_all(model, base):
+    """Reads every field of model, decoding all its nested models."""
+    for name in model._fields:
+        value = getattr(model, name)
+        if isinstance(value, base):
+            decode_all(value, base)
+        elif value.__class__ is list:
+            for each in value:
+                if isinstance(each, base):
+                    decode_all(each, base)
+    return model
+
+
+def timed(func, bodies, number):
+    start = time.perf_counter()
+    for _ in range(number):
+        for body in bodies:
+            func(body)
+    return (time.perf_counter() - start) / (number * len(bodies))
+
+
+def retained(func, bodies):
+    """Bytes allocated per body by func that are still held while all its results are."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    results = [func(body) for body in bodies]
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del results
+    return size / len(bodies)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark slotted webhook payload models against dicts")
+    parser.add_argument("spec", help="processed admin spec (YAML or JSON)")
+    parser.add_argument("--events", nargs="*", metavar="PATTERN", default=["order.*", "subscription.*"],
+                        help="event globs (default order.* and subscription.*)")
+    parser.add_argument("--count", type=int, default=1000, help="synthetic events per event type")
+    parser.add_argument("--number", type=int, default=3, help="decodes of each event per timing")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    spec = load_spec(args.spec)
+    output = tempfile.mkdtemp(prefix="models-")
+    generate_models(spec, output, "bench_models", args.events)
+    sys.path.insert(0, output)
+    models = importlib.import_module("bench_models")
+
+    def decode_lazy(body):
+        event = models.decode(body)
+        event.data
+        return event
+
+    def decode_full(body):
+        event = models.decode(body)
+        decode_all(event.data, models.Model)
+        return event
+
+    variants = (("dict", decode_dict), ("model", decode_lazy), ("model, decoded", decode_full))
+    results = {}
+    mismatches = 0
+    print("{:<22} {:>9}  {}".format("event", "bytes", "  ".join("{:>22}".format(name) for name, _ in variants)))
+    print("{:<22} {:>9}  {}".format("", "", "  ".join("{:>9} {:>12}".format("us", "bytes held") for _ in variants)))
+    for event in models.DATA_MODELS:
+        if not any(fnmatch.fnmatch(event, pattern) for pattern in args.events or ["*"]):
+            continue
+        generator = WebhookEventGenerator(spec, [event], args.seed)
+        bodies = [json.dumps(generator.generate()).encode() for _ in range(args.count)]
+        for body in bodies:
+            if not covers(decode_full(body).to_dict(), json.loads(body)):
+                mismatches += 1
+                print("Mismatch for {}: {}".format(event, body[:200]), file=sys.stderr)
+
+        results[event] = {"payload_bytes": sum(map(len, bodies)) / len(bodies)}
+        for name, func in variants:
+            results[event][name] = {"seconds": timed(func, bodies, args.number), "bytes": retained(func, bodies)}
+        print("{:<22} {:>9.0f}  {}".format(event, results[event]["payload_bytes"], "  ".join(
+            "{:>9.1f} {:>12.0f}".format(results[event][name]["seconds"] * 1e6, results[event][name]["bytes"])
+            for name, _ in variants
+        )))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"mismatches": mismatches, "events": results}, f, indent=2)
+    if mismatches:
+        print("{} events didn't turn back into their payloads".format(mismatches), file=sys.stderr)
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
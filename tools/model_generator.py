@@ -0,0 +1,360 @@
+"""
+Generates slotted payload model classes from the webhook data schemas.
+
+For every webhook event of a processed spec, the resolved data schema (as
+built by webhooks.webhook_schema_generator) becomes a ``__slots__`` class,
+as does every nested object schema, so receivers can hold payloads without
+a dict per object:
+
+    python model_generator.py ../public/api/admin/unstable.yaml --output build/models
+    python model_generator.py ../public/api/admin/unstable.json --events "order.*" "subscription.*"
+
+    from admin_unstable_models import decode
+    event = decode(body)
+    event.data.billing_address.country
+
+Models are decoded from the dicts of json.loads by generated straight-line
+constructors. Nested objects and lists of objects are only decoded when
+their attribute is first read, so the rarely used parts of a payload cost
+nothing until then. Keys that aren't in the schema are dropped and missing
+ones read as None; to_dict() turns a model back into plain dicts.
+"""
+import argparse
+import fnmatch
+import json
+import os
+
+from client_generator import identifier
+from config import CACHE_DIR, WEBHOOKS
+from spec_diff import load_spec
+from validator_compiler import event_schema, module_name
+from webhooks import webhook_data_schema_name
+
+RUNTIME = '''
+import json
+
+_new = object.__new__
+
+
+class Model:
+    """
+    Base of the payload models, see the module docstring. Subclasses must
+    define a from_dict(cls, data) classmethod building a model from the
+    decoded JSON object data, which from_json relies on.
+    """
+
+    __slots__ = ()
+    # Attribute and JSON key of every field
+    _fields = ()
+    _keys = ()
+
+    @classmethod
+    def from_json(cls, data):
+        return cls.from_dict(json.loads(data))
+
+    def to_dict(self):
+        return {key: _plain(getattr(self, name)) for name, key in zip(self._fields, self._keys)}
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return "{}({})".format(
+            type(self).__name__, ", ".join("{}={!r}".format(name, getattr(self, name)) for name in self._fields)
+        )
+
+
+def _from_dicts(model, values):
+    return [model.from_dict(each) if each.__class__ is dict else each for each in values]
+
+
+def _plain(value):
+    if isinstance(value, Model):
+        return value.to_dict()
+    if value.__class__ is list:
+        return [_plain(each) for each in value]
+    return value
+'''
+
+EVENT = '''
+
+class WebhookEvent(Model):
+    """A webhook event; data is decoded into the model of its event_type on first access."""
+
+    __slots__ = ("api_version", "object", "event_id", "event_type", "webhook", "_data", "_decoded")
+    _fields = ("api_version", "object", "data", "event_id", "event_type", "webhook")
+    _keys = _fields
+
+    @classmethod
+    def from_dict(cls, data):
+        self = _new(cls)
+        get = data.get
+        self.api_version = get("api_version")
+        self.object = get("object")
+        self._data = get("data")
+        self.event_id = get("event_id")
+        self.event_type = get("event_type")
+        self.webhook = get("webhook")
+        self._decoded = 0
+        return self
+
+    @property
+    def data(self):
+        if not self._decoded:
+            model = DATA_MODELS.get(self.event_type)
+            if model is not None and self._data.__class__ is dict:
+                self._data = model.from_dict(self._data)
+            self._decoded = 1
+        return self._data
+
+
+def decode(payload):
+    """Decodes a webhook request body (bytes, str or the dict of json.loads) into a WebhookEvent."""
+    return WebhookEvent.from_dict(payload if isinstance(payload, dict) else json.loads(payload))
+'''
+
+
+def camel(name):
+    return "".join(part[:1].upper() + part[1:] for part in identifier(name).split("_"))
+
+
+def singular(name):
+    """Class name of the items of a list field, e.g. Categories -> Category."""
+    if name.endswith("ies"):
+        return name[:-3] + "y"
+    if name.endswith("sses"):
+        return name[:-2]
+    if name.endswith("s") and not name.endswith("ss"):
+        return name[:-1]
+    return name
+
+
+def tuple_lines(start, values, end=")", indent="    "):
+    """Source lines of start, the reprs of values and end, wrapped at 120 columns."""
+    items = ["{!r},".format(value) for value in values]
+    line = "{}{}{}{}".format(indent, start, " ".join(items), end)
+    if len(line) <= 120:
+        return [line]
+    lines = [indent + start]
+    for item in items:
+        if len(lines) == 1 or len(lines[-1]) + len(item) + 1 > 120:
+            lines.append(indent + "    " + item)
+        else:
+            lines[-1] += " " + item
+    return lines + [indent + end]
+
+
+class ModelGenerator:
+    """
+    Generates the model classes of a spec's webhook data schemas. Equal
+    object schemas, e.g. the address of every order event, share a class.
+    """
+
+    def __init__(self, spec):
+        self.spec = spec
+        self.classes = []
+        self.enums = {}
+        self.names = {"Model", "WebhookEvent"}
+        self._by_schema = {}
+        self._refs = {}
+
+    def unique(self, *candidates):
+        """The first of candidates that isn't taken yet, numbered if all are."""
+        for name in candidates:
+            if name not in self.names:
+                break
+        else:
+            name = next(candidates[-1] + str(n) for n in range(2, 1000) if candidates[-1] + str(n) not in self.names)
+        self.names.add(name)
+        return name
+
+    def ref_model(self, ref):
+        """The class of a component schema left as a $ref, e.g. back to one being resolved."""
+        if ref not in self._refs:
+            name = ref.split("/")[-1]
+            schema = self.spec["components"]["schemas"][name]
+            self._refs[ref] = self.unique(name)
+            self.emit(self._refs[ref], schema)
+        return self._refs[ref]
+
+    def model(self, schema, *names):
+        """The class of an object schema, generating it on first use."""
+        if "$ref" in schema:
+            return self.ref_model(schema["$ref"])
+        key = json.dumps(schema, sort_keys=True)
+        if key not in self._by_schema:
+            # Registered before its fields, so recursive schemas refer to themselves
+            self._by_schema[key] = self.unique(*names)
+            self.emit(self._by_schema[key], schema)
+        return self._by_schema[key]
+
+    def enum(self, values):
+        """The name of a dict mapping the values of an enum to one shared instance of each."""
+        values = tuple(value for value in values if isinstance(value, str))
+        if values not in self.enums:
+            self.enums[values] = "_E{}".format(len(self.enums))
+        return self.enums[values]
+
+    def target(self, schema):
+        """The component schema a $ref points to, else schema itself."""
+        if isinstance(schema, dict) and "$ref" in schema:
+            return self.spec["components"]["schemas"].get(schema["$ref"].split("/")[-1], {})
+        return schema
+
+    def object_schema(self, schema):
+        """The object schema a property holds, following allOf/oneOf of one entry, or None."""
+        while isinstance(schema, dict):
+            for keyword in ("allOf", "oneOf", "anyOf"):
+                if len(schema.get(keyword) or ()) == 1:
+                    schema = schema[keyword][0]
+                    break
+            else:
+                return schema if self.target(schema).get("properties") else None
+        return None
+
+    def enum_values(self, schema):
+        """Values of an enum schema, or of the enums it's one of, e.g. an enum, blank or null."""
+        schema = self.target(schema)
+        if not isinstance(schema, dict):
+            return []
+        values = list(schema.get("enum") or ())
+        for each in schema.get("oneOf", []) + schema.get("anyOf", []) + schema.get("allOf", []):
+            values += [value for value in self.enum_values(each) if value not in values]
+        return values
+
+    def field(self, schema, parent, key):
+        """(kind, target) of a property: ("value", None), ("enum", dict), ("object", class) or ("list", class)."""
+        names = (camel(key), parent + camel(key))
+        nested = self.object_schema(schema)
+        if nested is not None:
+            return "object", self.model(nested, *names)
+        if isinstance(schema, dict) and self.object_schema(schema.get("items")) is not None:
+            names = (singular(camel(key)), parent + singular(camel(key)))
+            return "list", self.model(self.object_schema(schema["items"]), *names)
+        values = self.enum_values(schema)
+        if any(isinstance(value, str) for value in values):
+            return "enum", self.enum(values)
+        return "value", None
+
+    def emit(self, name, schema):
+        fields = []
+        attributes = set()
+        for key, value in (schema.get("properties") or {}).items():
+            attribute = identifier(key)
+            while attribute in attributes or attribute in ("from_dict", "from_json", "to_dict"):
+                attribute += "_"
+            attributes.add(attribute)
+            fields.append((attribute, key) + self.field(value, name, key))
+
+        lazy = [field for field in fields if field[2] in ("object", "list")]
+        slots = [attribute if kind not in ("object", "list") else "_" + attribute for attribute, _, kind, _ in fields]
+        if lazy:
+            slots.append("_decoded")
+        lines = [
+            "",
+            "",
+            "class {}(Model):".format(name),
+        ]
+        lines += tuple_lines("__slots__ = (", slots)
+        lines += tuple_lines("_fields = (", [field[0] for field in fields])
+        lines += tuple_lines("_keys = (", [field[1] for field in fields])
+        lines += [
+            "",
+            "    @classmethod",
+            "    def from_dict(cls, data):",
+            "        self = _new(cls)",
+            "        get = data.get",
+        ]
+        for attribute, key, kind, target in fields:
+            if kind == "enum":
+                lines.append("        value = get({!r})".format(key))
+                lines.append("        self.{} = {}.get(value, value) if value.__class__ is str else value".format(
+                    attribute, target
+                ))
+            else:
+                slot = attribute if kind == "value" else "_" + attribute
+                lines.append("        self.{} = get({!r})".format(slot, key))
+        if lazy:
+            lines.append("        self._decoded = 0")
+        lines.append("        return self")
+
+        for bit, (attribute, key, kind, target) in enumerate(lazy):
+            if kind == "object":
+                decode = "value = self._{0} = {1}.from_dict(value)".format(attribute, target)
+                check = "value.__class__ is dict"
+            else:
+                decode = "value = self._{} = _from_dicts({}, value)".format(attribute, target)
+                check = "value.__class__ is list"
+            lines += [
+                "",
+                "    @property",
+                "    def {}(self):".format(attribute),
+                "        value = self._{}".format(attribute),
+                "        if not self._decoded & {}:".format(1 << bit),
+                "            if {}:".format(check),
+                "                {}".format(decode),
+                "            self._decoded |= {}".format(1 << bit),
+                "        return value",
+            ]
+        self.classes.append(lines)
+
+    def generate(self, events, header):
+        """Source of the models module of the given WEBHOOKS entries."""
+        data_models = {}
+        for each in events:
+            data = event_schema(self.spec, each["event"]).get("properties", {}).get("data")
+            data = self.object_schema(data)
+            if data is not None:
+                data_models[each["event"]] = self.model(data, webhook_data_schema_name(each))
+
+        lines = ['"""', header, '"""'] + RUNTIME.strip("\n").split("\n")
+        if self.enums:
+            lines += ["", "", "# Values of the enum fields, shared by every model decoded"]
+        for values, name in self.enums.items():
+            lines += tuple_lines(name + " = {value: value for value in (", values, ")}", "")
+        for each in self.classes:
+            lines += each
+        lines += EVENT.rstrip("\n").split("\n")
+        lines += ["", "", "DATA_MODELS = {"]
+        lines += ["    {!r}: {},".format(event, name) for event, name in data_models.items()]
+        lines += ["}"]
+        return "\n".join(lines) + "\n"
+
+
+def generate_models(spec, output, module, events=None):
+    """
+    Writes the models module of the webhook events of a parsed spec matching
+    any of the ``events`` glob patterns (default all). Returns its path.
+    """
+    selected = [
+        each for each in WEBHOOKS
+        if each["event"] in spec.get("webhooks", {})
+        and (not events or any(fnmatch.fnmatch(each["event"], pattern) for pattern in events))
+    ]
+    header = (
+        "Webhook payload models, API version {}. Generated by\n"
+        "model_generator.py, do not edit."
+    ).format(spec["info"]["version"])
+    os.makedirs(output, exist_ok=True)
+    path = os.path.join(output, module + ".py")
+    with open(path, "w") as f:
+        f.write(ModelGenerator(spec).generate(selected, header))
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate slotted webhook payload models from a processed spec")
+    parser.add_argument("spec", help="processed admin spec (YAML or JSON)")
+    parser.add_argument("--output", default=os.path.join(CACHE_DIR, "models"), help="directory for the module")
+    parser.add_argument("--module", help="module name (default <type>_<version>_models from the spec file)")
+    parser.add_argument("--events", nargs="*", metavar="PATTERN", help="event globs, e.g. 'order.*'")
+    args = parser.parse_args(argv)
+
+    spec = load_spec(args.spec)
+    parent, file_name = os.path.split(os.path.abspath(args.spec))
+    module = args.module or module_name("{}_{}_models".format(os.path.basename(parent), os.path.splitext(file_name)[0]))
+    print("Wrote {}".format(generate_models(spec, args.output, module, args.events)))
+
+
+if __name__ == "__main__":
+    main()
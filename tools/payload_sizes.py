@@ -0,0 +1,428 @@
+"""
+Webhook payload sizes for capacity planning.
+
+For every webhook event of every configured API version, estimates the
+serialized (compact JSON, UTF-8) size of its payloads and describes their
+shape, so body, queue message and storage limits can be set before a
+version is released:
+
+    python payload_sizes.py                                  # rewrite every version's report
+    python payload_sizes.py ../public/api/admin/2024-04-01.json ../public/api/admin/unstable.json
+
+The minimum and worst case sizes are bounds worked out from the event's
+payload schema: the minimum holds only required properties, with empty
+arrays and the shortest values, the worst case every property, with
+arrays and strings at their limits. Where the schema sets no limit, the
+worst case assumes PAYLOAD_ARRAY_MAX items and PAYLOAD_STRING_MAX
+characters and counts the field as assumed. Typical and p95 sizes are
+measured over PAYLOAD_SAMPLES synthetic events from webhook_events.py.
+
+update_api_docs.py writes the report of each version as PAYLOAD_SIZES_FILE
+next to its shards, with the events' nesting depth, arrays, the fields
+and arrays taking most of their worst case size, and what changed since
+the previous version in API_VERSIONS.
+"""
+import argparse
+import json
+import math
+import os
+import statistics
+import sys
+
+from artifacts import write_artifact
+from config import (
+    API_VERSIONS,
+    BASE_API_FILES_PATH,
+    PAYLOAD_ARRAY_MAX,
+    PAYLOAD_DRIVERS,
+    PAYLOAD_SAMPLES,
+    PAYLOAD_SIZES_FILE,
+    PAYLOAD_STRING_MAX,
+    WEBHOOKS,
+)
+from shards import shards_path
+from spec_cache import content_digest, default_cache
+from spec_diff import load_spec
+from validator_compiler import event_schema, is_trivial
+from webhook_events import WebhookEventGenerator
+
+try:
+    # CPython's private regex parser, only used to bound strings by their
+    # pattern. Without it patterns are ignored, which only loosens bounds.
+    from re import _parser as sre_parse
+except ImportError:
+    sre_parse = None
+
+TOOL_DIR = os.path.dirname(os.path.abspath(__file__))
+# Sources that can change the sizes of a spec
+SIZE_SOURCES = ("payload_sizes.py", "webhook_events.py")
+
+# Lengths (shortest, longest) of strings in these formats
+FORMAT_LENGTHS = {
+    "date-time": (20, 32),  # 2024-01-01T00:00:00Z to 2024-01-01T00:00:00.000000+00:00
+    "date": (10, 10),
+    "time": (5, 21),
+    "uuid": (36, 36),
+    "email": (3, 254),
+    "ipv4": (7, 15),
+    "ipv6": (2, 45),
+}
+JSON_TYPES = ("object", "array", "string", "integer", "number", "boolean", "null")
+# Longest JSON numbers, e.g. -9223372036854775808 and -2.2250738585072014e-308
+INT32_LENGTH = 11
+INT64_LENGTH = 20
+NUMBER_LENGTH = 24
+
+
+def json_size(value):
+    return len(json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode())
+
+
+def pattern_length(pattern):
+    """The (shortest, longest) strings an anchored pattern matches, or None if unanchored or unbounded."""
+    if sre_parse is None or not (pattern.startswith("^") and pattern.endswith("$")):
+        return None
+    try:
+        low, high = sre_parse.parse(pattern).getwidth()
+        bounded = high < sre_parse.MAXREPEAT
+    except Exception:
+        return None
+    return (low, high) if bounded else None
+
+
+def integer_length(value):
+    return len(str(int(value)))
+
+
+class PayloadSizer:
+    """
+    Bounds the serialized size of the values of a schema. measure() records
+    the path of every property, the nesting depth and arrays reached, the
+    bytes every array takes in the worst case, and for every scalar field
+    the bytes its values take and whether that rests on an assumption: a
+    string or array without limit, a free-form object or a schema reached
+    again through its own $ref.
+    """
+
+    def __init__(self, spec, string_max=PAYLOAD_STRING_MAX, array_max=PAYLOAD_ARRAY_MAX):
+        self.spec = spec
+        self.string_max = string_max
+        self.array_max = array_max
+
+    def measure(self, schema):
+        """Returns the (minimum, worst case) size of values of schema."""
+        self.paths = set()
+        self.fields = {}
+        self.array_fields = {}
+        self.arrays = 0
+        self.depth = 0
+        low, high, _ = self._measure(schema, "", 0, 1, ())
+        return low, high
+
+    def _field(self, path, items, low, high, assumed=False):
+        """Records a scalar field occurring up to items times."""
+        size, was_assumed = self.fields.get(path, (0, False))
+        self.fields[path] = (max(size, high * items), was_assumed or assumed)
+        return low, high, assumed
+
+    def _unbounded(self, path, items, low):
+        return self._field(path, items, low, max(low, self.string_max), True)
+
+    def _measure(self, schema, path, depth, items, refs):
+        if not isinstance(schema, dict) or is_trivial(schema):
+            return self._unbounded(path, items, 1)
+        if "$ref" in schema:
+            if schema["$ref"] in refs:
+                return self._unbounded(path, items, 2)
+            target = self.spec["components"]["schemas"][schema["$ref"].split("/")[3]]
+            return self._measure(target, path, depth, items, refs + (schema["$ref"],))
+        if "const" in schema:
+            return self._field(path, items, json_size(schema["const"]), json_size(schema["const"]))
+        if "enum" in schema:
+            sizes = [json_size(value) for value in schema["enum"]]
+            return self._field(path, items, min(sizes), max(sizes))
+        if schema.get("allOf"):
+            merged = {key: value for key, value in schema.items() if key != "allOf"}
+            for entry in schema["allOf"]:
+                merged.update((key, value) for key, value in entry.items() if key not in ("properties", "required"))
+                merged.setdefault("properties", {}).update(entry.get("properties", {}))
+                merged["required"] = merged.get("required", []) + entry.get("required", [])
+            return self._measure(merged, path, depth, items, refs)
+        for keyword in ("oneOf", "anyOf"):
+            if schema.get(keyword):
+                base = {key: value for key, value in schema.items() if key != keyword}
+                options = [self._measure(dict(base, **option), path, depth, items, refs) for option in schema[keyword]]
+                return min(low for low, _, _ in options), max(high for _, high, _ in options), any(
+                    assumed for _, _, assumed in options
+                )
+
+        types = schema.get("type") or ("object" if "properties" in schema else "string")
+        types = [types] if isinstance(types, str) else types
+        # Unknown types are bounded like a free-form value
+        options = [
+            getattr(self, "_measure_" + each)(schema, path, depth, items, refs) if each in JSON_TYPES
+            else self._unbounded(path, items, 1)
+            for each in types
+        ]
+        return min(low for low, _, _ in options), max(high for _, high, _ in options), any(
+            assumed for _, _, assumed in options
+        )
+
+    def _measure_object(self, schema, path, depth, items, refs):
+        properties = schema.get("properties") or {}
+        if not properties:
+            if schema.get("additionalProperties") is False:
+                return self._field(path, items, 2, 2)
+            return self._unbounded(path, items, 2)
+        self.depth = max(self.depth, depth + 1)
+        required = set(schema.get("required", ()))
+        low = high = 2
+        low_count = 0
+        assumed = False
+        for key, value in properties.items():
+            child = "{}.{}".format(path, key) if path else key
+            self.paths.add(child)
+            value_low, value_high, value_assumed = self._measure(value, child, depth + 1, items, refs)
+            # The key, its colon and a comma
+            overhead = json_size(key) + 2
+            high += overhead + value_high
+            if key in required:
+                low += overhead + value_low
+                low_count += 1
+            assumed = assumed or value_assumed
+        # No comma after the last property
+        return low - min(low_count, 1), high - 1, assumed
+
+    def _measure_array(self, schema, path, depth, items, refs):
+        self.depth = max(self.depth, depth + 1)
+        self.arrays += 1
+        min_items = schema.get("minItems", 0)
+        max_items = max(schema.get("maxItems", self.array_max), min_items)
+        item_low, item_high, assumed = self._measure(
+            schema.get("items", {}), path + "[]", depth + 1, items * max_items, refs
+        )
+        low = 2 + min_items * (item_low + 1) - min(min_items, 1)
+        high = 2 + max_items * (item_high + 1) - min(max_items, 1)
+        size, _ = self.array_fields.get(path, (0, 0))
+        self.array_fields[path] = max((size, max_items), (high * items, max_items))
+        return low, high, assumed or "maxItems" not in schema
+
+    def _measure_string(self, schema, path, depth, items, refs):
+        low, high = FORMAT_LENGTHS.get(schema.get("format"), (0, None))
+        if "pattern" in schema and pattern_length(schema["pattern"]):
+            pattern_low, pattern_high = pattern_length(schema["pattern"])
+            low, high = max(low, pattern_low), pattern_high if high is None else min(high, pattern_high)
+        low = max(low, schema.get("minLength", 0))
+        if "maxLength" in schema:
+            high = schema["maxLength"] if high is None else min(high, schema["maxLength"])
+        if high is None:
+            return self._field(path, items, low + 2, max(low, self.string_max) + 2, True)
+        # Assumes nothing needs escaping
+        return self._field(path, items, low + 2, max(low, high) + 2)
+
+    def _measure_integer(self, schema, path, depth, items, refs):
+        lowest = schema.get("minimum", schema.get("exclusiveMinimum"))
+        highest = schema.get("maximum", schema.get("exclusiveMaximum"))
+        if lowest is not None and highest is not None:
+            high = max(integer_length(lowest), integer_length(highest))
+        else:
+            high = INT32_LENGTH if schema.get("format") == "int32" else INT64_LENGTH
+        low = 1
+        if lowest is not None and lowest >= 10:
+            low = integer_length(math.ceil(lowest))
+        elif highest is not None and highest <= -10:
+            low = integer_length(math.floor(highest))
+        return self._field(path, items, low, max(low, high))
+
+    def _measure_number(self, schema, path, depth, items, refs):
+        return self._field(path, items, 1, NUMBER_LENGTH)
+
+    def _measure_boolean(self, schema, path, depth, items, refs):
+        return self._field(path, items, 4, 5)
+
+    def _measure_null(self, schema, path, depth, items, refs):
+        return self._field(path, items, 4, 4)
+
+
+def percentile(sizes, share):
+    """The value share of the sorted sizes are at or below."""
+    return sizes[max(0, math.ceil(share * len(sizes)) - 1)]
+
+
+def event_sizes(spec, event, samples=PAYLOAD_SAMPLES, seed=0, sizer=None):
+    """The sizes and shape of the payloads of an event, with the paths of its fields."""
+    sizer = sizer or PayloadSizer(spec)
+    schema = event_schema(spec, event)
+    if "required" not in schema:
+        # Every envelope field is sent, though the schema doesn't require them
+        schema = dict(schema, required=list(schema.get("properties", {})))
+    low, high = sizer.measure(schema)
+    generator = WebhookEventGenerator(spec, [event], seed)
+    measured = sorted(json_size(generator.generate()) for _ in range(samples))
+    drivers = sorted(sizer.fields.items(), key=lambda item: (-item[1][0], item[0]))[:PAYLOAD_DRIVERS]
+    arrays = sorted(sizer.array_fields.items(), key=lambda item: (-item[1][0], item[0]))[:PAYLOAD_DRIVERS]
+    return {
+        "min_bytes": low,
+        "typical_bytes": round(statistics.median(measured)) if measured else None,
+        "p95_bytes": percentile(measured, 0.95) if measured else None,
+        "worst_bytes": high,
+        "depth": sizer.depth,
+        "arrays": sizer.arrays,
+        "fields": len(sizer.paths),
+        "assumed_fields": sum(assumed for _, assumed in sizer.fields.values()),
+        "drivers": [
+            {"path": path, "bytes": size, "share": round(size / high, 3), "assumed": assumed}
+            for path, (size, assumed) in drivers
+        ],
+        "array_drivers": [
+            {"path": path, "bytes": size, "share": round(size / high, 3), "max_items": max_items}
+            for path, (size, max_items) in arrays
+        ],
+        "paths": sorted(sizer.paths),
+    }
+
+
+def spec_sizes(spec, samples=PAYLOAD_SAMPLES, seed=0):
+    """event_sizes() of every config.WEBHOOKS event of a parsed spec."""
+    sizer = PayloadSizer(spec)
+    return {
+        each["event"]: event_sizes(spec, each["event"], samples, seed, sizer)
+        for each in WEBHOOKS
+        if each["event"] in spec.get("webhooks", {})
+    }
+
+
+def load_sizes(path, samples=PAYLOAD_SAMPLES, seed=0):
+    """
+    spec_sizes() of the spec at path, kept in the spec cache by the spec's
+    content, the settings and the sources the sizes depend on.
+    """
+    with open(path, "rb") as f:
+        content = f.read()
+    for name in SIZE_SOURCES:
+        with open(os.path.join(TOOL_DIR, name), "rb") as f:
+            content += f.read()
+    content += repr((samples, seed, PAYLOAD_STRING_MAX, PAYLOAD_ARRAY_MAX, PAYLOAD_DRIVERS)).encode()
+    digest = content_digest(content)
+    cache = default_cache()
+    sizes = cache.load("sizes", digest) if cache else None
+    if sizes is None:
+        sizes = spec_sizes(load_spec(path), samples, seed)
+        if cache:
+            cache.save("sizes", digest, sizes)
+    return sizes
+
+
+def size_changes(previous, current):
+    """What changed in the sizes and shape of an event since its previous version."""
+    changes = {
+        key: current[key] - previous[key]
+        for key in ("min_bytes", "typical_bytes", "p95_bytes", "worst_bytes", "depth", "arrays", "fields")
+        if current[key] is not None and previous[key] is not None
+    }
+    changes["fields_added"] = sorted(set(current["paths"]) - set(previous["paths"]))
+    changes["fields_removed"] = sorted(set(previous["paths"]) - set(current["paths"]))
+    return changes
+
+
+def size_report(type, version, sizes, previous_version=None, previous_sizes=None, samples=PAYLOAD_SAMPLES):
+    """The report of a version's sizes, compared with those of previous_version when given."""
+    events = {}
+    for event, stats in sizes.items():
+        events[event] = {key: value for key, value in stats.items() if key != "paths"}
+        if previous_sizes and event in previous_sizes:
+            events[event]["changes"] = size_changes(previous_sizes[event], stats)
+    return {
+        "type": type,
+        "version": version,
+        "previous_version": previous_version,
+        "assumptions": {
+            "string_max": PAYLOAD_STRING_MAX,
+            "array_max": PAYLOAD_ARRAY_MAX,
+            "samples": samples,
+            "serialization": "compact JSON, UTF-8",
+        },
+        "events": events,
+        "events_added": sorted(set(sizes) - set(previous_sizes)) if previous_sizes is not None else [],
+        "events_removed": sorted(set(previous_sizes) - set(sizes)) if previous_sizes is not None else [],
+    }
+
+
+def spec_json_path(type, version):
+    return os.path.join(BASE_API_FILES_PATH, type, version + ".json")
+
+
+def write_payload_sizes(type):
+    """
+    Writes the size report of every version of type in API_VERSIONS whose
+    processed spec has webhooks, each compared with the version before it.
+    Returns the manifest entries of the files written.
+    """
+    entries = {}
+    previous_version = previous_sizes = None
+    for each in API_VERSIONS:
+        path = spec_json_path(type, each["version"])
+        if each["type"] != type or not os.path.exists(path):
+            continue
+        sizes = load_sizes(path)
+        if not sizes:
+            continue
+        report = size_report(type, each["version"], sizes, previous_version, previous_sizes)
+        report_path = os.path.join(shards_path(type, each["version"]), PAYLOAD_SIZES_FILE)
+        os.makedirs(os.path.dirname(report_path), exist_ok=True)
+        entries.update(write_artifact(report_path, (json.dumps(report, indent=2) + "\n").encode()))
+        previous_version, previous_sizes = each["version"], sizes
+    return entries
+
+
+def print_sizes(name, sizes, previous_sizes=None):
+    print(name)
+    print("  {:<32} {:>8} {:>8} {:>8} {:>10} {:>6} {:>7} {:>10}".format(
+        "event", "min", "typical", "p95", "worst", "depth", "arrays", "worst +/-"
+    ))
+    for event, stats in sizes.items():
+        change = ""
+        if previous_sizes and event in previous_sizes:
+            change = "{:+d}".format(stats["worst_bytes"] - previous_sizes[event]["worst_bytes"])
+        print("  {:<32} {:>8} {:>8} {:>8} {:>10} {:>6} {:>7} {:>10}".format(
+            event, stats["min_bytes"], stats["typical_bytes"], stats["p95_bytes"], stats["worst_bytes"],
+            stats["depth"], stats["arrays"], change,
+        ))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Estimate webhook payload sizes from processed specs")
+    parser.add_argument("specs", nargs="*",
+                        help="processed specs (YAML or JSON), oldest first; default every configured version")
+    parser.add_argument("--samples", type=int, default=PAYLOAD_SAMPLES, help="synthetic events per event")
+    parser.add_argument("--output", help="write the report of the last spec as JSON to this file")
+    args = parser.parse_args(argv)
+
+    if not args.specs:
+        for type in sorted({each["type"] for each in API_VERSIONS}):
+            for path in sorted(write_payload_sizes(type)):
+                if path.endswith(PAYLOAD_SIZES_FILE):
+                    print("Wrote {}".format(os.path.join(BASE_API_FILES_PATH, path)))
+        return 0
+
+    previous_name = previous_sizes = None
+    for path in args.specs:
+        sizes = load_sizes(path, args.samples)
+        if not sizes:
+            print("{} has no webhook events".format(path), file=sys.stderr)
+            continue
+        print_sizes(path, sizes, previous_sizes)
+        name = os.path.splitext(os.path.basename(path))[0]
+        report = size_report(
+            os.path.basename(os.path.dirname(os.path.abspath(path))), name, sizes, previous_name, previous_sizes,
+            args.samples,
+        )
+        previous_name, previous_sizes = name, sizes
+    if args.output and previous_sizes is not None:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
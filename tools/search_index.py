@@ -0,0 +1,205 @@
+"""
+Search records and a local inverted index for the API reference.
+
+Every refresh writes BASE_API_FILES_PATH/<type>/<version>/search.json with
+a record per operation, parameter, component schema field, webhook event
+and webhook payload field. Record ids are stable across refreshes and
+every record carries a hash of its content, so search_sync.py can upload
+only the records that changed. Search the artifact locally with:
+
+    python search_index.py admin/unstable "refund order"
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+
+from artifacts import minified_json, write_artifact
+from config import SEARCH_INDEX_FILE, SEARCH_MAX_FIELD_DEPTH, WEBHOOKS
+from shards import operations, shard_name, shards_path
+
+# Result order when several records match equally well
+RECORD_TYPES = ("operation", "webhook", "parameter", "webhook_field", "field")
+DESCRIPTION_LENGTH = 300
+
+
+def tokenize(text):
+    """Lowercase word tokens of text, with camelCase and snake_case split up."""
+    text = re.sub(r"([a-z0-9])([A-Z])", r"\1 \2", text or "")
+    return [token for token in re.findall(r"[a-z0-9]+", text.lower()) if len(token) > 1]
+
+
+def summary(description):
+    """The first paragraph of a description, cut to DESCRIPTION_LENGTH."""
+    text = (description or "").strip().split("\n\n")[0]
+    return text if len(text) <= DESCRIPTION_LENGTH else text[:DESCRIPTION_LENGTH].rsplit(" ", 1)[0] + "..."
+
+
+def schema_fields(spec, schema, prefix="", depth=0, seen=()):
+    """
+    Yields (field path, field schema) for the properties of schema, like
+    spec_diff.field_path: nested objects as "a.b" and array items as "a[]",
+    up to SEARCH_MAX_FIELD_DEPTH levels. Local $refs are followed when spec
+    is given (webhook data schemas reference components in "components"
+    output).
+    """
+    if not isinstance(schema, dict) or depth >= SEARCH_MAX_FIELD_DEPTH:
+        return
+    ref = schema.get("$ref")
+    if spec and isinstance(ref, str) and ref.startswith("#/components/schemas/"):
+        if ref in seen:
+            return
+        target = spec.get("components", {}).get("schemas", {}).get(ref.split("/")[3])
+        yield from schema_fields(spec, target, prefix, depth, seen + (ref,))
+        return
+    for name, value in (schema.get("properties") or {}).items():
+        path = prefix + name
+        yield path, value
+        yield from schema_fields(spec, value, path + ".", depth + 1, seen)
+    if isinstance(schema.get("items"), dict):
+        yield from schema_fields(spec, schema["items"], prefix[:-1] + "[]." if prefix else "", depth, seen)
+    for keyword in ("allOf", "oneOf", "anyOf"):
+        for entry in schema.get(keyword) or []:
+            yield from schema_fields(spec, entry, prefix, depth, seen)
+
+
+def field_type(schema):
+    if not isinstance(schema, dict):
+        return None
+    if "$ref" in schema:
+        return schema["$ref"].split("/")[-1]
+    value = schema.get("type")
+    return "/".join(value) if isinstance(value, list) else value
+
+
+def build_records(type, version, spec):
+    """
+    Returns the search records of a parsed spec. Each has a stable
+    objectID, the api type and version, a record type, a title, the fields
+    that are searched and a hash of all of them.
+    """
+    base = "{}/{}".format(type, version)
+    records = []
+
+    def add(kind, key, title, **fields):
+        record = {"objectID": "{}/{}/{}".format(base, kind, key), "api": type, "version": version, "type": kind}
+        record["title"] = title
+        record.update((name, value) for name, value in fields.items() if value not in (None, "", []))
+        record["hash"] = hashlib.sha256(minified_json(record).encode()).hexdigest()[:16]
+        records.append(record)
+
+    for operation_id, method, path, operation in operations(spec):
+        shard = "operations/{}.json".format(shard_name(operation_id))
+        add(
+            "operation", operation_id, "{} {}".format(method.upper(), path),
+            name=operation_id, tags=operation.get("tags", []),
+            description=summary(operation.get("summary") or operation.get("description")), shard=shard,
+        )
+        for parameter in operation.get("parameters", []):
+            if "name" not in parameter:
+                continue
+            add(
+                "parameter", "{}/{}/{}".format(operation_id, parameter.get("in"), parameter["name"]), parameter["name"],
+                operation=operation_id, location=parameter.get("in"), field_type=field_type(parameter.get("schema")),
+                description=summary(parameter.get("description")), shard=shard,
+            )
+
+    for name, schema in spec.get("components", {}).get("schemas", {}).items():
+        # Referenced schemas have records of their own
+        for path, value in schema_fields(None, schema):
+            add(
+                "field", "{}/{}".format(name, path), "{}.{}".format(name, path),
+                schema=name, field_type=field_type(value),
+                description=summary(value.get("description") if isinstance(value, dict) else None),
+            )
+
+    webhook_tags = {each["event"]: each["tag"] for each in WEBHOOKS}
+    for event, path_item in spec.get("webhooks", {}).items():
+        post = path_item.get("post", {})
+        tag = webhook_tags.get(event) or (post.get("tags") or ["default"])[0]
+        shard = "tags/{}.json".format(shard_name(tag))
+        add("webhook", event, event, tags=[tag], description=summary(post.get("description")), shard=shard)
+        payload = post.get("requestBody", {}).get("content", {}).get("application/json", {}).get("schema", {})
+        data = payload.get("properties", {}).get("data")
+        for path, value in schema_fields(spec, data):
+            add(
+                "webhook_field", "{}/data.{}".format(event, path), "{}: data.{}".format(event, path),
+                event=event, field_type=field_type(value),
+                description=summary(value.get("description") if isinstance(value, dict) else None), shard=shard,
+            )
+    return records
+
+
+def build_index(records):
+    """
+    Returns a compact inverted index of records: the sorted numbers of the
+    records containing each token of their title, name and description.
+    """
+    terms = {}
+    for number, record in enumerate(records):
+        text = " ".join([record["title"], record.get("name", ""), record.get("description", "")])
+        for token in set(tokenize(text)):
+            terms.setdefault(token, []).append(number)
+    return dict(sorted(terms.items()))
+
+
+def write_search_index(type, version, spec):
+    """
+    Writes the records and inverted index of a parsed spec (in its JSON
+    form). Returns the manifest entries of the files written.
+    """
+    records = build_records(type, version, spec)
+    data = minified_json({"records": records, "terms": build_index(records)}).encode()
+    path = os.path.join(shards_path(type, version), SEARCH_INDEX_FILE)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return write_artifact(path, data)
+
+
+def load_search_index(type, version):
+    with open(os.path.join(shards_path(type, version), SEARCH_INDEX_FILE), "r") as f:
+        return json.load(f)
+
+
+def search(index, query, limit=20):
+    """
+    Returns the records of a loaded search index matching every token of
+    query, the last token as a prefix so partial words match while typing.
+    Records with more of the tokens in their title come first.
+    """
+    tokens = tokenize(query)
+    if not tokens:
+        return []
+    terms = index["terms"]
+    matches = None
+    for i, token in enumerate(tokens):
+        if i == len(tokens) - 1:
+            numbers = {n for term, postings in terms.items() if term.startswith(token) for n in postings}
+        else:
+            numbers = set(terms.get(token, ()))
+        matches = numbers if matches is None else matches & numbers
+        if not matches:
+            return []
+
+    def rank(record):
+        title = tokenize(record["title"])
+        in_title = sum(1 for token in tokens if any(word.startswith(token) for word in title))
+        return -in_title, RECORD_TYPES.index(record["type"]), len(record["title"]), record["title"]
+
+    return sorted((index["records"][n] for n in matches), key=rank)[:limit]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Search the local API reference index")
+    parser.add_argument("version", help="<type>/<version>, e.g. admin/unstable")
+    parser.add_argument("query")
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    type, _, version = args.version.partition("/")
+    for record in search(load_search_index(type, version), args.query, args.limit):
+        print("{:<14} {:<60} {}".format(record["type"], record["title"], record.get("shard", "")))
+
+
+if __name__ == "__main__":
+    main()
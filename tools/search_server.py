@@ -0,0 +1,135 @@
+"""
+Local stand-in for the search backend's REST API.
+
+Implements the parts of the Algolia REST API that search_sync.py uses, so
+uploads can be run and checked without an Algolia account:
+
+    python search_server.py --port 8100 --fail 5
+    python search_sync.py --url http://127.0.0.1:8100
+
+POST /1/indexes/<index>/batch applies addObject, updateObject and
+deleteObject requests. GET /1/indexes/<index>/<objectID> returns a record
+and GET /1/indexes/<index>?query=... the records whose title contains the
+query. --fail N answers every Nth batch with a 503 to exercise resuming.
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+
+class SearchServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.0, fail=0, quiet=False):
+        super().__init__(address, SearchRequestHandler)
+        self.latency = latency
+        self.fail = fail
+        self.quiet = quiet
+        self.indexes = {}
+        self.batches = 0
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        return "http://{}:{}".format(*self.server_address[:2])
+
+    def apply(self, index_name, requests):
+        """Applies a batch, returns its task id or None when it's made to fail."""
+        with self._lock:
+            self.batches += 1
+            if self.fail and self.batches % self.fail == 0:
+                return None
+            index = self.indexes.setdefault(index_name, {})
+            for request in requests:
+                body = request["body"]
+                if request["action"] in ("addObject", "updateObject"):
+                    index[body["objectID"]] = body
+                elif request["action"] == "deleteObject":
+                    index.pop(body["objectID"], None)
+                else:
+                    raise ValueError("Unsupported action: {}".format(request["action"]))
+            return self.batches
+
+
+class SearchRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def send(self, status, body=None):
+        content = json.dumps(body if body is not None else {}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def route(self):
+        """Returns (index name, object id or action) of the request path."""
+        parts = [unquote(part) for part in urlparse(self.path).path.strip("/").split("/", 3)]
+        if len(parts) < 3 or parts[:2] != ["1", "indexes"]:
+            return None, None
+        return parts[2], parts[3] if len(parts) > 3 else None
+
+    def do_POST(self):
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        index_name, action = self.route()
+        if index_name is None or action != "batch":
+            return self.send(404, {"message": "Not found"})
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        try:
+            task_id = self.server.apply(index_name, body["requests"])
+        except (KeyError, ValueError) as e:
+            return self.send(400, {"message": str(e)})
+        if task_id is None:
+            return self.send(503, {"message": "Unavailable"})
+        object_ids = [request["body"]["objectID"] for request in body["requests"]]
+        self.send(200, {"taskID": task_id, "objectIDs": object_ids})
+
+    def do_GET(self):
+        index_name, object_id = self.route()
+        index = self.server.indexes.get(index_name, {})
+        if object_id:
+            record = index.get(object_id)
+            return self.send(200, record) if record else self.send(404, {"message": "ObjectID does not exist"})
+        query = parse_qs(urlparse(self.path).query).get("query", [""])[0].lower()
+        hits = [record for record in index.values() if query in record.get("title", "").lower()]
+        self.send(200, {"hits": hits[:20], "nbHits": len(hits)})
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+
+def serve(host="127.0.0.1", port=0, quiet=True, **options):
+    """
+    Starts a SearchServer on a background thread and returns it; port=0
+    picks a free port (see server.url). Stop it with server.shutdown().
+    """
+    server = SearchServer((host, port), quiet=quiet, **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a local stand-in of the search backend")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds to delay every batch")
+    parser.add_argument("--fail", type=int, default=0, help="answer every Nth batch with a 503")
+    args = parser.parse_args(argv)
+
+    server = SearchServer((args.host, args.port), latency=args.latency, fail=args.fail)
+    print("Serving a search backend stand-in at {}".format(server.url))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
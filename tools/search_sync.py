@@ -0,0 +1,135 @@
+"""
+Uploads the search records of every version (see search_index.py) to a
+search backend, sending only the records added, changed or removed since
+the last upload, in batches:
+
+    ALGOLIA_APP_ID=... ALGOLIA_API_KEY=... python search_sync.py
+    python search_sync.py --url http://127.0.0.1:8100    # search_server.py
+
+The hashes of the uploaded records are kept per backend and index in
+CACHE_DIR/search/ and saved after every batch, so an interrupted upload
+resumes where it stopped.
+"""
+import argparse
+import json
+import os
+from urllib.parse import quote, urlparse
+
+try:
+    from algoliasearch.search_client import SearchClient
+except ImportError:  # only needed to upload to Algolia
+    SearchClient = None
+
+from artifacts import load_json, write_atomic
+from config import API_VERSIONS, CACHE_DIR, FETCH_TIMEOUT, SEARCH_BATCH_SIZE, SEARCH_INDEX_NAME
+from http_session import create_session
+from search_index import load_search_index
+from shards import shard_name
+
+
+class AlgoliaBackend:
+    """Writes records with the Algolia client, by default with ALGOLIA_APP_ID and ALGOLIA_API_KEY."""
+
+    def __init__(self, index_name, app_id=None, api_key=None):
+        if SearchClient is None:
+            raise RuntimeError("algoliasearch is required to upload to Algolia")
+        app_id = app_id or os.environ.get("ALGOLIA_APP_ID")
+        api_key = api_key or os.environ.get("ALGOLIA_API_KEY")
+        if not app_id or not api_key:
+            raise RuntimeError("Set ALGOLIA_APP_ID and ALGOLIA_API_KEY to upload to Algolia, or pass --url")
+        client = SearchClient.create(app_id, api_key)
+        self.name = "algolia-" + client.app_id
+        self.index = client.init_index(index_name)
+
+    def save(self, records):
+        self.index.save_objects(records).wait()
+
+    def delete(self, object_ids):
+        self.index.delete_objects(object_ids).wait()
+
+
+class HTTPBackend:
+    """Writes records through the Algolia REST batch endpoint at url, e.g. a search_server.py stand-in."""
+
+    def __init__(self, index_name, url, session=None):
+        self.name = "http-" + urlparse(url).netloc
+        self.url = "{}/1/indexes/{}/batch".format(url.rstrip("/"), quote(index_name, safe=""))
+        self.session = session or create_session(1)
+
+    def _batch(self, requests):
+        response = self.session.post(self.url, json={"requests": requests}, timeout=FETCH_TIMEOUT)
+        response.raise_for_status()
+
+    def save(self, records):
+        self._batch([{"action": "updateObject", "body": record} for record in records])
+
+    def delete(self, object_ids):
+        self._batch([{"action": "deleteObject", "body": {"objectID": object_id}} for object_id in object_ids])
+
+
+def sync_records(backend, records, state, batch_size=SEARCH_BATCH_SIZE, on_batch=None):
+    """
+    Saves the records whose hash differs from ``state``, the {objectID: hash}
+    of the records uploaded before, and deletes the ones that are gone, in
+    batches of ``batch_size``. ``state`` is updated after every batch and
+    passed to ``on_batch``. Returns the number of records saved and deleted.
+    """
+    current = {record["objectID"] for record in records}
+    changed = [record for record in records if state.get(record["objectID"]) != record["hash"]]
+    removed = sorted(object_id for object_id in state if object_id not in current)
+
+    for i in range(0, len(changed), batch_size):
+        batch = changed[i:i + batch_size]
+        backend.save(batch)
+        state.update((record["objectID"], record["hash"]) for record in batch)
+        if on_batch:
+            on_batch(state)
+    for i in range(0, len(removed), batch_size):
+        batch = removed[i:i + batch_size]
+        backend.delete(batch)
+        for object_id in batch:
+            del state[object_id]
+        if on_batch:
+            on_batch(state)
+    return len(changed), len(removed)
+
+
+def sync_state_path(backend, index_name):
+    return os.path.join(CACHE_DIR, "search", shard_name(backend.name), "{}.json".format(shard_name(index_name)))
+
+
+def version_records():
+    """Returns the search records of every API version, which must have been generated."""
+    records = []
+    for version in API_VERSIONS:
+        try:
+            records.extend(load_search_index(version["type"], version["version"])["records"])
+        except FileNotFoundError:
+            raise RuntimeError(
+                "No search index for {type}/{version}, run update_api_docs.py first".format(**version)
+            )
+    return records
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Upload changed search records to a search backend")
+    parser.add_argument("--url", help="base URL of an Algolia compatible REST API, e.g. search_server.py")
+    parser.add_argument("--index", default=SEARCH_INDEX_NAME, help="index name")
+    parser.add_argument("--batch-size", type=int, default=SEARCH_BATCH_SIZE, help="records per request")
+    parser.add_argument("--full", action="store_true", help="upload every record, ignoring the saved state")
+    args = parser.parse_args(argv)
+
+    backend = HTTPBackend(args.index, args.url) if args.url else AlgoliaBackend(args.index)
+    state_path = sync_state_path(backend, args.index)
+    state = {} if args.full else load_json(state_path)
+    os.makedirs(os.path.dirname(state_path), exist_ok=True)
+
+    def save_state(state):
+        write_atomic(state_path, json.dumps(state, sort_keys=True))
+
+    saved, deleted = sync_records(backend, version_records(), state, args.batch_size, save_state)
+    print("Saved {} and deleted {} records in {}".format(saved, deleted, args.index))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""
+Splits a processed spec into shards that can be loaded on their own.
+
+For every version, BASE_API_FILES_PATH/<type>/<version>/ gets:
+
+    tags/<tag>.json                 every operation and webhook with the tag
+    operations/<operationId>.json   a single operation
+    index.json                      operations and events -> shards
+
+Webhooks are grouped by their tag in config.WEBHOOKS. Each shard is a
+valid spec on its own with only the components it transitively needs.
+Shards whose content didn't change since the index was last written are
+left untouched, and shards that no longer exist are removed.
+"""
+import hashlib
+import json
+import os
+import re
+from functools import partial
+
+from artifacts import manifest_entry, minified_json, write_atomic
+from config import BASE_API_FILES_PATH, WEBHOOKS
+
+HTTP_METHODS = ("get", "put", "post", "delete", "options", "head", "patch", "trace")
+# Top-level keys that are split up rather than copied into every shard
+SPLIT_KEYS = ("paths", "webhooks", "components", "tags")
+
+
+def shards_path(type, version):
+    return os.path.join(BASE_API_FILES_PATH, type, version)
+
+
+def shard_name(name):
+    """
+    A file name safe version of a tag or operation id. Names that had to be
+    changed get a hash of the original appended, so e.g. "Orders / Refunds"
+    and "Orders-Refunds" don't end up in the same file.
+    """
+    safe = re.sub(r"[^A-Za-z0-9_.-]+", "-", name).strip("-")
+    if safe == name and safe.strip("."):
+        return safe
+    return "{}-{}".format(safe or "default", hashlib.sha256(name.encode()).hexdigest()[:8])
+
+
+def component_refs(value):
+    """Yields every local "#/components/..." $ref in value."""
+    if isinstance(value, dict):
+        ref = value.get("$ref")
+        if isinstance(ref, str) and ref.startswith("#/components/"):
+            yield ref
+        for child in value.values():
+            yield from component_refs(child)
+    elif isinstance(value, list):
+        for child in value:
+            yield from component_refs(child)
+
+
+def component_closure(spec, value):
+    """Returns the components value references, directly or through other components."""
+    components = spec.get("components", {})
+    needed = {}
+    pending = list(component_refs(value))
+    while pending:
+        parts = pending.pop()[len("#/components/"):].split("/")
+        if len(parts) != 2:
+            continue
+        kind, name = (part.replace("~1", "/").replace("~0", "~") for part in parts)
+        if name in needed.get(kind, {}) or name not in components.get(kind, {}):
+            continue
+        needed.setdefault(kind, {})[name] = components[kind][name]
+        pending.extend(component_refs(components[kind][name]))
+    # Security requirements name their schemes instead of referencing them
+    if "securitySchemes" in components:
+        needed["securitySchemes"] = components["securitySchemes"]
+    return needed
+
+
+def build_shard(spec, paths=None, webhooks=None, tags=()):
+    """Returns a spec with only the given paths and webhooks and the components they need."""
+    shard = {key: value for key, value in spec.items() if key not in SPLIT_KEYS}
+    shard["paths"] = paths or {}
+    if webhooks:
+        shard["webhooks"] = webhooks
+    tag_objects = [tag for tag in spec.get("tags", []) if tag.get("name") in tags]
+    if tag_objects:
+        shard["tags"] = tag_objects
+    components = component_closure(spec, [shard["paths"], webhooks or {}])
+    if components:
+        shard["components"] = components
+    return shard
+
+
+def operations(spec):
+    """Yields (operation id, method, path, operation) for every operation in the spec."""
+    for path, path_item in spec.get("paths", {}).items():
+        for method in HTTP_METHODS:
+            if method in path_item:
+                operation = path_item[method]
+                operation_id = operation.get("operationId") or "{}-{}".format(method, path)
+                yield operation_id, method, path, operation
+
+
+def build_tag_shard(spec, tag, paths, events):
+    return build_shard(spec, paths, {event: spec["webhooks"][event] for event in events}, tags=(tag,))
+
+
+def split_spec(spec):
+    """
+    Returns the shards of a spec as {relative path: function building the
+    shard} and its index. Shards are built as they're written, so only one
+    tag's webhooks are looked up in spec["webhooks"] at a time.
+    """
+    shards = {}
+    index = {"operations": {}, "events": {}}
+    tag_paths = {}
+    tag_webhooks = {}
+
+    for operation_id, method, path, operation in operations(spec):
+        # Keep the path-level parameters and other shared fields with the operation
+        path_item = {key: value for key, value in spec["paths"][path].items() if key not in HTTP_METHODS}
+        path_item[method] = operation
+        shard_path = "operations/{}.json".format(shard_name(operation_id))
+        shards[shard_path] = partial(build_shard, spec, {path: path_item}, tags=operation.get("tags", ()))
+
+        tags = operation.get("tags") or ["default"]
+        for tag in tags:
+            tag_item = tag_paths.setdefault(tag, {}).setdefault(path, {})
+            tag_item.update({key: value for key, value in path_item.items() if key not in HTTP_METHODS})
+            tag_item[method] = operation
+        index["operations"][operation_id] = {
+            "method": method.upper(),
+            "path": path,
+            "tags": tags,
+            "shard": shard_path,
+            "tag_shards": ["tags/{}.json".format(shard_name(tag)) for tag in tags],
+        }
+
+    webhook_tags = {each["event"]: each["tag"] for each in WEBHOOKS}
+    for event in spec.get("webhooks", {}):
+        tag = webhook_tags.get(event) or (spec["webhooks"][event].get("post", {}).get("tags") or ["default"])[0]
+        tag_webhooks.setdefault(tag, []).append(event)
+        index["events"][event] = {"tag": tag, "shard": "tags/{}.json".format(shard_name(tag))}
+
+    for tag in sorted(set(tag_paths) | set(tag_webhooks)):
+        shard_path = "tags/{}.json".format(shard_name(tag))
+        shards[shard_path] = partial(build_tag_shard, spec, tag, tag_paths.get(tag), tag_webhooks.get(tag, ()))
+    return shards, index
+
+
+def write_spec_shards(type, version, spec):
+    """
+    Writes the shards and index of a parsed spec (in its JSON form, see
+    spec_diff.normalize). Returns the manifest entry of the index and the
+    number of shards written.
+    """
+    directory = shards_path(type, version)
+    index_file = os.path.join(directory, "index.json")
+    previous_data = None
+    previous = {}
+    if os.path.exists(index_file):
+        with open(index_file, "rb") as f:
+            previous_data = f.read()
+        previous = json.loads(previous_data).get("shards", {})
+
+    shards, index = split_spec(spec)
+    index["shards"] = {}
+    written = 0
+    for shard_path, build in sorted(shards.items()):
+        data = minified_json(build()).encode()
+        entry = manifest_entry(data)
+        index["shards"][shard_path] = entry
+        path = os.path.join(directory, shard_path)
+        if previous.get(shard_path) != entry or not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            write_atomic(path, data)
+            written += 1
+
+    for shard_path in previous:
+        if shard_path not in shards and os.path.exists(os.path.join(directory, shard_path)):
+            os.unlink(os.path.join(directory, shard_path))
+
+    data = (json.dumps(index, indent=2, sort_keys=True) + "\n").encode()
+    if data != previous_data:
+        os.makedirs(directory, exist_ok=True)
+        write_atomic(index_file, data)
+    return {os.path.relpath(index_file, BASE_API_FILES_PATH): manifest_entry(data)}, written
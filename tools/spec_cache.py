@@ -0,0 +1,143 @@
+"""
+Persistent cache of parsed specs and resolved webhook schemas.
+
+Parsing a spec's YAML takes most of a second and resolving its webhook
+schemas more; tools loading the same spec again get both back from a
+pickle in milliseconds instead:
+
+    python spec_cache.py ../public/api/admin/*.yaml   # warm the cache
+    python spec_cache.py --clear
+
+Entries are keyed by the sha256 of the spec's content and by the tool
+version, a hash of the sources that parse and resolve specs and of the
+Python and PyYAML versions. Any change to either misses the cache rather
+than returning a stale entry. Entries are written atomically; ones that
+can't be read are deleted and treated as misses, and only the newest
+SPEC_CACHE_ENTRIES are kept. Unpickling runs code, so SPEC_CACHE_DIR must
+only be writable by the user running the tools.
+"""
+import argparse
+import glob
+import hashlib
+import os
+import pickle
+import sys
+
+import yaml
+
+from artifacts import write_atomic
+from config import SPEC_CACHE_DIR, SPEC_CACHE_ENTRIES
+
+TOOL_DIR = os.path.dirname(os.path.abspath(__file__))
+# Sources that can change what a spec parses or resolves to
+CACHE_SOURCES = ("spec_cache.py", "spec_diff.py", "artifacts.py", "webhooks.py", "update_api_docs.py", "spec_yaml.py")
+MAGIC = b"spec-cache\n"
+
+_tool_version = None
+
+
+def tool_version():
+    """Hash of CACHE_SOURCES and the interpreter, PyYAML and pickle versions."""
+    global _tool_version
+    if _tool_version is None:
+        digest = hashlib.sha256(repr((sys.version_info[:2], yaml.__version__, pickle.HIGHEST_PROTOCOL)).encode())
+        for name in CACHE_SOURCES:
+            with open(os.path.join(TOOL_DIR, name), "rb") as f:
+                digest.update(hashlib.sha256(f.read()).digest())
+        _tool_version = digest.hexdigest()
+    return _tool_version
+
+
+def content_digest(content):
+    return hashlib.sha256(content).hexdigest()
+
+
+class SpecCache:
+    """
+    Pickled entries in a directory, one file per kind of entry (e.g. "spec"
+    for normalized specs, "raw" for downloaded ones with their resolved
+    schemas) and content digest.
+    """
+
+    def __init__(self, directory=SPEC_CACHE_DIR, max_entries=SPEC_CACHE_ENTRIES):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.version = tool_version()
+        self.header = MAGIC + self.version.encode() + b"\n"
+
+    def path(self, kind, digest):
+        return os.path.join(self.directory, "{}-{}-{}.pickle".format(kind, digest, self.version[:16]))
+
+    def load(self, kind, digest):
+        """The entry of kind for the content digest, or None."""
+        path = self.path(kind, digest)
+        try:
+            with open(path, "rb") as f:
+                if f.read(len(self.header)) != self.header:
+                    raise ValueError("Not an entry of this tool version")
+                entry = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # Truncated, corrupt or written by other code; rebuilt by the caller
+            self.discard(path)
+            return None
+        try:
+            # Recently used entries are the last to be pruned
+            os.utime(path)
+        except OSError:
+            pass
+        return entry
+
+    def save(self, kind, digest, entry):
+        os.makedirs(self.directory, exist_ok=True)
+        write_atomic(self.path(kind, digest), self.header + pickle.dumps(entry, pickle.HIGHEST_PROTOCOL))
+        self.prune()
+
+    def prune(self):
+        """Deletes all but the max_entries most recently used entries."""
+        paths = glob.glob(os.path.join(self.directory, "*.pickle"))
+        if len(paths) <= self.max_entries:
+            return
+        paths.sort(key=lambda path: os.stat(path).st_mtime if os.path.exists(path) else 0, reverse=True)
+        for path in paths[self.max_entries:]:
+            self.discard(path)
+
+    def clear(self):
+        for path in glob.glob(os.path.join(self.directory, "*.pickle")):
+            self.discard(path)
+
+    @staticmethod
+    def discard(path):
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+
+def default_cache():
+    """The SpecCache of SPEC_CACHE_DIR, or None if it's disabled."""
+    return SpecCache() if SPEC_CACHE_DIR else None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Warm or clear the cache of parsed specs")
+    parser.add_argument("specs", nargs="*", help="specs (YAML or JSON) to parse into the cache")
+    parser.add_argument("--clear", action="store_true", help="delete every entry first")
+    args = parser.parse_args(argv)
+
+    cache = default_cache()
+    if cache is None:
+        parser.error("SPEC_CACHE_DIR is disabled in config.py")
+    if args.clear:
+        cache.clear()
+    # Imported here, spec_diff loads specs through this module
+    from spec_diff import load_spec
+
+    for path in args.specs:
+        load_spec(path)
+        print("Cached {}".format(path))
+
+
+if __name__ == "__main__":
+    main()
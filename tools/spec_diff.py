@@ -0,0 +1,252 @@
+"""
+Structural diff and changelog between two versions of a spec.
+
+    python spec_diff.py ../public/api/admin/2024-04-01.yaml ../public/api/admin/unstable.yaml
+    python spec_diff.py old.json new.json --output diff.json --markdown CHANGELOG.md
+
+Both specs are hashed into Merkle trees (every node's hash covers its whole
+subtree), so the comparison only descends into subtrees whose hashes
+differ. The result lists the raw changes and a changelog of added, removed
+and changed endpoints, schemas, schema fields, webhooks and webhook payload
+fields. Specs may be YAML or the JSON artifacts written next to them.
+"""
+import argparse
+import hashlib
+import json
+import sys
+
+import yaml
+
+from artifacts import spec_json
+from spec_cache import content_digest, default_cache
+from spec_yaml import SpecLoader
+
+WEBHOOK_DATA_PATH = ("post", "requestBody", "content", "application/json", "schema", "properties", "data")
+HTTP_METHODS = {"get", "put", "post", "delete", "options", "head", "patch", "trace"}
+
+
+class Node:
+    """A spec value with the hash of its subtree and, for containers, its children."""
+
+    __slots__ = ("hash", "value", "children")
+
+    def __init__(self, hash, value, children=None):
+        self.hash = hash
+        self.value = value
+        self.children = children
+
+
+def merkle_tree(value):
+    """Returns the Node tree of value. Dict children are keyed by key, list children by index."""
+    if isinstance(value, dict):
+        children = {key: merkle_tree(child) for key, child in value.items()}
+        digest = hashlib.blake2b(b"d", digest_size=16)
+        for key in sorted(children, key=str):
+            digest.update(str(key).encode() + b"\0" + children[key].hash)
+        return Node(digest.digest(), value, children)
+    if isinstance(value, list):
+        children = [merkle_tree(child) for child in value]
+        digest = hashlib.blake2b(b"l", digest_size=16)
+        for child in children:
+            digest.update(child.hash)
+        return Node(digest.digest(), value, children)
+    encoded = json.dumps(value, sort_keys=True, default=str).encode()
+    return Node(hashlib.blake2b(b"v" + encoded, digest_size=16).digest(), value)
+
+
+def diff_trees(old, new, path=()):
+    """
+    Yields (op, path, old value, new value) for every difference, with op
+    "added", "removed" or "changed". Lists that changed length or order are
+    reported as a single change of the whole list.
+    """
+    if old.hash == new.hash:
+        return
+    if isinstance(old.children, dict) and isinstance(new.children, dict):
+        for key, child in old.children.items():
+            if key not in new.children:
+                yield "removed", path + (key,), child.value, None
+            else:
+                yield from diff_trees(child, new.children[key], path + (key,))
+        for key, child in new.children.items():
+            if key not in old.children:
+                yield "added", path + (key,), None, child.value
+    elif isinstance(old.children, list) and isinstance(new.children, list) and len(old.children) == len(new.children):
+        for index, (old_child, new_child) in enumerate(zip(old.children, new.children)):
+            yield from diff_trees(old_child, new_child, path + (index,))
+    else:
+        yield "changed", path, old.value, new.value
+
+
+def field_path(parts):
+    """
+    Returns a dotted field path for the schema keywords after a field, e.g.
+    ("properties", "lines", "items", "properties", "sku") -> "lines[].sku",
+    and whether it ends at a field itself rather than one of its attributes.
+    """
+    names = []
+    at_field = False
+    i = 0
+    while i < len(parts):
+        if parts[i] == "properties" and i + 1 < len(parts):
+            names.append(str(parts[i + 1]))
+            at_field = True
+            i += 2
+        elif parts[i] == "items" and names:
+            names[-1] += "[]"
+            at_field = False
+            i += 1
+        else:
+            at_field = False
+            break
+    return ".".join(names), at_field
+
+
+def changelog(changes):
+    """Groups raw changes into added/removed/changed endpoints, schemas, fields and webhooks."""
+    sections = ("endpoints", "schemas", "schema_fields", "webhooks", "webhook_fields")
+    log = {section: {"added": set(), "removed": set(), "changed": set()} for section in sections}
+
+    def note(section, op, name, exact):
+        # Adding or removing something below an entry changes the entry
+        log[section][op if exact else "changed"].add(name)
+
+    for op, path, old_value, new_value in changes:
+        if len(path) == 2 and path[0] == "paths" and op != "changed":
+            # A whole path was added or removed, list each of its methods
+            path_item = new_value if op == "added" else old_value
+            for method in path_item:
+                if method in HTTP_METHODS:
+                    note("endpoints", op, "{} {}".format(method.upper(), path[1]), True)
+        elif len(path) >= 2 and path[0] == "paths":
+            if len(path) >= 3 and path[2] in HTTP_METHODS:
+                note("endpoints", op, "{} {}".format(path[2].upper(), path[1]), len(path) == 3)
+            else:
+                note("endpoints", op, path[1], len(path) == 2)
+        elif len(path) >= 3 and path[:2] == ("components", "schemas"):
+            name, rest = path[2], path[3:]
+            field, at_field = field_path(rest)
+            if field:
+                note("schema_fields", op, "{}.{}".format(name, field), at_field)
+            else:
+                note("schemas", op, name, not rest)
+        elif len(path) >= 2 and path[0] == "webhooks":
+            event, rest = path[1], path[2:]
+            if rest[:len(WEBHOOK_DATA_PATH)] == WEBHOOK_DATA_PATH:
+                field, at_field = field_path(rest[len(WEBHOOK_DATA_PATH):])
+                if field:
+                    note("webhook_fields", op, "{}: data.{}".format(event, field), at_field)
+                    continue
+            # Example payloads follow from the schema and aren't changes of their own
+            if "example" not in rest:
+                note("webhooks", op, event, not rest)
+
+    return {
+        section: {op: sorted(names) for op, names in ops.items()}
+        for section, ops in log.items()
+    }
+
+
+def diff_result(old_version, new_version, changes):
+    """Returns the machine-readable diff of a list of raw changes."""
+    return {
+        "from": old_version,
+        "to": new_version,
+        "changes": [
+            {"op": op, "path": list(path), "old": old_value, "new": new_value}
+            for op, path, old_value, new_value in changes
+        ],
+        "changelog": changelog(changes),
+    }
+
+
+def diff_specs(old, new):
+    """Returns the raw changes and changelog between two parsed specs."""
+    changes = list(diff_trees(merkle_tree(old), merkle_tree(new)))
+    return diff_result(old.get("info", {}).get("version"), new.get("info", {}).get("version"), changes)
+
+
+def diff_section(old, path, value):
+    """
+    Yields the changes of a single section of a spec, e.g. one webhook at
+    ("webhooks", event), against the same section of the old spec. Used to
+    diff a spec that is written out section by section.
+    """
+    for key in path:
+        if not isinstance(old, dict) or key not in old:
+            yield "added", path, None, value
+            return
+        old = old[key]
+    yield from diff_trees(merkle_tree(old), merkle_tree(value), path)
+
+
+def changelog_markdown(diff):
+    lines = ["# Changes from {} to {}".format(diff["from"], diff["to"]), ""]
+    titles = {
+        "endpoints": "Endpoints",
+        "schemas": "Schemas",
+        "schema_fields": "Schema fields",
+        "webhooks": "Webhooks",
+        "webhook_fields": "Webhook payload fields",
+    }
+    for section, title in titles.items():
+        ops = diff["changelog"][section]
+        if not any(ops.values()):
+            continue
+        lines += ["## " + title, ""]
+        for op in ("added", "removed", "changed"):
+            for name in ops[op]:
+                lines.append("- {}: `{}`".format(op.capitalize(), name))
+        lines.append("")
+    return "\n".join(lines)
+
+
+def normalize(spec):
+    """Round-trips a parsed spec through its JSON artifact form, so YAML and JSON specs compare equal."""
+    return json.loads(spec_json(spec))
+
+
+def load_spec(path):
+    """
+    Loads a YAML or JSON spec, normalized. Specs are cached by content (see
+    spec_cache.py), so loading one again skips parsing it.
+    """
+    with open(path, "rb") as f:
+        content = f.read()
+    cache = default_cache()
+    digest = content_digest(content)
+    spec = cache.load("spec", digest) if cache is not None else None
+    if spec is not None:
+        return spec
+
+    if path.endswith(".json"):
+        spec = json.loads(content)
+    else:
+        spec = normalize(yaml.load(content, Loader=SpecLoader))
+    if cache is not None:
+        cache.save("spec", digest, spec)
+    return spec
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Diff two API specs and build a changelog")
+    parser.add_argument("old", help="old spec (YAML or JSON)")
+    parser.add_argument("new", help="new spec (YAML or JSON)")
+    parser.add_argument("--output", help="write the diff as JSON to this file instead of stdout")
+    parser.add_argument("--markdown", help="write a markdown changelog to this file")
+    args = parser.parse_args(argv)
+
+    diff = diff_specs(load_spec(args.old), load_spec(args.new))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(diff, f, indent=2, default=str)
+    else:
+        json.dump(diff["changelog"], sys.stdout, indent=2)
+        print()
+    if args.markdown:
+        with open(args.markdown, "w") as f:
+            f.write(changelog_markdown(diff))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Local stand-in for the upstream spec endpoints.
+
+Serves recorded spec snapshots from a directory laid out like
+BASE_API_FILES_PATH, at /<type>/?version=<version>, so the refresh pipeline
+can run and be timed without network access:
+
+    python spec_server.py --directory ../public/api --latency 0.2 --throttle 3
+    python update_api_docs.py --source http://127.0.0.1:8000
+
+Responses carry an ETag and honour If-None-Match. --latency delays every
+response, --throttle N answers every Nth request with a 429 and a
+Retry-After header, and --inflate N adds N copies of every component schema
+to serve large payloads.
+"""
+import argparse
+import hashlib
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import yaml
+
+from config import BASE_API_FILES_PATH
+from spec_yaml import SpecDumper, SpecLoader
+
+
+def inflate_spec(content, copies):
+    """Returns the spec with ``copies`` renamed copies of every component schema."""
+    spec = yaml.load(content, Loader=SpecLoader)
+    schemas = spec.get("components", {}).get("schemas", {})
+    for name, schema in list(schemas.items()):
+        for i in range(copies):
+            schemas["{}Copy{}".format(name, i)] = schema
+    return yaml.dump(spec, Dumper=SpecDumper).encode()
+
+
+class SpecServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, directory, latency=0.0, throttle=0, retry_after=1, inflate=0, quiet=False):
+        super().__init__(address, SpecRequestHandler)
+        self.directory = directory
+        self.latency = latency
+        self.throttle = throttle
+        self.retry_after = retry_after
+        self.inflate = inflate
+        self.quiet = quiet
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._snapshots = {}
+
+    @property
+    def url(self):
+        return "http://{}:{}".format(*self.server_address[:2])
+
+    def next_request(self):
+        with self._lock:
+            self.requests += 1
+            return self.requests
+
+    def snapshot(self, type, version):
+        """Returns (content, etag) for a snapshot, or None if it doesn't exist."""
+        key = (type, version)
+        with self._lock:
+            if key not in self._snapshots:
+                path = os.path.join(self.directory, type, "{}.yaml".format(version))
+                if not os.path.isfile(path):
+                    return None
+                with open(path, "rb") as f:
+                    content = f.read()
+                if self.inflate:
+                    content = inflate_spec(content, self.inflate)
+                etag = '"{}"'.format(hashlib.sha256(content).hexdigest()[:32])
+                self._snapshots[key] = (content, etag)
+            return self._snapshots[key]
+
+
+class SpecRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def send(self, status, content=b"", headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_GET(self):
+        server = self.server
+        count = server.next_request()
+        if server.latency:
+            time.sleep(server.latency)
+        if server.throttle and count % server.throttle == 0:
+            return self.send(429, headers={"Retry-After": str(server.retry_after)})
+
+        url = urlparse(self.path)
+        type = url.path.strip("/")
+        version = parse_qs(url.query).get("version", [""])[0]
+        snapshot = server.snapshot(type, version) if type and version else None
+        if snapshot is None:
+            return self.send(404)
+
+        content, etag = snapshot
+        if self.headers.get("If-None-Match") == etag:
+            return self.send(304, headers={"ETag": etag})
+        self.send(200, content, {"ETag": etag, "Content-Type": "application/yaml"})
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+
+def serve(directory=BASE_API_FILES_PATH, host="127.0.0.1", port=0, quiet=True, **options):
+    """
+    Starts a SpecServer on a background thread and returns it; port=0 picks
+    a free port (see server.url). Stop it with server.shutdown().
+    """
+    server = SpecServer((host, port), directory, quiet=quiet, **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve recorded spec snapshots for update_api_docs.py")
+    parser.add_argument("--directory", default=BASE_API_FILES_PATH, help="snapshot directory (<type>/<version>.yaml)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds to delay every response")
+    parser.add_argument("--throttle", type=int, default=0, help="answer every Nth request with a 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with a 429")
+    parser.add_argument("--inflate", type=int, default=0, help="copies of every component schema to add")
+    args = parser.parse_args(argv)
+
+    server = SpecServer(
+        (args.host, args.port),
+        args.directory,
+        latency=args.latency,
+        throttle=args.throttle,
+        retry_after=args.retry_after,
+        inflate=args.inflate,
+    )
+    print("Serving {} at {}".format(args.directory, server.url))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
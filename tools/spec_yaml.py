@@ -0,0 +1,59 @@
+"""
+YAML loader and dumper of specs, shared by the refresh and every tool
+reading or writing spec YAML without pulling in the rest of them.
+
+Specs are emitted by libyaml when PyYAML was built with it and by PyYAML's
+pure Python emitter otherwise, and both write the same bytes: lines are
+never folded (the two fold long strings differently) and the Python
+emitter picks simple mapping keys by libyaml's rules.
+"""
+import yaml
+from yaml.events import ScalarEvent
+
+# libyaml backed loader when PyYAML was built with it
+SpecLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+# Never fold long lines
+SPEC_WIDTH = 1 << 30
+# Characters libyaml treats as line breaks
+LINE_BREAKS = "\r\n\x85\u2028\u2029"
+
+
+class LibyamlSafeDumper(yaml.SafeDumper):
+    """Pure Python safe dumper emitting mapping keys the way libyaml does."""
+
+    def check_simple_key(self):
+        # Unlike PyYAML, libyaml counts a scalar's UTF-8 bytes and its tag
+        # only when explicit, allows empty keys and treats \r as a line break
+        event = self.event
+        if not isinstance(event, ScalarEvent):
+            return self.check_empty_sequence() or self.check_empty_mapping()
+        length = len(event.value.encode("utf-8"))
+        if event.tag is not None and not any(event.implicit):
+            length += len(self.prepare_tag(event.tag))
+        return length <= 128 and not any(ch in LINE_BREAKS for ch in event.value)
+
+
+class SpecDumping:
+    """
+    Never emits anchors/aliases, as resolved webhook schemas share subtrees
+    which should still be written out in full, nor folds lines.
+    """
+
+    def __init__(self, stream, **kwargs):
+        kwargs["width"] = SPEC_WIDTH
+        super().__init__(stream, **kwargs)
+
+    def ignore_aliases(self, data):
+        return True
+
+
+class PythonSpecDumper(SpecDumping, LibyamlSafeDumper):
+    pass
+
+
+if hasattr(yaml, "CSafeDumper"):
+    class SpecDumper(SpecDumping, yaml.CSafeDumper):
+        pass
+else:
+    SpecDumper = PythonSpecDumper
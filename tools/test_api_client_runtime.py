@@ -0,0 +1,92 @@
+"""
+Tests of the generated API clients' runtime, run from tools/ with:
+
+    python -m unittest test_api_client_runtime
+"""
+import unittest
+from unittest import mock
+
+import api_client_runtime
+from api_client_runtime import RateLimiter, retry_after
+
+# Sun, 06 Nov 1994 08:49:37 GMT
+NOW = 784111777.0
+
+
+class Clock:
+    def __init__(self, now=100.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def response(retry_after=None):
+    return mock.Mock(headers={} if retry_after is None else {"Retry-After": retry_after})
+
+
+class RateLimiterTests(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        patch = mock.patch.object(api_client_runtime.time, "monotonic", self.clock)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_requests_are_spaced_by_the_interval(self):
+        limiter = RateLimiter(4)
+        self.assertEqual([limiter.reserve() for _ in range(4)], [0.0, 0.25, 0.5, 0.75])
+
+    def test_margin_widens_the_interval(self):
+        limiter = RateLimiter(2, margin=0.5)
+        self.assertEqual([limiter.reserve() for _ in range(3)], [0.0, 0.75, 1.5])
+
+    def test_burst_lets_requests_through_at_once(self):
+        limiter = RateLimiter(2, burst=3)
+        self.assertEqual([limiter.reserve() for _ in range(5)], [0.0, 0.0, 0.0, 0.5, 1.0])
+        # Idle time refills the bucket, but never beyond the burst
+        self.clock.now += 10
+        self.assertEqual([limiter.reserve() for _ in range(4)], [0.0, 0.0, 0.0, 0.5])
+
+    def test_waiting_out_a_slot(self):
+        limiter = RateLimiter(2)
+        limiter.reserve()
+        self.clock.now += 0.2
+        self.assertAlmostEqual(limiter.reserve(), 0.3)
+        self.clock.now += 5
+        self.assertEqual(limiter.reserve(), 0.0)
+
+    def test_pause_holds_back_every_request(self):
+        limiter = RateLimiter(10, burst=5)
+        limiter.pause(3)
+        self.assertEqual(limiter.reserve(), 3.0)
+        self.assertAlmostEqual(limiter.reserve(), 3.1)
+        # A shorter pause doesn't cut the current one short
+        limiter.pause(1)
+        self.assertAlmostEqual(limiter.reserve(), 3.2)
+
+
+class RetryAfterTests(unittest.TestCase):
+    def setUp(self):
+        patch = mock.patch.object(api_client_runtime.time, "time", return_value=NOW)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_seconds(self):
+        self.assertEqual(retry_after(response("120"), 0), 120.0)
+        self.assertEqual(retry_after(response("1.5"), 3), 1.5)
+        self.assertEqual(retry_after(response("-5"), 0), 0.0)
+
+    def test_http_dates(self):
+        self.assertEqual(retry_after(response("Sun, 06 Nov 1994 08:50:07 GMT"), 0), 30.0)
+        self.assertEqual(retry_after(response("Sun, 06 Nov 1994 08:50:07 -0000"), 0), 30.0)
+        self.assertEqual(retry_after(response("Sun, 06 Nov 1994 10:50:07 +0200"), 0), 30.0)
+        self.assertEqual(retry_after(response("Sun, 06 Nov 1994 08:00:00 GMT"), 0), 0.0)
+
+    def test_missing_or_malformed_values_back_off(self):
+        for value in (None, "", "soon", "Sun, 99 Nov 1994 08:50:07 GMT", "nan", "inf"):
+            with self.subTest(value=value):
+                self.assertEqual(retry_after(response(value), 2), api_client_runtime.RETRY_BACKOFF * 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
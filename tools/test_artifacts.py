@@ -0,0 +1,59 @@
+"""
+Tests of the written artifacts and manifest, run from tools/ with:
+
+    python -m unittest test_artifacts
+"""
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import artifacts
+from artifacts import prune_manifest, update_manifest, version_file
+
+
+def entry(n):
+    return {"size": n, "sha256": str(n)}
+
+
+class ManifestTests(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "manifest.json")
+        patcher = mock.patch.object(artifacts, "SPEC_MANIFEST_FILE", self.path)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def files(self):
+        with open(self.path) as f:
+            return json.load(f)["files"]
+
+    def test_version_files(self):
+        self.assertTrue(version_file("campaigns/v1", "campaigns/v1.yaml"))
+        self.assertTrue(version_file("campaigns/v1", "campaigns/v1.json.br"))
+        self.assertTrue(version_file("campaigns/v1", "campaigns/v1/tags/Orders.json"))
+        self.assertFalse(version_file("campaigns/v1", "campaigns/v1.1.yaml"))
+        self.assertFalse(version_file("campaigns/v1", "campaigns/v10/index.json"))
+
+    def test_replace_drops_files_not_written_again(self):
+        update_manifest({"admin/a.yaml": entry(1), "admin/a/tags/Old.json": entry(2), "admin/b.yaml": entry(3)})
+        update_manifest({"admin/a.yaml": entry(4), "admin/a/index.json": entry(5)}, replace=["admin/a"])
+        self.assertEqual(
+            self.files(), {"admin/a.yaml": entry(4), "admin/a/index.json": entry(5), "admin/b.yaml": entry(3)}
+        )
+
+    def test_merge_keeps_other_files(self):
+        update_manifest({"admin/a.yaml": entry(1)})
+        update_manifest({"admin/a/payload_sizes.json": entry(2)})
+        self.assertEqual(self.files(), {"admin/a.yaml": entry(1), "admin/a/payload_sizes.json": entry(2)})
+
+    def test_prune_drops_removed_versions(self):
+        update_manifest({"admin/a.yaml": entry(1), "admin/old.yaml": entry(2), "admin/old/index.json": entry(3)})
+        prune_manifest(["admin/a"])
+        self.assertEqual(self.files(), {"admin/a.yaml": entry(1)})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,38 @@
+"""
+Tests of payload size bounds, run from tools/ with:
+
+    python -m unittest test_payload_sizes
+"""
+import unittest
+from unittest import mock
+
+import payload_sizes
+from payload_sizes import PayloadSizer
+
+
+class PayloadSizerTests(unittest.TestCase):
+    def setUp(self):
+        self.sizer = PayloadSizer({}, string_max=100, array_max=5)
+
+    def test_bounded_string(self):
+        self.assertEqual(self.sizer.measure({"type": "string", "minLength": 2, "maxLength": 8}), (4, 10))
+        self.assertEqual(self.sizer.measure({"type": "string", "format": "uuid"}), (38, 38))
+
+    def test_pattern_bounds_strings(self):
+        schema = {"type": "string", "pattern": r"^-?\d{0,6}(?:\.\d{0,2})?$"}
+        self.assertEqual(self.sizer.measure(schema), (2, 12))
+
+    def test_without_the_regex_parser_patterns_are_ignored(self):
+        schema = {"type": "string", "pattern": r"^\d{0,6}$"}
+        with mock.patch.object(payload_sizes, "sre_parse", None):
+            self.assertEqual(self.sizer.measure(schema), (2, 102))
+        self.assertEqual(self.sizer.fields[""], (102, True))
+
+    def test_unknown_types_are_unbounded(self):
+        self.assertEqual(self.sizer.measure({"type": "strng"}), (1, 100))
+        self.assertEqual(self.sizer.fields[""], (100, True))
+        self.assertEqual(self.sizer.measure({"type": ["boolean", "nul"]}), (1, 100))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+"""
+Tests of the incremental search sync, run from tools/ with:
+
+    python -m unittest test_search_sync
+"""
+import copy
+import unittest
+
+from search_sync import sync_records
+
+
+def record(object_id, hash):
+    return {"objectID": object_id, "hash": hash, "title": object_id}
+
+
+class FakeBackend:
+    """Keeps records in a dict, failing the save of batch fail_at (counting from 1)."""
+
+    def __init__(self, fail_at=None):
+        self.records = {}
+        self.saves = []
+        self.deletes = []
+        self.fail_at = fail_at
+
+    def save(self, records):
+        if len(self.saves) + 1 == self.fail_at:
+            self.fail_at = None
+            raise IOError("batch failed")
+        self.saves.append([each["objectID"] for each in records])
+        self.records.update((each["objectID"], each) for each in records)
+
+    def delete(self, object_ids):
+        self.deletes.append(list(object_ids))
+        for object_id in object_ids:
+            del self.records[object_id]
+
+
+RECORDS = [record("r{}".format(i), "h{}".format(i)) for i in range(5)]
+
+
+class SyncRecordsTests(unittest.TestCase):
+    def test_first_sync_saves_everything_in_batches(self):
+        backend = FakeBackend()
+        state = {}
+        self.assertEqual(sync_records(backend, RECORDS, state, batch_size=2), (5, 0))
+        self.assertEqual(backend.saves, [["r0", "r1"], ["r2", "r3"], ["r4"]])
+        self.assertEqual(backend.records, {each["objectID"]: each for each in RECORDS})
+        self.assertEqual(state, {each["objectID"]: each["hash"] for each in RECORDS})
+
+    def test_only_changed_records_are_saved_and_gone_ones_deleted(self):
+        backend = FakeBackend()
+        state = {}
+        sync_records(backend, RECORDS, state, batch_size=2)
+        backend.saves = []
+        records = copy.deepcopy(RECORDS[1:])
+        records[0]["hash"] = "changed"
+        records.append(record("r5", "h5"))
+        self.assertEqual(sync_records(backend, records, state, batch_size=2), (2, 1))
+        self.assertEqual(backend.saves, [["r1", "r5"]])
+        self.assertEqual(backend.deletes, [["r0"]])
+        self.assertEqual(sorted(backend.records), ["r1", "r2", "r3", "r4", "r5"])
+        self.assertEqual(state["r1"], "changed")
+        self.assertNotIn("r0", state)
+        self.assertEqual(sync_records(backend, records, state, batch_size=2), (0, 0))
+
+    def test_sync_resumes_after_a_failed_batch(self):
+        backend = FakeBackend(fail_at=2)
+        saved_states = []
+        state = {}
+        with self.assertRaises(IOError):
+            sync_records(backend, RECORDS, state, 2, lambda state: saved_states.append(dict(state)))
+        self.assertEqual(saved_states, [{"r0": "h0", "r1": "h1"}])
+
+        # Rerun from the state saved before the failure
+        state = saved_states[-1]
+        self.assertEqual(sync_records(backend, RECORDS, state, batch_size=2), (3, 0))
+        self.assertEqual(backend.saves, [["r0", "r1"], ["r2", "r3"], ["r4"]])
+        self.assertEqual(len(backend.records), 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,170 @@
+"""
+Tests of spec sharding, run from tools/ with:
+
+    python -m unittest test_shards
+"""
+import copy
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import shards
+from artifacts import manifest_entry
+from shards import shard_name, split_spec, write_spec_shards
+
+
+def operation(operation_id, tag):
+    return {"operationId": operation_id, "tags": [tag], "responses": {"200": {"description": "OK"}}}
+
+
+SPEC = {
+    "openapi": "3.1.0",
+    "info": {"title": "Test", "version": "test"},
+    "paths": {
+        "/refunds": {"get": operation("listRefunds", "Orders / Refunds")},
+        "/orders/refunds": {"get": operation("listOrderRefunds", "Orders-Refunds")},
+        "/orders/{id}": {"get": operation("Orders / get", "Orders"), "put": operation("Orders-get", "Orders")},
+    },
+}
+
+
+def ref(name):
+    return {"$ref": "#/components/schemas/" + name}
+
+
+STORE = {
+    "openapi": "3.1.0",
+    "info": {"title": "Store", "version": "test"},
+    "tags": [{"name": "Orders"}, {"name": "Customers"}],
+    "paths": {
+        "/orders": {
+            "parameters": [{"$ref": "#/components/parameters/Page"}],
+            "get": {
+                "operationId": "listOrders",
+                "tags": ["Orders"],
+                "responses": {"200": {"content": {"application/json": {"schema": ref("Order")}}}},
+            },
+        },
+        "/customers": {"get": {"operationId": "listCustomers", "tags": ["Customers"], "responses": {}}},
+    },
+    "webhooks": {
+        "order.created": {"post": {"requestBody": {"content": {"application/json": {"schema": ref("Order")}}}}},
+    },
+    "components": {
+        "schemas": {
+            "Order": {"type": "object", "properties": {"customer": ref("Customer")}},
+            "Customer": {"type": "object"},
+            "Unused": {"type": "object"},
+        },
+        "parameters": {"Page": {"name": "page", "in": "query"}},
+        "securitySchemes": {"token": {"type": "http", "scheme": "bearer"}},
+    },
+}
+WEBHOOKS = [{"event": "order.created", "object": "order", "schema_ref": None, "tag": "Orders", "description": ""}]
+
+
+class ShardNameTests(unittest.TestCase):
+    def test_safe_names_are_kept(self):
+        self.assertEqual(shard_name("Orders-Refunds"), "Orders-Refunds")
+        self.assertEqual(shard_name("retrieve_order.v2"), "retrieve_order.v2")
+
+    def test_changed_names_dont_collide(self):
+        names = ["Orders / Refunds", "Orders-Refunds", "Orders  Refunds", "-Orders-Refunds-", "", "default", ".."]
+        self.assertEqual(len({shard_name(name) for name in names}), len(names))
+        self.assertEqual(shard_name("Orders / Refunds"), shard_name("Orders / Refunds"))
+        self.assertTrue(shard_name("..").strip("."))
+
+    def test_colliding_tags_and_operations_get_their_own_shards(self):
+        shards, index = split_spec(SPEC)
+        self.assertEqual(len(shards), 7)
+        for operation_id in ("Orders / get", "Orders-get", "listRefunds", "listOrderRefunds"):
+            shard = shards[index["operations"][operation_id]["shard"]]()
+            operations = [op for path_item in shard["paths"].values() for op in path_item.values()]
+            self.assertEqual([op["operationId"] for op in operations], [operation_id])
+        refunds = shards[index["operations"]["listRefunds"]["tag_shards"][0]]()
+        self.assertEqual(list(refunds["paths"]), ["/refunds"])
+        order_refunds = shards[index["operations"]["listOrderRefunds"]["tag_shards"][0]]()
+        self.assertEqual(list(order_refunds["paths"]), ["/orders/refunds"])
+
+
+class WriteShardsTests(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.base = directory.name
+        for patch in (mock.patch.object(shards, "BASE_API_FILES_PATH", self.base),
+                      mock.patch.object(shards, "WEBHOOKS", WEBHOOKS)):
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.directory = os.path.join(self.base, "admin", "test")
+
+    def read(self, path):
+        with open(os.path.join(self.directory, path), "rb") as f:
+            return f.read()
+
+    def files(self):
+        return sorted(
+            os.path.relpath(os.path.join(parent, name), self.directory)
+            for parent, _, names in os.walk(self.directory) for name in names
+        )
+
+    def test_shards_and_index(self):
+        entries, written = write_spec_shards("admin", "test", STORE)
+        self.assertEqual(written, 4)
+        self.assertEqual(self.files(), [
+            "index.json", "operations/listCustomers.json", "operations/listOrders.json",
+            "tags/Customers.json", "tags/Orders.json",
+        ])
+        index_data = self.read("index.json")
+        self.assertEqual(entries, {os.path.join("admin", "test", "index.json"): manifest_entry(index_data)})
+        index = json.loads(index_data)
+        self.assertEqual(index["operations"]["listOrders"], {
+            "method": "GET", "path": "/orders", "tags": ["Orders"],
+            "shard": "operations/listOrders.json", "tag_shards": ["tags/Orders.json"],
+        })
+        self.assertEqual(index["events"], {"order.created": {"tag": "Orders", "shard": "tags/Orders.json"}})
+        for path, entry in index["shards"].items():
+            self.assertEqual(manifest_entry(self.read(path)), entry)
+
+        orders = json.loads(self.read("tags/Orders.json"))
+        self.assertEqual(orders["info"], STORE["info"])
+        self.assertEqual(orders["tags"], [{"name": "Orders"}])
+        self.assertEqual(list(orders["paths"]), ["/orders"])
+        self.assertEqual(list(orders["webhooks"]), ["order.created"])
+        # Order references Customer, nothing references Unused
+        self.assertEqual(sorted(orders["components"]["schemas"]), ["Customer", "Order"])
+        self.assertEqual(list(orders["components"]["parameters"]), ["Page"])
+        self.assertIn("securitySchemes", orders["components"])
+
+        customers = json.loads(self.read("operations/listCustomers.json"))
+        self.assertNotIn("webhooks", customers)
+        self.assertEqual(list(customers["components"]), ["securitySchemes"])
+
+    def test_unchanged_shards_are_not_rewritten(self):
+        write_spec_shards("admin", "test", STORE)
+        before = {path: os.stat(os.path.join(self.directory, path)).st_mtime_ns for path in self.files()}
+        spec = copy.deepcopy(STORE)
+        spec["paths"]["/customers"]["get"]["description"] = "Lists customers"
+        _, written = write_spec_shards("admin", "test", spec)
+        self.assertEqual(written, 2)
+        after = {path: os.stat(os.path.join(self.directory, path)).st_mtime_ns for path in self.files()}
+        self.assertEqual(
+            sorted(path for path in before if before[path] != after[path]),
+            ["index.json", "operations/listCustomers.json", "tags/Customers.json"],
+        )
+
+    def test_shards_that_disappeared_are_removed(self):
+        write_spec_shards("admin", "test", STORE)
+        spec = copy.deepcopy(STORE)
+        del spec["paths"]["/customers"]
+        write_spec_shards("admin", "test", spec)
+        self.assertEqual(self.files(), ["index.json", "operations/listOrders.json", "tags/Orders.json"])
+        index = json.loads(self.read("index.json"))
+        self.assertEqual(sorted(index["shards"]), ["operations/listOrders.json", "tags/Orders.json"])
+        self.assertNotIn("listCustomers", index["operations"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+"""
+Tests of the parsed spec cache, run from tools/ with:
+
+    python -m unittest test_spec_cache
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import spec_cache
+from spec_cache import CACHE_SOURCES, SpecCache, content_digest, tool_version
+
+DIGEST = content_digest(b"openapi: 3.1.0\n")
+ENTRY = {"openapi": "3.1.0", "paths": {}}
+
+
+class SpecCacheTests(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def cache(self, **kwargs):
+        return SpecCache(self.directory, **kwargs)
+
+    def entries(self):
+        return sorted(name for name in os.listdir(self.directory) if name.endswith(".pickle"))
+
+    def test_hit(self):
+        self.cache().save("spec", DIGEST, ENTRY)
+        self.assertEqual(self.cache().load("spec", DIGEST), ENTRY)
+        self.assertIsNone(self.cache().load("raw", DIGEST))
+        self.assertIsNone(self.cache().load("spec", content_digest(b"other")))
+
+    def test_tool_version_change_misses(self):
+        self.cache().save("spec", DIGEST, ENTRY)
+        version = tool_version()
+        for other in ("0" * 64, version[:16] + "0" * 48):
+            with self.subTest(version=other), mock.patch.object(spec_cache, "_tool_version", other):
+                self.assertIsNone(self.cache().load("spec", DIGEST))
+        # The entry of the other version with the same file name was discarded
+        self.assertEqual(self.entries(), [])
+
+    def test_magic_header_change_misses(self):
+        self.cache().save("spec", DIGEST, ENTRY)
+        with mock.patch.object(spec_cache, "MAGIC", b"spec-cache-v2\n"):
+            self.assertIsNone(self.cache().load("spec", DIGEST))
+        self.assertEqual(self.entries(), [])
+
+    def test_source_changes_change_the_tool_version(self):
+        sources = os.path.join(self.directory, "sources")
+        os.makedirs(sources)
+        for name in CACHE_SOURCES:
+            shutil.copy(os.path.join(spec_cache.TOOL_DIR, name), sources)
+        with mock.patch.object(spec_cache, "TOOL_DIR", sources), mock.patch.object(spec_cache, "_tool_version", None):
+            before = tool_version()
+        with open(os.path.join(sources, "webhooks.py"), "a") as f:
+            f.write("\n# changed\n")
+        with mock.patch.object(spec_cache, "TOOL_DIR", sources), mock.patch.object(spec_cache, "_tool_version", None):
+            self.assertNotEqual(tool_version(), before)
+
+    def test_unreadable_entries_are_discarded(self):
+        cache = self.cache()
+        cache.save("spec", DIGEST, ENTRY)
+        path = cache.path("spec", DIGEST)
+        with open(path, "r+b") as f:
+            f.truncate(len(cache.header) + 3)
+        self.assertIsNone(cache.load("spec", DIGEST))
+        self.assertFalse(os.path.exists(path))
+
+    def test_only_the_newest_entries_are_kept(self):
+        cache = self.cache(max_entries=2)
+        for i in range(3):
+            cache.save("spec", content_digest(str(i).encode()), i)
+            path = cache.path("spec", content_digest(str(i).encode()))
+            os.utime(path, (i, i))
+        cache.prune()
+        self.assertIsNone(cache.load("spec", content_digest(b"0")))
+        self.assertEqual([cache.load("spec", content_digest(str(i).encode())) for i in (1, 2)], [1, 2])
+
+
+if __name__ == "__main__":
+    unittest.main()
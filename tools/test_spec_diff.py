@@ -0,0 +1,121 @@
+"""
+Tests of the structural spec diff and changelog, run from tools/ with:
+
+    python -m unittest test_spec_diff
+"""
+import copy
+import unittest
+
+from spec_diff import changelog_markdown, diff_section, diff_specs
+
+
+def webhook(properties, example=None):
+    schema = {"type": "object", "properties": {"data": {"type": "object", "properties": properties}}}
+    content = {"schema": schema}
+    if example is not None:
+        content["example"] = example
+    return {"post": {"requestBody": {"content": {"application/json": content}}}}
+
+
+OLD = {
+    "info": {"version": "2024-01-01"},
+    "paths": {
+        "/orders": {
+            "get": {"operationId": "listOrders", "description": "Lists orders"},
+            "post": {"operationId": "createOrder"},
+        },
+        "/customers": {"get": {"operationId": "listCustomers"}},
+    },
+    "components": {
+        "schemas": {
+            "Order": {
+                "type": "object",
+                "properties": {
+                    "id": {"type": "integer"},
+                    "total": {"type": "string"},
+                    "lines": {"type": "array", "items": {"type": "object", "properties": {"sku": {"type": "string"}}}},
+                },
+            },
+            "Customer": {"type": "object"},
+        }
+    },
+    "webhooks": {"order.created": webhook({"id": {"type": "integer"}}, example={"id": 1})},
+}
+
+
+def new_spec():
+    new = copy.deepcopy(OLD)
+    new["info"]["version"] = "2024-04-01"
+    paths = new["paths"]
+    del paths["/orders"]["post"]
+    paths["/orders"]["get"]["description"] = "Lists every order"
+    del paths["/customers"]
+    paths["/refunds"] = {"post": {"operationId": "createRefund"}, "get": {"operationId": "listRefunds"}}
+    schemas = new["components"]["schemas"]
+    order = schemas["Order"]["properties"]
+    del order["total"]
+    order["currency"] = {"type": "string"}
+    order["id"]["format"] = "int64"
+    order["lines"]["items"]["properties"]["quantity"] = {"type": "integer"}
+    del schemas["Customer"]
+    schemas["Refund"] = {"type": "object"}
+    new["webhooks"]["order.created"] = webhook(
+        {"id": {"type": "integer"}, "status": {"type": "string"}}, example={"id": 2, "status": "open"}
+    )
+    new["webhooks"]["order.updated"] = webhook({"id": {"type": "integer"}})
+    return new
+
+
+class SpecDiffTests(unittest.TestCase):
+    def test_identical_specs_have_no_changes(self):
+        diff = diff_specs(OLD, copy.deepcopy(OLD))
+        self.assertEqual(diff["changes"], [])
+        self.assertFalse(any(names for ops in diff["changelog"].values() for names in ops.values()))
+
+    def test_changelog(self):
+        diff = diff_specs(OLD, new_spec())
+        self.assertEqual((diff["from"], diff["to"]), ("2024-01-01", "2024-04-01"))
+        self.assertEqual(diff["changelog"], {
+            "endpoints": {
+                "added": ["GET /refunds", "POST /refunds"],
+                "removed": ["GET /customers", "POST /orders"],
+                "changed": ["GET /orders"],
+            },
+            "schemas": {"added": ["Refund"], "removed": ["Customer"], "changed": []},
+            "schema_fields": {
+                "added": ["Order.currency", "Order.lines[].quantity"],
+                "removed": ["Order.total"],
+                "changed": ["Order.id"],
+            },
+            "webhooks": {"added": ["order.updated"], "removed": [], "changed": []},
+            "webhook_fields": {"added": ["order.created: data.status"], "removed": [], "changed": []},
+        })
+
+    def test_raw_changes_only_cover_what_differs(self):
+        diff = diff_specs(OLD, new_spec())
+        changes = {(change["op"], tuple(change["path"])) for change in diff["changes"]}
+        self.assertIn(("changed", ("paths", "/orders", "get", "description")), changes)
+        self.assertIn(("added", ("components", "schemas", "Order", "properties", "id", "format")), changes)
+        self.assertFalse(any(path[:2] == ("paths", "/refunds") and op != "added" for op, path in changes))
+        self.assertNotIn(("changed", ("paths", "/orders")), changes)
+
+    def test_diff_section_matches_the_whole_spec_diff(self):
+        new = new_spec()
+        expected = [change for change in diff_specs(OLD, new)["changes"] if change["path"][0] == "webhooks"]
+        changes = []
+        for event, path_item in new["webhooks"].items():
+            changes += diff_section(OLD, ("webhooks", event), path_item)
+        self.assertEqual(sorted(map(repr, changes)), sorted(
+            repr((change["op"], tuple(change["path"]), change["old"], change["new"])) for change in expected
+        ))
+
+    def test_markdown(self):
+        markdown = changelog_markdown(diff_specs(OLD, new_spec()))
+        self.assertTrue(markdown.startswith("# Changes from 2024-01-01 to 2024-04-01\n"))
+        self.assertIn("## Endpoints\n\n- Added: `GET /refunds`\n", markdown)
+        self.assertIn("- Removed: `Order.total`", markdown)
+        self.assertIn("## Webhook payload fields\n\n- Added: `order.created: data.status`\n", markdown)
+
+
+if __name__ == "__main__":
+    unittest.main()
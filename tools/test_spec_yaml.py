@@ -0,0 +1,47 @@
+"""
+Tests of the spec YAML dumper, run from tools/ with:
+
+    python -m unittest test_spec_yaml
+"""
+import random
+import unittest
+
+import yaml
+
+from spec_yaml import PythonSpecDumper, SpecDumper
+
+ALPHABET = list("ab :#-'\"\n\t\\{}[],&*!|>%@`?/._") + ["é", "☃", "😀", "\x00", "\x85", " ", "﻿", "\r"]
+CASES = [
+    "", "plain", "x" * 500 + " " + "y" * 500, "line\nbreaks\n", "carriage\rreturn", " leading", "trailing ",
+    "a: b", "- x", "#c", "null", "yes", "1e3", "~", "é" * 64, "é" * 65, "k" * 128, "k" * 129, "😀" * 40,
+]
+
+
+class SpecDumperTests(unittest.TestCase):
+    def assertSameBytes(self, value):
+        self.assertEqual(yaml.dump(value, Dumper=SpecDumper), yaml.dump(value, Dumper=PythonSpecDumper))
+
+    @unittest.skipUnless(hasattr(yaml, "CSafeDumper"), "PyYAML built without libyaml")
+    def test_libyaml_and_python_emit_the_same_bytes(self):
+        for case in CASES:
+            with self.subTest(case=case):
+                self.assertSameBytes({"value": case, case: [case, {case: {}}], "empty": {case: []}})
+        self.assertSameBytes({1: "int", 1.5: None, True: [], -10 ** 20: {}})
+
+    @unittest.skipUnless(hasattr(yaml, "CSafeDumper"), "PyYAML built without libyaml")
+    def test_libyaml_and_python_emit_the_same_bytes_for_random_strings(self):
+        rnd = random.Random(0)
+        for _ in range(2000):
+            value = "".join(rnd.choice(ALPHABET) for _ in range(rnd.choice([8, 140, 400])))
+            self.assertSameBytes({"value": value, value: {"nested": value}})
+
+    def test_no_aliases_or_folding(self):
+        shared = {"type": "string", "description": "word " * 100}
+        text = yaml.dump({"a": shared, "b": shared}, Dumper=SpecDumper)
+        self.assertNotIn("&", text)
+        self.assertEqual(len(text.splitlines()), 6)
+        self.assertEqual(yaml.safe_load(text), {"a": shared, "b": shared})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+"""
+Tests of the spec refresh, run from tools/ with:
+
+    python -m unittest test_update_api_docs
+"""
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+
+from config import API_VERSIONS
+from update_api_docs import update_spec_file
+
+TOOL_DIR = os.path.dirname(os.path.abspath(__file__))
+SPECS = os.path.join(TOOL_DIR, "..", "public", "api", "admin")
+
+
+def read_tree(directory):
+    """{relative path: bytes} of every file below directory."""
+    files = {}
+    for parent, _, names in os.walk(directory):
+        for name in names:
+            path = os.path.join(parent, name)
+            with open(path, "rb") as f:
+                files[os.path.relpath(path, directory)] = f.read()
+    return files
+
+
+def refresh(stream, contents):
+    """
+    Runs update_spec_file on each of contents in turn, as admin/2024-04-01,
+    in a scratch checkout. Returns the written files and manifest entries.
+    """
+    version = next(each for each in API_VERSIONS if each["version"] == "2024-04-01")
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.makedirs(os.path.join(directory, "public", "api", "admin"))
+        os.makedirs(os.path.join(directory, "tools"))
+        # Output paths in config are relative to tools/
+        os.chdir(os.path.join(directory, "tools"))
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                entries = [
+                    update_spec_file("admin", "2024-04-01", version["description"], version["additions"], content,
+                                     stream=stream)
+                    for content in contents
+                ]
+        finally:
+            os.chdir(cwd)
+        files = read_tree(os.path.join(directory, "public"))
+        files.update(
+            (os.path.join(".cache", path), data)
+            for path, data in read_tree(os.path.join(directory, "tools", ".cache")).items()
+            if not path.startswith("specs")
+        )
+        return files, entries
+
+
+class StreamTests(unittest.TestCase):
+    def test_stream_output_is_identical_to_regular_output(self):
+        contents = []
+        for name in ("2023-02-10.yaml", "2024-04-01.yaml"):
+            with open(os.path.join(SPECS, name), "rb") as f:
+                contents.append(f.read())
+        # The second refresh diffs against the first, and writes its changelog
+        regular, regular_entries = refresh(False, contents)
+        streamed, streamed_entries = refresh(True, contents)
+        self.assertIn(os.path.join("api", "admin", "2024-04-01.json.br"), regular)
+        self.assertIn(os.path.join(".cache", "changelog", "admin", "2024-04-01.md"), regular)
+        self.assertEqual(sorted(streamed), sorted(regular))
+        for path in regular:
+            self.assertEqual(streamed[path], regular[path], path)
+        self.assertEqual(streamed_entries, regular_entries)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,159 @@
+"""
+Tests of compiled webhook validators, run from tools/ with:
+
+    python -m unittest test_validator_compiler
+"""
+import importlib
+import sys
+import tempfile
+import unittest
+
+try:
+    from jsonschema import Draft202012Validator
+except ImportError:
+    Draft202012Validator = None
+
+from validator_compiler import UnsupportedSchema, compile_validators, event_schema
+
+
+def webhook(schema):
+    return {"post": {"requestBody": {"content": {"application/json": {"schema": schema}}}}}
+
+
+def ref(name):
+    return {"$ref": "#/components/schemas/" + name}
+
+
+ORDER = {
+    "type": "object",
+    "required": ["id", "status", "lines"],
+    "additionalProperties": False,
+    "properties": {
+        "id": {"type": "integer", "minimum": 1},
+        "status": {"enum": ["open", "closed", None]},
+        "note": {"type": ["string", "null"], "maxLength": 5},
+        "code": {"type": "string", "pattern": "^[A-Z]{2}[0-9]+$", "minLength": 3},
+        "total": {"type": "number", "exclusiveMinimum": 0, "maximum": 100},
+        "lines": {"type": "array", "minItems": 1, "maxItems": 2, "items": ref("Line")},
+        "customer": {"oneOf": [{"type": "string"}, {"type": "integer"}]},
+        "meta": {"type": "object", "additionalProperties": {"type": "boolean"}},
+        "tags": {"type": "array", "items": {"anyOf": [{"const": "a"}, {"type": "integer"}]}},
+        "version": {"not": {"type": "string"}},
+        "flags": {"allOf": [{"type": "object"}, {"required": ["x"]}]},
+    },
+}
+SPEC = {
+    "info": {"version": "test"},
+    "components": {
+        "schemas": {
+            "Line": {"type": "object", "required": ["sku"], "properties": {"sku": {"type": "string"}}},
+        }
+    },
+    "webhooks": {"order.created": webhook(ORDER)},
+}
+
+VALID = {"id": 1, "status": "open", "lines": [{"sku": "A"}]}
+SAMPLES = [
+    VALID,
+    dict(VALID, id=1.0),
+    dict(VALID, id=0),
+    dict(VALID, id=True),
+    dict(VALID, id="1"),
+    dict(VALID, status=None),
+    dict(VALID, status="pending"),
+    dict(VALID, status=0),
+    dict(VALID, note=None),
+    dict(VALID, note="hello"),
+    dict(VALID, note="hello!"),
+    dict(VALID, note="😀😀😀😀😀"),
+    dict(VALID, code="AB1"),
+    dict(VALID, code="AB"),
+    dict(VALID, code="ab12"),
+    dict(VALID, code="xAB12"),
+    dict(VALID, total=0),
+    dict(VALID, total=0.01),
+    dict(VALID, total=100),
+    dict(VALID, total=100.5),
+    dict(VALID, total=False),
+    dict(VALID, lines=[]),
+    dict(VALID, lines=[{"sku": "A"}, {"sku": "B"}]),
+    dict(VALID, lines=[{"sku": "A"}, {"sku": "B"}, {"sku": "C"}]),
+    dict(VALID, lines=[{"sku": 1}]),
+    dict(VALID, lines=[{}]),
+    dict(VALID, lines={"sku": "A"}),
+    dict(VALID, customer="c"),
+    dict(VALID, customer=2),
+    dict(VALID, customer=2.0),
+    dict(VALID, customer=None),
+    dict(VALID, meta={}),
+    dict(VALID, meta={"a": True, "b": False}),
+    dict(VALID, meta={"a": 1}),
+    dict(VALID, tags=["a", 1]),
+    dict(VALID, tags=["b"]),
+    dict(VALID, tags=[True]),
+    dict(VALID, version=2),
+    dict(VALID, version="2"),
+    dict(VALID, flags={"x": None}),
+    dict(VALID, flags={}),
+    dict(VALID, flags=[]),
+    dict(VALID, extra=1),
+    {"id": 1, "status": "open"},
+    {},
+    [],
+    None,
+    "order",
+]
+
+
+def unload(package):
+    for name in list(sys.modules):
+        if name == package or name.startswith(package + "."):
+            del sys.modules[name]
+
+
+class CompiledValidatorTests(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.output = directory.name
+
+    def compile(self, spec, package):
+        compile_validators(spec, self.output, package)
+        sys.path.insert(0, self.output)
+        self.addCleanup(sys.path.remove, self.output)
+        self.addCleanup(unload, package)
+        return importlib.import_module(package)
+
+    @unittest.skipUnless(Draft202012Validator, "jsonschema is not installed")
+    def test_agrees_with_jsonschema(self):
+        package = self.compile(SPEC, "test_order_validators")
+        module = importlib.import_module("test_order_validators.order_created")
+        # Keep the components next to the schema so jsonschema can resolve the $refs
+        generic = Draft202012Validator(dict(event_schema(SPEC, "order.created"), components=SPEC["components"]))
+        self.assertTrue(module.is_valid(VALID))
+        # Both outcomes are well covered
+        self.assertGreater(sum(map(generic.is_valid, SAMPLES)), 15)
+        self.assertGreater(sum(not generic.is_valid(sample) for sample in SAMPLES), 15)
+        for sample in SAMPLES:
+            with self.subTest(sample=sample):
+                self.assertEqual(module.is_valid(sample), generic.is_valid(sample))
+                if not generic.is_valid(sample):
+                    with self.assertRaises(package.ValidationError):
+                        package.validate("order.created", sample)
+
+    def test_unsupported_schemas_are_rejected(self):
+        for schema, message in (
+            ({"type": "object", "patternProperties": {"^x": {}}}, "Unsupported keywords: patternProperties"),
+            ({"type": "date"}, "Unsupported types: date"),
+            ({"$ref": "other.yaml#/Order"}, "Unsupported $ref"),
+        ):
+            spec = dict(SPEC, webhooks={"order.created": webhook({"properties": {"order": schema}})})
+            with self.subTest(schema=schema):
+                with self.assertRaises(UnsupportedSchema) as context:
+                    compile_validators(spec, self.output, "unsupported")
+                self.assertTrue(str(context.exception).startswith("order.created: "))
+                self.assertIn(message, str(context.exception))
+
+
+if __name__ == "__main__":
+    unittest.main()
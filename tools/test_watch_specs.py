@@ -0,0 +1,100 @@
+"""
+Tests of watch mode's config reloading, run from tools/ with:
+
+    python -m unittest test_watch_specs
+"""
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import config
+import shards
+import watch_specs
+from watch_specs import SpecWatcher
+
+with open(watch_specs.CONFIG_FILE) as f:
+    CONFIG = f.read()
+SETTINGS = [name for name in vars(config) if name.isupper()]
+ADMIN_KEYS = sorted(watch_specs.version_key(version) for version in config.API_VERSIONS if version["type"] == "admin")
+NEW_EVENT = '''WEBHOOKS.append({
+    "event": "test.created", "object": "test", "schema_ref": None, "tag": "test", "description": "Test",
+})
+'''
+
+
+def bindings():
+    """Every module attribute bound to a config setting's value, to restore them after a reload."""
+    found = []
+    for module in list(sys.modules.values()):
+        namespace = getattr(module, "__dict__", {})
+        for name in SETTINGS:
+            if name in namespace and namespace[name] is getattr(config, name):
+                found.append((module, name, namespace[name]))
+    return found
+
+
+def restore(found):
+    for module, name, value in found:
+        setattr(module, name, value)
+
+
+class ReloadConfigTests(unittest.TestCase):
+    def setUp(self):
+        self.addCleanup(restore, bindings())
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.config_file = os.path.join(directory.name, "config.py")
+        patch = mock.patch.object(watch_specs, "CONFIG_FILE", self.config_file)
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.edit(CONFIG)
+        self.watcher = SpecWatcher()
+        self.watcher.sync_versions()
+
+    def edit(self, text):
+        with open(self.config_file, "w") as f:
+            f.write(text)
+
+    def test_unchanged_config_rebuilds_nothing(self):
+        self.assertEqual(self.watcher.reload_config(), [])
+
+    def test_webhooks_are_rebound_in_every_module(self):
+        old = config.WEBHOOKS
+        self.edit(CONFIG + NEW_EVENT)
+        self.assertEqual(self.watcher.reload_config(), ADMIN_KEYS)
+        self.assertIsNot(config.WEBHOOKS, old)
+        self.assertEqual(config.WEBHOOKS[-1]["event"], "test.created")
+        # Modules that did "from config import WEBHOOKS" see the new list too
+        self.assertIs(shards.WEBHOOKS, config.WEBHOOKS)
+        self.assertIs(sys.modules["webhooks"].WEBHOOKS, config.WEBHOOKS)
+
+    def test_descriptions_rebuild_the_versions_using_them(self):
+        self.edit(CONFIG.replace('ADMIN_API_DESCRIPTION = """', 'ADMIN_API_DESCRIPTION = """Edited\n', 1))
+        self.assertEqual(self.watcher.reload_config(), ADMIN_KEYS)
+        self.assertTrue(config.ADMIN_API_DESCRIPTION.startswith("Edited\n"))
+        for key in ADMIN_KEYS:
+            self.assertTrue(self.watcher.versions[key].version["description"].startswith("Edited\n"))
+
+    def test_other_settings_need_a_restart(self):
+        interval = config.WATCH_INTERVAL
+        self.edit(CONFIG + "\nWATCH_INTERVAL = 5\n")
+        self.assertIsNone(self.watcher.reload_config())
+        self.assertEqual(config.WATCH_INTERVAL, interval)
+        # Nothing is applied if any setting needs a restart
+        self.edit(CONFIG + NEW_EVENT + "\nWATCH_INTERVAL = 5\n")
+        webhooks = config.WEBHOOKS
+        self.assertIsNone(self.watcher.reload_config())
+        self.assertIs(config.WEBHOOKS, webhooks)
+
+    def test_broken_config_is_ignored(self):
+        webhooks = config.WEBHOOKS
+        self.edit(CONFIG + NEW_EVENT + "\nWEBHOOKS = [\n")
+        with mock.patch("sys.stderr"), mock.patch("sys.stdout"):
+            self.assertEqual(self.watcher.reload_config(), [])
+        self.assertIs(config.WEBHOOKS, webhooks)
+
+
+if __name__ == "__main__":
+    unittest.main()
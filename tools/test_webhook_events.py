@@ -0,0 +1,88 @@
+"""
+Tests of synthetic webhook events, run from tools/ with:
+
+    python -m unittest test_webhook_events
+"""
+import unittest
+from unittest import mock
+
+import webhook_events
+from webhook_events import WebhookEventGenerator
+
+
+def ref(name):
+    return {"$ref": "#/components/schemas/" + name}
+
+
+def webhook(name):
+    schema = {"type": "object", "required": ["data"], "properties": {"data": ref(name)}}
+    return {"post": {"requestBody": {"content": {"application/json": {"schema": schema}}}}}
+
+
+SPEC = {
+    "info": {"version": "test"},
+    "components": {
+        "schemas": {
+            # Required self reference that can't be null
+            "Loop": {"type": "object", "required": ["next"], "properties": {"next": ref("Loop")}},
+            # Required self references that can be null
+            "Chain": {
+                "type": "object",
+                "required": ["id", "next", "previous"],
+                "properties": {
+                    "id": {"type": "integer"},
+                    "next": {"anyOf": [ref("Chain"), {"type": "null"}]},
+                    "previous": {
+                        "type": ["object", "null"], "required": ["chain"], "properties": {"chain": ref("Chain")}
+                    },
+                },
+            },
+            # Required mutual cycle through an array
+            "Tree": {"type": "object", "required": ["forest"], "properties": {"forest": ref("Forest")}},
+            "Forest": {"type": "array", "minItems": 1, "maxItems": 1, "items": ref("Tree")},
+        }
+    },
+    "webhooks": {"loop.created": webhook("Loop"), "chain.created": webhook("Chain"), "tree.created": webhook("Tree")},
+}
+WEBHOOKS = [
+    {"event": event, "object": event.split(".")[0], "schema_ref": None, "tag": "Test", "description": event}
+    for event in SPEC["webhooks"]
+]
+
+
+def depth(value):
+    if isinstance(value, dict):
+        return 1 + max(map(depth, value.values()), default=0)
+    if isinstance(value, list):
+        return 1 + max(map(depth, value), default=0)
+    return 0
+
+
+def generator(event, seed=0):
+    with mock.patch.object(webhook_events, "WEBHOOKS", WEBHOOKS):
+        return WebhookEventGenerator(SPEC, [event], seed)
+
+
+class CyclicSchemaTests(unittest.TestCase):
+    def test_required_self_reference_stops_at_the_cap(self):
+        data = generator("loop.created").generate()["data"]
+        self.assertEqual(depth(data), WebhookEventGenerator.stop_depth)
+        for _ in range(WebhookEventGenerator.stop_depth - 2):
+            data = data["next"]
+        self.assertEqual(data, {"next": {}})
+
+    def test_nullable_references_are_null_at_the_cap(self):
+        for seed in range(5):
+            data = generator("chain.created", seed).generate()["data"]
+            self.assertLessEqual(depth(data), WebhookEventGenerator.stop_depth)
+            while data["next"] is not None:
+                data = data["next"]
+            self.assertIsNone(data["next"])
+
+    def test_required_cycle_through_arrays_stops(self):
+        data = generator("tree.created").generate()["data"]
+        self.assertEqual(depth(data), WebhookEventGenerator.stop_depth)
+
+
+if __name__ == "__main__":
+    unittest.main()
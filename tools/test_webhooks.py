@@ -0,0 +1,140 @@
+"""
+Regression tests of webhook generation, run from tools/ with:
+
+    python -m unittest test_webhooks
+"""
+import copy
+import json
+import unittest
+
+from validator_compiler import event_schema
+from webhooks import SchemaResolver, generate_webhooks
+
+
+def ref(name):
+    return {"$ref": "#/components/schemas/" + name}
+
+
+SPEC = {
+    "info": {"version": "test"},
+    "components": {
+        "schemas": {
+            # Mutual cycle
+            "A": {"type": "object", "properties": {"name": {"type": "string"}, "b": ref("B")}},
+            "B": {"type": "object", "properties": {"a": ref("A")}},
+            # Self reference
+            "Node": {
+                "type": "object",
+                "properties": {
+                    "id": {"type": "integer"},
+                    "parent": ref("Node"),
+                    "children": {"type": "array", "items": ref("Node")},
+                },
+            },
+            # Outside the cycle, reaching into it
+            "Holder": {"type": "object", "properties": {"a": ref("A"), "node": ref("Node")}},
+        }
+    },
+}
+
+
+def webhook(event, name):
+    return {
+        "event": event,
+        "object": name.lower(),
+        "schema_ref": "#/components/schemas/" + name,
+        "tag": "Webhooks",
+        "description": event,
+    }
+
+
+A_CREATED = webhook("a.created", "A")
+B_CREATED = webhook("b.created", "B")
+NODE_CREATED = webhook("node.created", "Node")
+HOLDER_CREATED = webhook("holder.created", "Holder")
+EVENTS = [B_CREATED, A_CREATED, NODE_CREATED, HOLDER_CREATED]
+
+
+def generate(events, previous=None, output="inline"):
+    spec = copy.deepcopy(SPEC)
+    webhooks, entries, regenerated = generate_webhooks(spec, output, previous, events, SchemaResolver(spec))
+    spec["webhooks"] = webhooks
+    return spec, entries, regenerated
+
+
+def data_schema(spec, event):
+    return event_schema(spec, event)["properties"]["data"]
+
+
+def dumped(spec):
+    return json.dumps(spec, sort_keys=True)
+
+
+class CyclicSchemaTests(unittest.TestCase):
+    def test_mutual_cycle_is_cut_at_the_root(self):
+        spec, _, _ = generate(EVENTS)
+        a = data_schema(spec, "a.created")
+        self.assertEqual(a["properties"]["b"]["properties"]["a"], ref("A"))
+        b = data_schema(spec, "b.created")
+        self.assertEqual(b["properties"]["a"]["properties"]["b"], ref("B"))
+
+    def test_self_reference_is_cut_at_itself(self):
+        spec, _, _ = generate(EVENTS)
+        node = data_schema(spec, "node.created")
+        self.assertEqual(node["properties"]["parent"], ref("Node"))
+        self.assertEqual(node["properties"]["children"]["items"], ref("Node"))
+        holder = data_schema(spec, "holder.created")
+        self.assertEqual(holder["properties"]["node"]["properties"]["parent"], ref("Node"))
+        self.assertEqual(holder["properties"]["a"]["properties"]["b"]["properties"]["a"], ref("A"))
+
+    def test_output_is_independent_of_event_order(self):
+        for output in ("inline", "components"):
+            expected, _, _ = generate(EVENTS, output=output)
+            for events in (EVENTS[::-1], [A_CREATED, HOLDER_CREATED, B_CREATED, NODE_CREATED]):
+                spec, _, _ = generate(events, output=output)
+                for each in EVENTS:
+                    self.assertEqual(
+                        dumped(spec["webhooks"][each["event"]]), dumped(expected["webhooks"][each["event"]])
+                    )
+                self.assertEqual(dumped(spec["components"]), dumped(expected["components"]))
+
+    def test_incremental_matches_full(self):
+        full, entries, _ = generate(EVENTS)
+        for kept in ("b.created", "a.created", "holder.created"):
+            spec, _, regenerated = generate(EVENTS, previous={kept: entries[kept]})
+            self.assertNotIn(kept, regenerated)
+            self.assertEqual(dumped(spec["webhooks"]), dumped(full["webhooks"]))
+
+    def test_resolver_cache_holds_only_root_results(self):
+        spec = copy.deepcopy(SPEC)
+        resolver = SchemaResolver(spec)
+        resolver.resolve("#/components/schemas/B")
+        fresh = SchemaResolver(copy.deepcopy(SPEC))
+        self.assertEqual(
+            dumped(resolver.resolve("#/components/schemas/A")), dumped(fresh.resolve("#/components/schemas/A"))
+        )
+        for name, resolved in resolver.cache.items():
+            self.assertEqual(dumped(resolved), dumped(SchemaResolver(copy.deepcopy(SPEC)).resolve(ref(name)["$ref"])))
+
+
+class ExampleMemoTests(unittest.TestCase):
+    def test_rebuilds_dont_grow_the_memo(self):
+        spec = copy.deepcopy(SPEC)
+        resolver = SchemaResolver(spec)
+        sizes = []
+        for _ in range(3):
+            generate_webhooks(spec, "inline", None, EVENTS, resolver)
+            sizes.append(len(resolver.examples._memo))
+        self.assertEqual(sizes, sizes[:1] * 3)
+
+
+class EnvelopeTests(unittest.TestCase):
+    def test_store_is_nullable(self):
+        spec, _, _ = generate([NODE_CREATED])
+        store = event_schema(spec, "node.created")["properties"]["webhook"]["properties"]["store"]
+        self.assertEqual(store["type"], ["string", "null"])
+        self.assertNotIn("nullable", store)
+
+
+if __name__ == "__main__":
+    unittest.main()
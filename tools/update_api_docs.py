@@ -1,42 +1,570 @@
-import requests
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
 import yaml
 
-from config import BASE_API_FILES_PATH, API_VERSIONS
-from webhooks import webhook_schema_generator
+from config import (
+    BASE_API_FILES_PATH,
+    API_VERSIONS,
+    FETCH_WORKERS,
+    FETCH_TIMEOUT,
+    GENERATE_WORKERS,
+    EVENT_WORKERS,
+    SPEC_STREAM,
+    SPEC_STATE_FILE,
+    CACHE_DIR,
+    WEBHOOKS,
+    CUSTOM_WEBHOOK_EVENT_PAYLOADS,
+    WEBHOOK_SCHEMA_OUTPUT,
+    EXAMPLE_MAX_NODES,
+    EXAMPLE_MAX_BYTES,
+    SPEC_COMPRESSION,
+    SEARCH_INDEX_FILE,
+    SEARCH_MAX_FIELD_DEPTH,
+    PAYLOAD_SIZES_FILE,
+    PAYLOAD_STRING_MAX,
+    PAYLOAD_ARRAY_MAX,
+    PAYLOAD_SAMPLES,
+    PAYLOAD_DRIVERS,
+)
+from artifacts import (
+    ArtifactWriter,
+    JsonMapping,
+    load_json,
+    minified_json,
+    prune_manifest,
+    update_manifest,
+    write_atomic,
+    write_spec_artifacts,
+)
+from http_session import create_session
+from instrumentation import RefreshReport
+from payload_sizes import write_payload_sizes
+from search_index import write_search_index
+from shards import write_spec_shards
+from spec_cache import content_digest, default_cache
+from spec_diff import changelog_markdown, diff_result, diff_section, diff_specs, load_spec, normalize
+from spec_yaml import SpecDumper, SpecLoader
+from webhooks import SchemaResolver, SchemaStore, generate_webhooks, iter_webhooks
+
+
+TOOL_DIR = os.path.dirname(os.path.abspath(__file__))
+TOOL_SOURCES = (
+    "update_api_docs.py",
+    "webhooks.py",
+    "artifacts.py",
+    "shards.py",
+    "search_index.py",
+    "payload_sizes.py",
+    "webhook_events.py",
+    "validator_compiler.py",
+    "spec_yaml.py",
+)
+
+
+def spec_file_path(type, version):
+    return BASE_API_FILES_PATH + "/{}/{}.yaml".format(type, version)
+
+
+def webhook_cache_path(version):
+    return os.path.join(CACHE_DIR, "webhooks", "{}.json".format(version))
+
+
+def changelog_path(type, version, extension):
+    return os.path.join(CACHE_DIR, "changelog", type, "{}.{}".format(version, extension))
+
+
+def write_changelog(type, version, diff):
+    """Writes the diff of a version against its previous spec and its markdown changelog."""
+    os.makedirs(os.path.dirname(changelog_path(type, version, "json")), exist_ok=True)
+    write_atomic(changelog_path(type, version, "json"), json.dumps(diff, indent=2, default=str))
+    write_atomic(changelog_path(type, version, "md"), changelog_markdown(diff))
+
+
+def load_state():
+    """
+    Returns the persisted per-version refresh state: upstream ETag and
+    Last-Modified, the upstream content hash and the local inputs hash.
+    """
+    return load_json(SPEC_STATE_FILE)
+
+
+def save_state(state):
+    with open(SPEC_STATE_FILE, "w") as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+        f.write("\n")
 
 
-def download_and_update_spec_file(type, source, version, description, additions):
-    api_file = BASE_API_FILES_PATH + "/{}/{}.yaml".format(type, version)
+def inputs_hash(version):
+    """
+    Hash of everything besides the upstream spec that affects a version's
+    output: its description and additions, the webhook config, the
+    settings of the artifacts written next to it and the source of the
+    tools generating it.
+    """
+    inputs = {
+        "description": version["description"],
+        "additions": version["additions"],
+        "compression": SPEC_COMPRESSION,
+        "search": [SEARCH_INDEX_FILE, SEARCH_MAX_FIELD_DEPTH],
+        "payload_sizes": [PAYLOAD_SIZES_FILE, PAYLOAD_STRING_MAX, PAYLOAD_ARRAY_MAX, PAYLOAD_SAMPLES, PAYLOAD_DRIVERS],
+    }
+    if version["type"] == "admin":
+        inputs["webhooks"] = WEBHOOKS
+        inputs["custom_webhook_event_payloads"] = CUSTOM_WEBHOOK_EVENT_PAYLOADS
+        inputs["webhook_schema_output"] = WEBHOOK_SCHEMA_OUTPUT
+        inputs["example_budget"] = [EXAMPLE_MAX_NODES, EXAMPLE_MAX_BYTES]
+    for name in TOOL_SOURCES:
+        with open(os.path.join(TOOL_DIR, name), "rb") as f:
+            inputs[name] = hashlib.sha256(f.read()).hexdigest()
+    data = json.dumps(inputs, sort_keys=True).encode()
+    return hashlib.sha256(data).hexdigest()
 
-    response = requests.get(source, {"version": version})
+
+def conditional_headers(entry, local_hash, api_file):
+    """
+    Only ask for a 304 when the local inputs are unchanged and the output
+    exists, otherwise the spec has to be regenerated from fresh bytes.
+    """
+    headers = {}
+    if entry.get("inputs_hash") == local_hash and os.path.exists(api_file):
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+    return headers
+
+
+class LocalResponse:
+    """Response-like result for a spec read from a local file."""
+
+    status_code = 200
+
+    def __init__(self, content):
+        self.content = content
+        self.headers = {}
+
+
+def is_url(source):
+    return source.startswith(("http://", "https://"))
+
+
+def version_source(version, override=None):
+    """
+    Returns where to fetch a version's spec from. Sources, from config or an
+    override for all versions, may be a URL, a local spec file, or a snapshot
+    directory laid out like BASE_API_FILES_PATH (<type>/<version>.yaml). An
+    override URL is treated as the base of a server using the same layout,
+    e.g. spec_server.py.
+    """
+    source = override or version["source"]
+    if is_url(source):
+        if override:
+            return "{}/{}/".format(source.rstrip("/"), version["type"])
+        return source
+    if source.startswith("file://"):
+        source = source[len("file://"):]
+    if os.path.isdir(source):
+        return os.path.join(source, version["type"], "{}.yaml".format(version["version"]))
+    return source
+
+
+def download_spec(session, source, version, headers=None):
+    if not is_url(source):
+        with open(source, "rb") as f:
+            return LocalResponse(f.read())
+    response = session.get(source, params={"version": version}, headers=headers, timeout=FETCH_TIMEOUT)
     response.raise_for_status()
+    return response
+
+
+def timed_download(session, source, version, headers=None):
+    start = time.perf_counter()
+    response = download_spec(session, source, version, headers)
+    return response, time.perf_counter() - start
+
 
-    with open(api_file, "wb") as f:
-        f.write(response.content)
+def cache_webhooks(cache_file, webhooks, regenerated):
+    """
+    Passes iter_webhooks output through as (event, path item) while writing
+    each entry to the webhook cache, and appends the regenerated events to
+    ``regenerated``. The cache is moved into place once every event is in.
+    """
+    cache = ArtifactWriter(cache_file, encodings=())
+    try:
+        cache.write("{")
+        for i, (event, entry, was_regenerated) in enumerate(webhooks):
+            cache.write("{}{}: {}".format(", " if i else "", json.dumps(event), json.dumps(entry)))
+            if was_regenerated:
+                regenerated.append(event)
+            yield event, entry["webhook"]
+        cache.write("}")
+    except BaseException:
+        cache.abort()
+        raise
+    cache.close()
 
-    with open(api_file, "r") as f:
-        spec = yaml.safe_load(f.read())
+
+def stream_spec(api_file, spec, webhooks=None, previous=None):
+    """
+    Writes a spec and its JSON artifact, with their compressed variants,
+    section by section instead of dumping the whole spec at once. Each
+    top-level key is dumped on its own and ``webhooks``, an iterable of
+    (event, path item) sorted by event, is written in place of
+    spec["webhooks"] one webhook at a time. Keys are sorted the same way
+    yaml.dump and spec_json sort them, so the files match the non-streamed
+    ones byte for byte.
+
+    Returns the manifest entries, the spec in its JSON form with webhooks
+    kept as minified JSON (a JsonMapping, see write_spec_shards) and, when
+    ``previous`` is given, the list of changes against it, diffed section
+    by section too.
+    """
+    keys = sorted(set(spec) | ({"webhooks"} if webhooks is not None else set()))
+    changes = [] if previous is not None else None
+    document = {}
+    yaml_out = ArtifactWriter(api_file)
+    try:
+        json_out = ArtifactWriter(os.path.splitext(api_file)[0] + ".json")
+    except BaseException:
+        yaml_out.abort()
+        raise
+    try:
+        json_out.write("{")
+        for i, key in enumerate(keys):
+            json_out.write("{}{}:".format("," if i else "", json.dumps(key, ensure_ascii=False)))
+            if key != "webhooks" or webhooks is None:
+                data = minified_json(spec[key])
+                json_out.write(data)
+                yaml_out.write(yaml.dump({key: spec[key]}, Dumper=SpecDumper))
+                document[key] = json.loads(data)
+                if changes is not None:
+                    changes.extend(diff_section(previous, (key,), document[key]))
+                continue
+
+            events = {}
+            json_out.write("{")
+            for event, path_item in webhooks:
+                data = minified_json(path_item)
+                json_out.write("{}{}:{}".format("," if events else "", json.dumps(event, ensure_ascii=False), data))
+                # Drop the "webhooks:" line, it's only written once
+                text = yaml.dump({"webhooks": {event: path_item}}, Dumper=SpecDumper)
+                yaml_out.write(text if not events else text.split("\n", 1)[1])
+                if changes is not None:
+                    changes.extend(diff_section(previous, ("webhooks", event), json.loads(data)))
+                events[event] = data
+            json_out.write("}")
+            document["webhooks"] = JsonMapping(events)
+            if not events:
+                yaml_out.write(yaml.dump({"webhooks": {}}, Dumper=SpecDumper))
+            if changes is not None and isinstance(previous.get("webhooks"), dict):
+                for event, path_item in previous["webhooks"].items():
+                    if event not in events:
+                        changes.append(("removed", ("webhooks", event), path_item, None))
+        json_out.write("}")
+    except BaseException:
+        yaml_out.abort()
+        json_out.abort()
+        raise
+
+    if changes is not None:
+        for key in previous:
+            if key not in keys:
+                changes.append(("removed", (key,), previous[key], None))
+    entries = yaml_out.close()
+    entries.update(json_out.close())
+    return entries, document, changes
+
+
+def update_spec_file(
+    type, version, description, additions, content, report=None, event_workers=1, store=None, stream=False
+):
+    """
+    Processes a downloaded spec and writes it with its artifacts. Returns the
+    manifest entries of the files written. Resolved webhook schemas are
+    shared with other versions through ``store`` when given. With ``stream``
+    webhooks are generated while the spec is written out section by section
+    (see stream_spec), so the whole spec is never dumped at once.
+    """
+    report = report or RefreshReport()
+    key = "{}/{}".format(type, version)
+    api_file = spec_file_path(type, version)
+
+    # The parsed spec and its resolved webhook schemas from an earlier run on the same content
+    cache = default_cache()
+    digest = content_digest(content.encode() if isinstance(content, str) else content)
+    with report.stage(key, "parse"):
+        cached = cache.load("raw", digest) if cache is not None else None
+        spec = cached["spec"] if cached else yaml.load(content, Loader=SpecLoader)
+    report.count(key, spec_cache_hits=int(cached is not None))
 
     spec["info"]["description"] = description
     if type == "admin":
-        spec["webhooks"] = webhook_schema_generator(spec)
+        resolver = SchemaResolver(spec, store)
+        if cached:
+            resolver.cache.update(cached["resolved"])
+        refs = [each["schema_ref"] for each in WEBHOOKS if each["schema_ref"]]
+        with report.stage(key, "resolve"):
+            for ref in refs:
+                resolver.resolve(ref)
+        with report.stage(key, "examples"):
+            for ref in refs:
+                resolver.examples.generate(resolver.resolve(ref))
+    if cache is not None and (not cached or type == "admin" and resolver.stats["refs_resolved"]):
+        with report.stage(key, "cache"):
+            cache.save("raw", digest, {"spec": spec, "resolved": resolver.cache if type == "admin" else {}})
+
+    if type == "admin":
+        # Only regenerate events whose schemas changed since the last run
+        cache_file = webhook_cache_path(version)
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        if stream:
+            regenerated = []
+            events = sorted(WEBHOOKS, key=lambda each: each["event"])
+            webhooks = cache_webhooks(
+                cache_file, iter_webhooks(spec, previous=load_json(cache_file), events=events, resolver=resolver),
+                regenerated,
+            )
+            if WEBHOOK_SCHEMA_OUTPUT == "components":
+                # Data schemas go into components, which are written first
+                webhooks = list(webhooks)
+        else:
+            with report.stage(key, "generate"):
+                spec["webhooks"], entries, regenerated = generate_webhooks(
+                    spec, previous=load_json(cache_file), resolver=resolver, workers=event_workers
+                )
+            # Sorted by event, as when streamed
+            write_atomic(cache_file, json.dumps(dict(sorted(entries.items()))))
     spec.update(additions)
 
-    with open(api_file, "w") as f:
-        yaml.safe_dump(spec, f)
+    # The previous spec, preferring its JSON artifact which loads much faster
+    previous = None
+    json_file = os.path.splitext(api_file)[0] + ".json"
+    with report.stage(key, "load_previous"):
+        for path in (json_file, api_file):
+            if os.path.exists(path):
+                previous = load_spec(path)
+                break
+
+    diff = None
+    if stream:
+        with report.stage(key, "stream"):
+            entries, document, changes = stream_spec(api_file, spec, webhooks if type == "admin" else None, previous)
+        if changes is not None:
+            diff = diff_result(previous.get("info", {}).get("version"), spec["info"]["version"], changes)
+    else:
+        with report.stage(key, "dump"):
+            text = yaml.dump(spec, Dumper=SpecDumper)
+        with report.stage(key, "write"):
+            write_atomic(api_file, text)
+
+        # JSON and precompressed variants for consumers that don't need YAML
+        with report.stage(key, "artifacts"):
+            entries = write_spec_artifacts(api_file, text, spec)
+        document = normalize(spec)
+        if previous is not None:
+            with report.stage(key, "diff"):
+                diff = diff_specs(previous, document)
+    report.count(key, bytes_written=entries[os.path.relpath(api_file, BASE_API_FILES_PATH)]["size"])
+
+    # Per-tag and per-operation shards for pages that need part of the spec
+    with report.stage(key, "shards"):
+        shard_entries, shards_written = write_spec_shards(type, version, document)
+    entries.update(shard_entries)
+    report.count(key, shards_written=shards_written)
+    # Search records and local inverted index, uploaded by search_sync.py
+    with report.stage(key, "search"):
+        entries.update(write_search_index(type, version, document))
+
+    if type == "admin":
+        report.count(key, events_regenerated=len(regenerated), **resolver.stats)
+        print("Regenerated {} of {} webhook events".format(len(regenerated), len(WEBHOOKS)))
+    if diff is not None:
+        write_changelog(type, version, diff)
+        report.count(key, spec_changes=len(diff["changes"]))
+        print("{} changes since the previous {} spec".format(len(diff["changes"]), key))
+    return entries
+
+
+def process_spec(type, version, description, additions, content, trace_memory=False, event_workers=1, stream=False):
+    """
+    update_spec_file for a process pool worker. Returns the manifest entries
+    and the worker's report for the version.
+    """
+    report = RefreshReport(trace_memory=trace_memory)
+    report.start()
+    try:
+        entries = update_spec_file(type, version, description, additions, content, report, event_workers, stream=stream)
+    finally:
+        report.stop()
+    return entries, report.version("{}/{}".format(type, version))
+
+
+def download_and_update_spec_file(type, source, version, description, additions, session=None):
+    response = download_spec(session or create_session(1), source, version)
+    entries = update_spec_file(type, version, description, additions, response.content)
+    update_manifest(entries, replace=["{}/{}".format(type, version)])
+
+
+def check_version(version, response, entry, local_hash, report=None):
+    """
+    Returns the version's new state entry and whether its spec file needs to
+    be regenerated, i.e. whether the upstream bytes or local inputs changed.
+    """
+    report = report or RefreshReport()
+    key = "{}/{}".format(version["type"], version["version"])
+    api_file = spec_file_path(version["type"], version["version"])
+    label = "{} api version: {}".format(version["type"], version["version"])
+    new_entry = {
+        "etag": response.headers.get("ETag", entry.get("etag")),
+        "last_modified": response.headers.get("Last-Modified", entry.get("last_modified")),
+        "content_hash": entry.get("content_hash"),
+        "inputs_hash": local_hash,
+    }
+
+    report.version(key)["status"] = "unchanged"
+    if response.status_code == 304:
+        print("Unchanged {}".format(label))
+        return new_entry, False
+
+    content_hash = hashlib.sha256(response.content).hexdigest()
+    if (
+        content_hash == entry.get("content_hash")
+        and local_hash == entry.get("inputs_hash")
+        and os.path.exists(api_file)
+    ):
+        print("Unchanged {}".format(label))
+        return new_entry, False
+
+    print("Updating {}".format(label))
+    report.version(key)["status"] = "updated"
+    new_entry["content_hash"] = content_hash
+    return new_entry, True
+
+
+def update_api_spec(
+    workers=FETCH_WORKERS,
+    report=None,
+    source=None,
+    generate_workers=GENERATE_WORKERS,
+    event_workers=EVENT_WORKERS,
+    stream=SPEC_STREAM,
+):
+    """
+    Downloads all API_VERSIONS concurrently over a pooled session and
+    processes each version as soon as its download finishes. Versions whose
+    upstream spec and local inputs are unchanged since the last run are
+    skipped without being parsed or rewritten. Stage timings and counters
+    are collected in ``report`` when given, and ``source`` overrides where
+    every version is fetched from (see version_source).
+
+    Versions processed in this process share a SchemaStore, so schemas
+    that are the same across admin versions are only resolved once. With
+    ``generate_workers`` > 1 the changed versions are processed in a
+    process pool instead (without sharing the store), and ``event_workers``
+    > 1 spreads each version's webhook events over a process pool too.
+    Output is identical to serial runs. ``stream`` writes specs section by
+    section (see update_spec_file). Once a type's versions are processed,
+    the webhook payload size reports of all of them are rewritten (see
+    payload_sizes.py).
+    """
+    report = report or RefreshReport()
+    state = load_state()
+    new_state = dict(state)
+    session = create_session(workers)
+    store = SchemaStore()
+    pool = None
+    if generate_workers > 1:
+        pool = ProcessPoolExecutor(generate_workers, mp_context=multiprocessing.get_context("spawn"))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+        for version in API_VERSIONS:
+            key = "{}/{}".format(version["type"], version["version"])
+            entry = state.get(key, {})
+            local_hash = inputs_hash(version)
+            headers = conditional_headers(entry, local_hash, spec_file_path(version["type"], version["version"]))
+            future = executor.submit(
+                timed_download, session, version_source(version, source), version["version"], headers
+            )
+            futures[future] = (key, version, entry, local_hash)
+        processing = {}
+        updated_types = set()
+        try:
+            for future in as_completed(futures):
+                key, version, entry, local_hash = futures[future]
+                response, seconds = future.result()
+                report.record(key, "download", seconds)
+                report.count(key, bytes_downloaded=len(response.content))
+                new_entry, changed = check_version(version, response, entry, local_hash, report)
+                spec_args = (
+                    version["type"],
+                    version["version"],
+                    version["description"],
+                    version["additions"],
+                    response.content,
+                )
+                if not changed:
+                    new_state[key] = new_entry
+                    continue
+                updated_types.add(version["type"])
+                if pool:
+                    future = pool.submit(process_spec, *spec_args, report.trace_memory, event_workers, stream)
+                    processing[future] = (key, new_entry)
+                else:
+                    update_manifest(update_spec_file(*spec_args, report, event_workers, store, stream), replace=[key])
+                    new_state[key] = new_entry
+
+            for future in as_completed(processing):
+                key, new_entry = processing[future]
+                entries, version_report = future.result()
+                report.merge(key, version_report)
+                update_manifest(entries, replace=[key])
+                new_state[key] = new_entry
+
+            # Size reports compare each version with the one before it, so
+            # they're written once every version of the type is
+            for type in sorted(updated_types):
+                with report.stage(type, "payload_sizes"):
+                    update_manifest(write_payload_sizes(type))
+            # Versions no longer configured
+            prune_manifest(["{}/{}".format(version["type"], version["version"]) for version in API_VERSIONS])
+        finally:
+            if pool:
+                pool.shutdown(cancel_futures=True)
+            if new_state != state:
+                save_state(new_state)
 
 
-def update_api_spec():
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Refresh the API specs in " + BASE_API_FILES_PATH)
+    parser.add_argument("--workers", type=int, default=FETCH_WORKERS, help="concurrent downloads")
+    parser.add_argument("--generate-workers", type=int, default=GENERATE_WORKERS,
+                        help="processes generating versions in parallel")
+    parser.add_argument("--event-workers", type=int, default=EVENT_WORKERS,
+                        help="processes generating each version's webhook events in parallel")
+    parser.add_argument("--stream", action="store_true", default=SPEC_STREAM,
+                        help="write specs section by section to lower peak memory")
+    parser.add_argument("--source", metavar="DIR_OR_URL",
+                        help="fetch every version from a snapshot directory or a spec_server.py URL")
+    parser.add_argument("--report", metavar="PATH", help="write a JSON report of per-stage timings and counters")
+    parser.add_argument("--trace-memory", action="store_true", help="include per-stage peak memory in the report")
+    parser.add_argument("--profile", metavar="PATH", help="dump cProfile stats of the slowest stage")
+    args = parser.parse_args(argv)
 
-    for version in API_VERSIONS:
-        print("Updating {} api version: {}".format(version["type"], version["version"]))
-        download_and_update_spec_file(
-            version["type"],
-            version["source"],
-            version["version"],
-            version["description"],
-            version["additions"],
-        )
+    report = RefreshReport(trace_memory=args.trace_memory, profile_path=args.profile)
+    report.start()
+    try:
+        update_api_spec(args.workers, report, args.source, args.generate_workers, args.event_workers, args.stream)
+    finally:
+        report.stop()
+        if args.report:
+            report.write(args.report)
 
 
-update_api_spec()
+if __name__ == "__main__":
+    main()
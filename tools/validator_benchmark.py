@@ -0,0 +1,173 @@
+"""
+Benchmarks compiled webhook validators (see validator_compiler.py) against
+generic JSON Schema validation with jsonschema:
+
+    python validator_benchmark.py ../public/api/admin/unstable.yaml
+    python validator_benchmark.py ../public/api/admin/unstable.json --events "order.*" --number 2000
+
+For each event a complete payload is built from its schema and timed with
+both, the common case of a receiver. Variants of it with one field broken
+(wrong type, or a property removed) are validated by both too, and the
+run fails if the two ever disagree on whether a payload is valid.
+"""
+import argparse
+import copy
+import importlib
+import json
+import re
+import sys
+import tempfile
+import time
+
+try:
+    from jsonschema import Draft202012Validator
+except ImportError:  # the comparison needs it, see main()
+    Draft202012Validator = None
+
+from spec_diff import load_spec
+from validator_compiler import compile_validators, event_schema
+from webhooks import _scalar_example
+
+BROKEN_FIELDS = 20
+MAX_DEPTH = 8
+
+
+def sample_payload(schema, depth=0):
+    """
+    Returns a value that is valid under schema, with every property filled
+    in, unlike the size-limited examples in the spec.
+    """
+    if not isinstance(schema, dict):
+        return None
+    if "const" in schema:
+        return schema["const"]
+    if "enum" in schema:
+        values = [value for value in schema["enum"] if value is not None]
+        return values[0] if values else None
+    for keyword in ("allOf", "anyOf", "oneOf"):
+        if schema.get(keyword):
+            merged = dict(schema)
+            del merged[keyword]
+            for subschema in schema[keyword][:1] if keyword != "allOf" else schema[keyword]:
+                merged.update(subschema)
+            return sample_payload(merged, depth)
+
+    types = schema.get("type", "object")
+    types = [types] if isinstance(types, str) else types
+    schema_type = next((type for type in types if type != "null"), "null")
+    if schema_type == "object":
+        if depth >= MAX_DEPTH:
+            return {}
+        return {name: sample_payload(value, depth + 1) for name, value in schema.get("properties", {}).items()}
+    if schema_type == "array":
+        return [sample_payload(schema.get("items", {}), depth + 1)] if depth < MAX_DEPTH else []
+    if schema_type == "integer":
+        return int(schema.get("minimum", 0))
+    if schema_type == "number":
+        return float(schema.get("minimum", 0))
+    value = _scalar_example(schema, schema_type)
+    if isinstance(value, str):
+        if "pattern" in schema and not re.search(schema["pattern"], value):
+            candidates = [candidate for candidate in ("0", "0.00", "a", "") if re.search(schema["pattern"], candidate)]
+            value = candidates[0] if candidates else value
+        value = value[:schema.get("maxLength", len(value))]
+    return value
+
+
+def broken_payloads(payload, limit=BROKEN_FIELDS):
+    """Yields copies of payload with one nested value replaced or removed."""
+    paths = []
+
+    def walk(value, path):
+        if isinstance(value, dict):
+            for key, child in value.items():
+                paths.append(path + (key,))
+                walk(child, path + (key,))
+        elif isinstance(value, list):
+            for index, child in enumerate(value):
+                paths.append(path + (index,))
+                walk(child, path + (index,))
+
+    walk(payload, ())
+    step = max(1, len(paths) // limit)
+    for path in paths[::step][:limit]:
+        for remove in (False, True):
+            broken = copy.deepcopy(payload)
+            parent = broken
+            for key in path[:-1]:
+                parent = parent[key]
+            if remove and isinstance(parent, dict):
+                del parent[path[-1]]
+            elif not remove:
+                # A value of a type no schema here allows for the same field
+                current = parent[path[-1]]
+                parent[path[-1]] = [] if isinstance(current, (str, int, float, bool, dict)) or current is None else "x"
+            else:
+                continue
+            yield broken
+
+
+def timed(func, payloads, number):
+    start = time.perf_counter()
+    for _ in range(number):
+        for payload in payloads:
+            func(payload)
+    return (time.perf_counter() - start) / (number * len(payloads))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark compiled webhook validators against jsonschema")
+    parser.add_argument("spec", help="processed admin spec (YAML or JSON)")
+    parser.add_argument("--events", nargs="*", metavar="PATTERN", help="event globs, default all")
+    parser.add_argument("--number", type=int, default=500, help="validations of each payload per timing")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    if Draft202012Validator is None:
+        parser.error("jsonschema is required for the generic validation baseline")
+
+    spec = load_spec(args.spec)
+    output = tempfile.mkdtemp(prefix="validators-")
+    compile_validators(spec, output, "bench_validators", args.events)
+    sys.path.insert(0, output)
+    package = importlib.import_module("bench_validators")
+
+    results = {}
+    mismatches = 0
+    print("{:<24} {:>9} {:>14} {:>14} {:>8}".format("event", "payloads", "compiled (us)", "generic (us)", "speedup"))
+    for event, validate in package.VALIDATORS.items():
+        module = importlib.import_module("bench_validators." + validate.__module__.rsplit(".", 1)[1])
+        schema = event_schema(spec, event)
+        generic = Draft202012Validator(schema)
+        payload = sample_payload(schema)
+        payloads = [payload] + list(broken_payloads(payload))
+
+        for each in payloads:
+            if module.is_valid(each) != generic.is_valid(each):
+                mismatches += 1
+                print("Mismatch for {}: {}".format(event, json.dumps(each)[:200]), file=sys.stderr)
+
+        compiled_time = timed(module.is_valid, [payload], args.number)
+        generic_time = timed(generic.is_valid, [payload], max(1, args.number // 10))
+        results[event] = {
+            "payloads": len(payloads),
+            "valid": generic.is_valid(payload),
+            "payload_bytes": len(json.dumps(payload)),
+            "compiled_seconds": compiled_time,
+            "generic_seconds": generic_time,
+            "speedup": generic_time / compiled_time,
+        }
+        print("{:<24} {:>9} {:>14.1f} {:>14.1f} {:>7.1f}x".format(
+            event, len(payloads), compiled_time * 1e6, generic_time * 1e6, generic_time / compiled_time
+        ))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"mismatches": mismatches, "events": results}, f, indent=2)
+    if mismatches:
+        print("{} payloads were judged differently".format(mismatches), file=sys.stderr)
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
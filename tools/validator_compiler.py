@@ -0,0 +1,434 @@
+"""
+Compiles webhook payload schemas into specialized Python validators.
+
+For every webhook event of a processed spec, the requestBody schema is
+turned into straight-line Python code, so validating a payload never
+walks the schema at runtime:
+
+    python validator_compiler.py ../public/api/admin/unstable.yaml --output build/validators
+    python validator_compiler.py ../public/api/admin/unstable.json --events "order.*" "subscription.*"
+
+The output is a package, named after the version (e.g. admin_unstable),
+with a module per event and a validate(event_type, payload) entry point:
+
+    from admin_unstable import ValidationError, validate
+    validate(payload["event_type"], payload)
+
+Validation follows JSON Schema 2020-12 as used by OpenAPI 3.1, so a
+payload is valid exactly when a generic validator such as jsonschema's
+Draft202012Validator accepts it: formats and OpenAPI 3.0 keywords like
+nullable are annotations. Schemas using keywords the compiler doesn't
+implement are rejected when compiling rather than silently ignored.
+"""
+import argparse
+import fnmatch
+import keyword
+import os
+import re
+
+from config import CACHE_DIR
+from spec_diff import load_spec
+
+# Keywords that don't affect validation
+ANNOTATIONS = {
+    "$comment", "$schema", "$id", "title", "description", "default", "examples", "example", "deprecated",
+    "readOnly", "writeOnly", "format", "nullable", "discriminator", "xml", "externalDocs",
+    "contentEncoding", "contentMediaType",
+}
+KEYWORDS = {
+    "$ref", "type", "enum", "const", "minLength", "maxLength", "pattern", "minimum", "maximum",
+    "exclusiveMinimum", "exclusiveMaximum", "properties", "required", "additionalProperties",
+    "items", "minItems", "maxItems", "allOf", "anyOf", "oneOf", "not",
+}
+TYPE_CHECKS = {
+    "string": "isinstance({0}, str)",
+    "object": "isinstance({0}, dict)",
+    "array": "isinstance({0}, list)",
+    "boolean": "({0} is True or {0} is False)",
+    "null": "{0} is None",
+    # Floats with an integral value are integers in JSON Schema, bools are not
+    "integer": "(type({0}) is int or type({0}) is float and {0}.is_integer())",
+    "number": "type({0}) in (int, float)",
+}
+GUARDS = {
+    "string": ("string",),
+    "number": ("integer", "number"),
+    "object": ("object",),
+    "array": ("array",),
+}
+
+RUNTIME = '''"""
+Runtime support shared by the compiled validators. Generated by
+validator_compiler.py, do not edit.
+"""
+
+_MISSING = object()
+
+
+class ValidationError(ValueError):
+    """A payload doesn't match its schema; path is a JSON path into the payload."""
+
+    def __init__(self, path, message):
+        super().__init__("{}: {}".format(path, message))
+        self.path = path
+        self.message = message
+
+
+def _equal(a, b):
+    """JSON equality: booleans are never equal to numbers."""
+    if isinstance(a, bool) or isinstance(b, bool):
+        return a is b
+    if isinstance(a, list) and isinstance(b, list):
+        return len(a) == len(b) and all(_equal(x, y) for x, y in zip(a, b))
+    if isinstance(a, dict) and isinstance(b, dict):
+        return a.keys() == b.keys() and all(_equal(a[key], b[key]) for key in a)
+    if isinstance(a, (list, dict)) or isinstance(b, (list, dict)):
+        return False
+    return a == b
+
+
+def _is_valid(validator, value):
+    try:
+        validator(value, "")
+    except ValidationError:
+        return False
+    return True
+'''
+
+
+class UnsupportedSchema(ValueError):
+    """A schema uses a $ref, keyword or type the compiler doesn't implement."""
+
+
+def is_trivial(schema):
+    """Whether a schema accepts everything."""
+    return schema is True or isinstance(schema, dict) and all(
+        key in ANNOTATIONS or key.startswith("x-") for key in schema
+    )
+
+
+class ValidatorCompiler:
+    """
+    Compiles one schema into the source of a validator module. $refs into
+    the spec's components and anyOf/oneOf/not branches become functions of
+    their own, everything else is inlined.
+    """
+
+    def __init__(self, spec):
+        self.spec = spec
+        self.constants = []
+        self.functions = []
+        self.refs = {}
+        self.names = 0
+
+    def name(self, prefix):
+        self.names += 1
+        return "{}{}".format(prefix, self.names)
+
+    def constant(self, source):
+        name = "_C{}".format(len(self.constants))
+        self.constants.append("{} = {}".format(name, source))
+        return name
+
+    @staticmethod
+    def path_expr(path):
+        """
+        Python expression of a path given as literal strings, ("index", var)
+        and ("base", var) parts. Only evaluated when raising an error.
+        """
+        pieces = []
+        for part in path:
+            if isinstance(part, str):
+                if pieces and pieces[-1][0] == "literal":
+                    pieces[-1] = ("literal", pieces[-1][1] + part)
+                else:
+                    pieces.append(("literal", part))
+            elif part[0] == "index":
+                pieces.append(("code", "str({})".format(part[1])))
+            else:
+                pieces.append(("code", part[1]))
+        return " + ".join(repr(value) if kind == "literal" else value for kind, value in pieces) or "''"
+
+    def fail(self, path, message):
+        return "raise ValidationError({}, {!r})".format(self.path_expr(path), message)
+
+    def function(self, schema, name=None):
+        """Compiles schema into a function(value, path) and returns its name."""
+        name = name or self.name("_s")
+        body = []
+        self.emit(schema, "value", (("base", "path"),), body, 1)
+        self.functions.append("def {}(value, path):\n{}\n".format(name, "\n".join(body or ["    pass"])))
+        return name
+
+    def ref_function(self, ref):
+        if ref not in self.refs:
+            parts = ref.split("/")
+            if len(parts) != 4 or parts[:2] != ["#", "components"]:
+                raise UnsupportedSchema("Unsupported $ref: {}".format(ref))
+            target = self.spec.get("components", {}).get(parts[2], {}).get(parts[3])
+            if target is None:
+                raise ValueError("Unresolvable $ref: {}".format(ref))
+            # Registered before compiling, recursive schemas call themselves
+            self.refs[ref] = "_ref_" + re.sub(r"\W", "_", parts[3])
+            try:
+                self.function(target, self.refs[ref])
+            except UnsupportedSchema as error:
+                raise UnsupportedSchema("{}: {}".format(ref, error)) from None
+        return self.refs[ref]
+
+    def emit(self, schema, var, path, out, depth):
+        """Appends the lines validating var against schema to out."""
+        pad = "    " * depth
+        if is_trivial(schema):
+            return
+        if schema is False:
+            out.append(pad + self.fail(path, "is not allowed"))
+            return
+        unsupported = [
+            key for key in schema if key not in KEYWORDS and key not in ANNOTATIONS and not key.startswith("x-")
+        ]
+        if unsupported:
+            raise UnsupportedSchema("Unsupported keywords: {}".format(", ".join(sorted(unsupported))))
+
+        if "$ref" in schema:
+            out.append("{}{}({}, {})".format(pad, self.ref_function(schema["$ref"]), var, self.path_expr(path)))
+
+        types = schema.get("type")
+        types = [types] if isinstance(types, str) else list(types or [])
+        unknown = [type for type in types if type not in TYPE_CHECKS]
+        if unknown:
+            raise UnsupportedSchema("Unsupported types: {}".format(", ".join(map(str, unknown))))
+        if types:
+            check = " or ".join(TYPE_CHECKS[type].format(var) for type in types)
+            out.append("{}if not ({}):".format(pad, check))
+            out.append("{}    {}".format(pad, self.fail(path, "is not of type {}".format(", ".join(types)))))
+
+        if "enum" in schema:
+            values = schema["enum"]
+            strings = [value for value in values if isinstance(value, str)]
+            if len(strings) + values.count(None) == len(values):
+                check = "isinstance({0}, str) and {0} in {1}".format(var, self.constant(repr(frozenset(strings))))
+                if None in values:
+                    check = "{} is None or {}".format(var, check)
+            else:
+                check = "any(_equal({}, value) for value in {})".format(var, self.constant(repr(tuple(values))))
+            out.append("{}if not ({}):".format(pad, check))
+            out.append("{}    {}".format(pad, self.fail(path, "is not one of {!r}".format(values))))
+        if "const" in schema:
+            out.append("{}if not _equal({}, {}):".format(pad, var, self.constant(repr(schema["const"]))))
+            out.append("{}    {}".format(pad, self.fail(path, "is not {!r}".format(schema["const"]))))
+
+        def guarded(kind):
+            """Returns the lines' indent, adding an isinstance guard unless the type check implies it."""
+            if types and all(type in GUARDS[kind] for type in types):
+                return depth
+            check = " or ".join(TYPE_CHECKS[type].format(var) for type in GUARDS[kind][-1:])
+            out.append("{}if {}:".format(pad, check))
+            return depth + 1
+
+        if any(key in schema for key in ("minLength", "maxLength", "pattern")):
+            inner = "    " * guarded("string")
+            if "minLength" in schema:
+                out.append("{}if len({}) < {}:".format(inner, var, schema["minLength"]))
+                out.append("{}    {}".format(inner, self.fail(path, "is too short")))
+            if "maxLength" in schema:
+                out.append("{}if len({}) > {}:".format(inner, var, schema["maxLength"]))
+                out.append("{}    {}".format(inner, self.fail(path, "is too long")))
+            if "pattern" in schema:
+                pattern = self.constant("re.compile({!r})".format(schema["pattern"]))
+                out.append("{}if not {}.search({}):".format(inner, pattern, var))
+                out.append("{}    {}".format(inner, self.fail(path, "does not match {!r}".format(schema["pattern"]))))
+
+        bounds = (
+            ("minimum", "<", "is less than the minimum of {}"),
+            ("maximum", ">", "is greater than the maximum of {}"),
+            ("exclusiveMinimum", "<=", "is less than or equal to the minimum of {}"),
+            ("exclusiveMaximum", ">=", "is greater than or equal to the maximum of {}"),
+        )
+        if any(key in schema for key, _, _ in bounds):
+            inner = "    " * guarded("number")
+            for key, operator, message in bounds:
+                if key in schema:
+                    out.append("{}if {} {} {!r}:".format(inner, var, operator, schema[key]))
+                    out.append("{}    {}".format(inner, self.fail(path, message.format(schema[key]))))
+
+        if any(key in schema for key in ("properties", "required", "additionalProperties")):
+            level = guarded("object")
+            self.emit_object(schema, var, path, out, level)
+
+        if any(key in schema for key in ("items", "minItems", "maxItems")):
+            level = guarded("array")
+            inner = "    " * level
+            if "minItems" in schema:
+                out.append("{}if len({}) < {}:".format(inner, var, schema["minItems"]))
+                out.append("{}    {}".format(inner, self.fail(path, "is too short")))
+            if "maxItems" in schema:
+                out.append("{}if len({}) > {}:".format(inner, var, schema["maxItems"]))
+                out.append("{}    {}".format(inner, self.fail(path, "is too long")))
+            if not is_trivial(schema.get("items", True)):
+                index, item = self.name("i"), self.name("v")
+                out.append("{}for {}, {} in enumerate({}):".format(inner, index, item, var))
+                self.emit(schema["items"], item, path + ("[", ("index", index), "]"), out, level + 1)
+
+        for subschema in schema.get("allOf", []):
+            self.emit(subschema, var, path, out, depth)
+        if "anyOf" in schema:
+            branches = [self.function(subschema) for subschema in schema["anyOf"]]
+            check = " or ".join("_is_valid({}, {})".format(branch, var) for branch in branches)
+            out.append("{}if not ({}):".format(pad, check))
+            out.append("{}    {}".format(pad, self.fail(path, "is not valid under any of the given schemas")))
+        if "oneOf" in schema:
+            branches = [self.function(subschema) for subschema in schema["oneOf"]]
+            check = " + ".join("_is_valid({}, {})".format(branch, var) for branch in branches)
+            out.append("{}if ({}) != 1:".format(pad, check))
+            out.append("{}    {}".format(pad, self.fail(path, "is not valid under exactly one of the given schemas")))
+        if "not" in schema:
+            out.append("{}if _is_valid({}, {}):".format(pad, self.function(schema["not"]), var))
+            out.append("{}    {}".format(pad, self.fail(path, "should not be valid")))
+
+    def emit_object(self, schema, var, path, out, depth):
+        pad = "    " * depth
+        required = schema.get("required", [])
+        for name in required:
+            out.append("{}if {!r} not in {}:".format(pad, name, var))
+            out.append("{}    {}".format(pad, self.fail(path, "{!r} is a required property".format(name))))
+
+        properties = schema.get("properties", {})
+        for name, subschema in properties.items():
+            if is_trivial(subschema):
+                continue
+            child = self.name("v")
+            if name.isidentifier() and not keyword.iskeyword(name):
+                child_path = path + ("." + name,)
+            else:
+                child_path = path + ("[{!r}]".format(name),)
+            if name in required:
+                out.append("{}{} = {}[{!r}]".format(pad, child, var, name))
+                self.emit(subschema, child, child_path, out, depth)
+            else:
+                out.append("{}{} = {}.get({!r}, _MISSING)".format(pad, child, var, name))
+                out.append("{}if {} is not _MISSING:".format(pad, child))
+                body = []
+                self.emit(subschema, child, child_path, body, depth + 1)
+                out.extend(body or [pad + "    pass"])
+
+        additional = schema.get("additionalProperties", True)
+        if not is_trivial(additional):
+            key, value = self.name("k"), self.name("v")
+            known = self.constant(repr(frozenset(properties)))
+            out.append("{}for {}, {} in {}.items():".format(pad, key, value, var))
+            out.append("{}    if {} in {}:".format(pad, key, known))
+            out.append("{}        continue".format(pad))
+            if additional is False:
+                out.append("{}    {}".format(pad, self.fail(path, "has unexpected properties")))
+            else:
+                self.emit(additional, value, path + ("[", ("index", "repr({})".format(key)), "]"), out, depth + 1)
+
+    def compile(self, schema, header):
+        """Returns the source of a module validating payloads against schema."""
+        body = []
+        self.emit(schema, "payload", ("$",), body, 1)
+        lines = ['"""', header, '"""', "import re", ""]
+        lines.append("from ._runtime import ValidationError, _MISSING, _equal, _is_valid")
+        if self.constants:
+            lines += [""] + self.constants
+        for function in self.functions:
+            lines += ["", ""] + function.rstrip("\n").split("\n")
+        lines += [
+            "", "",
+            "def validate(payload):",
+            '    """Raises ValidationError if payload doesn\'t match the schema."""',
+        ] + (body or ["    pass"]) + [
+            "", "",
+            "def is_valid(payload):",
+            "    try:",
+            "        validate(payload)",
+            "    except ValidationError:",
+            "        return False",
+            "    return True",
+            "",
+        ]
+        return "\n".join(lines)
+
+
+def event_schema(spec, event):
+    return spec["webhooks"][event]["post"]["requestBody"]["content"]["application/json"]["schema"]
+
+
+def module_name(name):
+    """A module name for an event or version, e.g. order.created -> order_created."""
+    name = re.sub(r"\W", "_", name).strip("_").lower()
+    return "_" + name if not name or name[0].isdigit() or keyword.iskeyword(name) else name
+
+
+def compile_validators(spec, output, package, events=None):
+    """
+    Writes a validator package for the webhook events of a parsed spec
+    matching any of the ``events`` glob patterns (default all). Returns the
+    package directory. Raises UnsupportedSchema naming the event, and the
+    component if any, whose schema can't be compiled.
+    """
+    selected = [
+        event for event in sorted(spec.get("webhooks", {}))
+        if not events or any(fnmatch.fnmatch(event, pattern) for pattern in events)
+    ]
+    version = spec["info"]["version"]
+    directory = os.path.join(output, package)
+    os.makedirs(directory, exist_ok=True)
+
+    modules = {}
+    for event in selected:
+        header = (
+            "Validator for {} webhook payloads, API version {}. Generated by\n"
+            "validator_compiler.py, do not edit."
+        ).format(event, version)
+        modules[event] = module_name(event)
+        try:
+            source = ValidatorCompiler(spec).compile(event_schema(spec, event), header)
+        except UnsupportedSchema as error:
+            raise UnsupportedSchema("{}: {}".format(event, error)) from None
+        with open(os.path.join(directory, modules[event] + ".py"), "w") as f:
+            f.write(source)
+    with open(os.path.join(directory, "_runtime.py"), "w") as f:
+        f.write(RUNTIME)
+
+    init = [
+        '"""',
+        "Compiled webhook payload validators, API version {}. Generated by".format(version),
+        "validator_compiler.py, do not edit.",
+        '"""',
+        "from ._runtime import ValidationError",
+    ]
+    init += ["from . import {}".format(name) for name in sorted(modules.values())]
+    init += ["", "VALIDATORS = {"]
+    init += ["    {!r}: {}.validate,".format(event, name) for event, name in modules.items()]
+    init += [
+        "}",
+        "",
+        "",
+        "def validate(event_type, payload):",
+        '    """Validates a payload of event_type; raises KeyError for unknown events."""',
+        "    VALIDATORS[event_type](payload)",
+        "",
+    ]
+    with open(os.path.join(directory, "__init__.py"), "w") as f:
+        f.write("\n".join(init))
+    return directory
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compile webhook payload validators from a processed spec")
+    parser.add_argument("spec", help="processed admin spec (YAML or JSON)")
+    parser.add_argument("--output", default=os.path.join(CACHE_DIR, "validators"), help="directory for the package")
+    parser.add_argument("--package", help="package name (default <type>_<version> from the spec file)")
+    parser.add_argument("--events", nargs="*", metavar="PATTERN", help="event globs to compile, e.g. 'order.*'")
+    args = parser.parse_args(argv)
+
+    spec = load_spec(args.spec)
+    parent, file_name = os.path.split(os.path.abspath(args.spec))
+    package = args.package or module_name("{}_{}".format(os.path.basename(parent), os.path.splitext(file_name)[0]))
+    print("Wrote {}".format(compile_validators(spec, args.output, package, args.events)))
+
+
+if __name__ == "__main__":
+    main()
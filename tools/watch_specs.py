@@ -0,0 +1,373 @@
+"""
+Watch mode for iterating on specs and webhook config locally.
+
+Builds every version once, then keeps the parsed specs, resolved schemas
+and generated webhooks in memory and polls config.py, the tools and the
+local spec sources for changes:
+
+    python watch_specs.py --source ../snapshots
+    python watch_specs.py --source http://127.0.0.1:8100   # fetched once, config still watched
+
+On a change only the affected versions are regenerated, and within them
+only the webhook events whose inputs changed (see webhook_fingerprints).
+Only the sections of the YAML and JSON that changed are dumped again, so
+edits to WEBHOOKS, CUSTOM_WEBHOOK_EVENT_PAYLOADS, API_VERSIONS or a local
+snapshot are written within a fraction of a second. The slow outputs
+(compressed variants, manifest, shards, search index and webhook cache)
+are written once edits have settled for WATCH_SETTLE seconds. Changelogs
+and the refresh state are left to update_api_docs.py.
+
+Edits to other settings or to the tools restart the process, which is
+quick with the spec cache (see spec_cache.py).
+"""
+import argparse
+import json
+import os
+import pickle
+import runpy
+import sys
+import time
+import traceback
+
+import yaml
+
+import config
+from artifacts import load_json, minified_json, update_manifest, write_artifact, write_atomic
+from config import WATCH_INTERVAL, WATCH_SETTLE
+from http_session import create_session
+from payload_sizes import write_payload_sizes
+from search_index import write_search_index
+from shards import write_spec_shards
+from spec_cache import content_digest, default_cache
+from spec_yaml import SpecDumper, SpecLoader
+from update_api_docs import (
+    download_spec,
+    is_url,
+    spec_file_path,
+    version_source,
+    webhook_cache_path,
+)
+from webhooks import SchemaResolver, generate_webhooks
+
+CONFIG_FILE = os.path.abspath(config.__file__)
+TOOL_DIR = os.path.dirname(CONFIG_FILE)
+# Settings applied without a restart
+LIVE_SETTINGS = ("API_VERSIONS", "WEBHOOKS", "CUSTOM_WEBHOOK_EVENT_PAYLOADS")
+LIVE_SUFFIXES = ("_SOURCE", "_ADDITIONS", "_DESCRIPTION")
+
+
+def version_key(version):
+    return "{}/{}".format(version["type"], version["version"])
+
+
+def mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def write_if_changed(path, data):
+    """Writes data unless path already holds it, so unchanged files keep their mtime. Returns whether it wrote."""
+    try:
+        with open(path, "rb") as f:
+            if f.read() == data:
+                return False
+    except OSError:
+        pass
+    write_atomic(path, data)
+    return True
+
+
+class WatchedVersion:
+    """
+    A version's parsed spec (pickled, so every build starts from a fresh
+    copy), its resolver and webhook entries, and the YAML and JSON text of
+    its last build by section.
+    """
+
+    def __init__(self, version, source):
+        self.version = version
+        self.source = source
+        self.key = version_key(version)
+        self.pristine = None
+        self.resolver = None
+        self.entries = load_json(webhook_cache_path(version["version"])) if version["type"] == "admin" else {}
+        self.sections = {}
+        self.document = None
+        self.mtime = None
+
+    @property
+    def local(self):
+        return not is_url(self.source)
+
+    def load(self, session):
+        """Parses the version's source, through the spec cache like update_spec_file."""
+        self.mtime = mtime(self.source) if self.local else None
+        content = download_spec(session, self.source, self.version["version"]).content
+        cache = default_cache()
+        digest = content_digest(content)
+        cached = cache.load("raw", digest) if cache is not None else None
+        spec = cached["spec"] if cached else yaml.load(content, Loader=SpecLoader)
+        self.pristine = pickle.dumps(spec, pickle.HIGHEST_PROTOCOL)
+        self.resolver = None
+        if self.version["type"] == "admin":
+            self.resolver = SchemaResolver(spec)
+            if cached:
+                self.resolver.cache.update(cached["resolved"])
+            for each in config.WEBHOOKS:
+                if each["schema_ref"]:
+                    self.resolver.resolve(each["schema_ref"])
+        if cache is not None and (not cached or self.resolver and self.resolver.stats["refs_resolved"]):
+            cache.save("raw", digest, {"spec": spec, "resolved": self.resolver.cache if self.resolver else {}})
+
+    def build(self):
+        """
+        Generates the spec as update_spec_file does and writes its YAML and
+        JSON. Returns the events regenerated and whether a file changed.
+        """
+        spec = pickle.loads(self.pristine)
+        spec["info"]["description"] = self.version["description"]
+        regenerated = []
+        if self.version["type"] == "admin":
+            spec["webhooks"], self.entries, regenerated = generate_webhooks(
+                spec, config.WEBHOOK_SCHEMA_OUTPUT, self.entries, config.WEBHOOKS, self.resolver
+            )
+        spec.update(self.version["additions"])
+
+        yaml_text, json_text = self.dump(spec)
+        api_file = spec_file_path(self.version["type"], self.version["version"])
+        changed = write_if_changed(api_file, yaml_text)
+        changed = write_if_changed(os.path.splitext(api_file)[0] + ".json", json_text) or changed
+        self.document = json_text
+        return regenerated, changed
+
+    def dump(self, spec):
+        """
+        The YAML and JSON of spec, matching yaml.dump and spec_json byte for
+        byte as stream_spec does. Sections whose JSON is unchanged since the
+        last build, and webhooks whose fingerprint is, reuse their YAML.
+        """
+        sections = {}
+        yaml_parts = []
+        json_parts = []
+        for key in sorted(spec):
+            if key != "webhooks":
+                data = minified_json(spec[key])
+                previous = self.sections.get(key)
+                if previous and previous[0] == data:
+                    text = previous[1]
+                else:
+                    text = yaml.dump({key: spec[key]}, Dumper=SpecDumper)
+                sections[key] = (data, text)
+                yaml_parts.append(text)
+                json_parts.append("{}:{}".format(json.dumps(key, ensure_ascii=False), data))
+                continue
+
+            events_yaml = []
+            events_json = []
+            for event in sorted(spec["webhooks"]):
+                fingerprint = self.entries[event]["fingerprint"]
+                previous = self.sections.get(("webhooks", event))
+                if previous and previous[0] == fingerprint:
+                    data, text = previous[1:]
+                else:
+                    data = minified_json(spec["webhooks"][event])
+                    # Without the "webhooks:" line, it's only written once
+                    text = yaml.dump({"webhooks": {event: spec["webhooks"][event]}}, Dumper=SpecDumper)
+                    text = text.split("\n", 1)[1]
+                sections[("webhooks", event)] = (fingerprint, data, text)
+                events_yaml.append(text)
+                events_json.append("{}:{}".format(json.dumps(event, ensure_ascii=False), data))
+            if events_yaml:
+                yaml_parts.append("webhooks:\n" + "".join(events_yaml))
+            else:
+                yaml_parts.append(yaml.dump({"webhooks": {}}, Dumper=SpecDumper))
+            json_parts.append('"webhooks":{{{}}}'.format(",".join(events_json)))
+        self.sections = sections
+        return "".join(yaml_parts).encode(), "{{{}}}".format(",".join(json_parts)).encode()
+
+    def publish(self):
+        """
+        Writes the slow outputs of the last build: compressed variants,
+        manifest entries, shards, search index, payload size reports and
+        webhook cache.
+        """
+        api_file = spec_file_path(self.version["type"], self.version["version"])
+        document = json.loads(self.document)
+        with open(api_file, "rb") as f:
+            entries = write_artifact(api_file, f.read(), write=False)
+        entries.update(write_artifact(os.path.splitext(api_file)[0] + ".json", self.document, write=False))
+        entries.update(write_spec_shards(self.version["type"], self.version["version"], document)[0])
+        entries.update(write_search_index(self.version["type"], self.version["version"], document))
+        update_manifest(entries, replace=["{}/{}".format(self.version["type"], self.version["version"])])
+        update_manifest(write_payload_sizes(self.version["type"]))
+        if self.version["type"] == "admin":
+            cache_file = webhook_cache_path(self.version["version"])
+            os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+            write_atomic(cache_file, json.dumps(dict(sorted(self.entries.items()))))
+
+
+class SpecWatcher:
+    """Polls the watched files every ``interval`` seconds and rebuilds what they affect."""
+
+    def __init__(self, source=None, interval=WATCH_INTERVAL, settle=WATCH_SETTLE):
+        self.source = source
+        self.interval = interval
+        self.settle = settle
+        self.session = create_session(1)
+        self.versions = {}
+        self.unpublished = set()
+        self.tools = self.tool_mtimes()
+        self.config_mtime = mtime(CONFIG_FILE)
+
+    @staticmethod
+    def tool_mtimes():
+        """mtimes of the loaded modules from the tools directory, besides config.py."""
+        paths = {
+            os.path.abspath(module.__file__) for module in list(sys.modules.values())
+            if getattr(module, "__file__", None) and os.path.dirname(os.path.abspath(module.__file__)) == TOOL_DIR
+        }
+        return {path: mtime(path) for path in paths if path != CONFIG_FILE}
+
+    def build(self, keys, reload=()):
+        """Rebuilds the versions of keys, reparsing those in reload first."""
+        for key in keys:
+            watched = self.versions[key]
+            start = time.perf_counter()
+            try:
+                if key in reload or watched.pristine is None:
+                    watched.load(self.session)
+                regenerated, changed = watched.build()
+            except Exception:
+                # An edit in progress, e.g. invalid YAML; the next save retries
+                traceback.print_exc()
+                print("Failed to build {}, fix it and save again".format(key))
+                continue
+            if changed:
+                self.unpublished.add(key)
+            print("{} {} in {:.0f} ms{}".format(
+                "Wrote" if changed else "Unchanged", key, (time.perf_counter() - start) * 1000,
+                ", {} webhook events regenerated".format(len(regenerated)) if regenerated else "",
+            ))
+
+    def sync_versions(self):
+        """Tracks config.API_VERSIONS; returns the keys of versions added or changed."""
+        current = {}
+        changed = []
+        for version in config.API_VERSIONS:
+            key = version_key(version)
+            source = version_source(version, self.source)
+            watched = self.versions.get(key)
+            if watched is None or watched.source != source:
+                watched = WatchedVersion(version, source)
+                changed.append(key)
+            elif watched.version != version:
+                watched.version = version
+                changed.append(key)
+            current[key] = watched
+        self.versions = current
+        return changed
+
+    def reload_config(self):
+        """
+        Applies an edited config.py. Returns the keys of the versions to
+        rebuild, or None if a setting changed that needs a restart.
+        """
+        try:
+            settings = {name: value for name, value in runpy.run_path(CONFIG_FILE).items() if name.isupper()}
+        except Exception:
+            traceback.print_exc()
+            print("config.py failed to load, fix it and save again")
+            return []
+        names = set(settings) | {name for name in vars(config) if name.isupper()}
+        changed = {name for name in names if settings.get(name, KeyError) != getattr(config, name, KeyError)}
+        if any(name not in LIVE_SETTINGS and not name.endswith(LIVE_SUFFIXES) for name in changed):
+            return None
+
+        for name in changed:
+            # Every loaded module that did "from config import NAME" holds its
+            # own reference to the old value, e.g. shards and search_index
+            old = getattr(config, name, KeyError)
+            for module in list(sys.modules.values()):
+                if module is config or old is not KeyError and getattr(module, name, KeyError) is old:
+                    setattr(module, name, settings[name])
+        keys = self.sync_versions()
+        if changed & {"WEBHOOKS", "CUSTOM_WEBHOOK_EVENT_PAYLOADS"}:
+            keys += [key for key, watched in self.versions.items() if watched.version["type"] == "admin"]
+        return sorted(set(keys))
+
+    def restart(self, reason):
+        print("{}, restarting".format(reason))
+        sys.stdout.flush()
+        os.execv(sys.executable, [sys.executable] + sys.argv)
+
+    def changes(self):
+        """Whether config.py changed, and the keys of versions whose local source did."""
+        config_changed = mtime(CONFIG_FILE) != self.config_mtime
+        sources = [
+            key for key, watched in self.versions.items() if watched.local and mtime(watched.source) != watched.mtime
+        ]
+        return config_changed, sources
+
+    def run(self):
+        self.sync_versions()
+        self.build(list(self.versions))
+        self.publish()
+        print("Watching config.py, the tools and {} local spec sources".format(
+            sum(watched.local for watched in self.versions.values())
+        ))
+        last_change = time.monotonic()
+        while True:
+            time.sleep(self.interval)
+            if self.tool_mtimes() != self.tools:
+                self.restart("Tools changed")
+            config_changed, sources = self.changes()
+            if not config_changed and not sources:
+                if self.unpublished and time.monotonic() - last_change >= self.settle:
+                    self.publish()
+                continue
+
+            # Let editors finish writing before reading the files
+            time.sleep(self.interval)
+            last_change = time.monotonic()
+            keys = set(sources)
+            if config_changed:
+                self.config_mtime = mtime(CONFIG_FILE)
+                rebuild = self.reload_config()
+                if rebuild is None:
+                    self.restart("Settings changed that need a restart")
+                keys.update(rebuild)
+            self.build(sorted(keys), reload=set(sources))
+
+    def publish(self):
+        start = time.perf_counter()
+        for key in sorted(self.unpublished):
+            if key in self.versions:
+                self.versions[key].publish()
+        if self.unpublished:
+            print("Published {} in {:.1f} s".format(", ".join(sorted(self.unpublished)), time.perf_counter() - start))
+        self.unpublished = set()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Regenerate the API specs in {} as their inputs change".format(
+        config.BASE_API_FILES_PATH
+    ))
+    parser.add_argument("--source", metavar="DIR_OR_URL",
+                        help="fetch every version from a snapshot directory or a spec_server.py URL")
+    parser.add_argument("--interval", type=float, default=WATCH_INTERVAL, help="seconds between polls")
+    parser.add_argument("--settle", type=float, default=WATCH_SETTLE,
+                        help="seconds without changes before writing the compressed variants, shards and search")
+    args = parser.parse_args(argv)
+
+    # Report every build as it happens, also when redirected to a file
+    sys.stdout.reconfigure(line_buffering=True)
+    try:
+        SpecWatcher(args.source, args.interval, args.settle).run()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
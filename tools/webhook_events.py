@@ -0,0 +1,334 @@
+"""
+Synthetic webhook events for load testing webhook receivers.
+
+Generates any number of varied webhook event payloads from the payload
+schemas of a processed admin spec, as newline-delimited JSON:
+
+    python webhook_events.py ../public/api/admin/unstable.yaml --count 1000000 --output events.ndjson.gz
+    python webhook_events.py ../public/api/admin/unstable.json --events "order.*" --seed 7 | head
+
+Events are picked at random from the config.WEBHOOKS events in the spec.
+Every field value is valid under its schema, arrays get a random number
+of items (see WEBHOOK_EVENT_ARRAY_MEAN) and event_ids are unique. The same
+seed always produces the same events, and events are written as they are
+generated, so memory use doesn't grow with --count. Send them to a
+receiver with webhook_replay.py.
+"""
+import argparse
+import fnmatch
+import gzip
+import json
+import math
+import random
+import re
+import sys
+import time
+import uuid
+from functools import partial
+
+from config import WEBHOOK_EVENT_ARRAY_MAX, WEBHOOK_EVENT_ARRAY_MEAN, WEBHOOK_EVENT_MAX_DEPTH, WEBHOOKS
+from spec_diff import load_spec
+from validator_compiler import event_schema, is_trivial
+
+# Share of nullable values that are null
+NULL_RATE = 0.1
+# Generated timestamps fall within a year from this date
+DATE_START = 1704067200  # 2024-01-01T00:00:00Z
+DATE_RANGE = 365 * 24 * 3600
+
+WORDS = (
+    "alpha", "amber", "basic", "bold", "cedar", "classic", "coral", "delta", "ember", "fresh",
+    "harbor", "ivory", "juniper", "linen", "maple", "nova", "olive", "prime", "quartz", "slate",
+)
+# Values of string fields whose name contains the key, where any string is allowed
+NAME_VALUES = {
+    "currency": ("USD", "EUR", "GBP", "CAD", "AUD"),
+    "country": ("US", "GB", "DE", "CA", "AU"),
+    "first_name": ("Ada", "Grace", "Alan", "Linus", "Barbara"),
+    "last_name": ("Lovelace", "Hopper", "Turing", "Torvalds", "Liskov"),
+    "city": ("Austin", "Leeds", "Berlin", "Toronto", "Perth"),
+    "phone": ("+12025550123", "+442079460958", "+4930901820"),
+    "postcode": ("78701", "LS1 4AP", "10115", "M5H 2N2"),
+}
+FORMAT_VALUES = {
+    "date-time": lambda rng: random_time(rng, "%Y-%m-%dT%H:%M:%SZ"),
+    "date": lambda rng: random_time(rng, "%Y-%m-%d"),
+    "uuid": lambda rng: str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+    "uri": lambda rng: "https://example.com/{}/{}/".format(rng.choice(WORDS), rng.randint(1, 99999)),
+    "email": lambda rng: "{}{}@example.com".format(rng.choice(WORDS), rng.randint(1, 99999)),
+    "decimal": lambda rng: "{:.2f}".format(rng.uniform(0, 500)),
+}
+
+
+def random_time(rng, format):
+    return time.strftime(format, time.gmtime(DATE_START + int(rng.random() * DATE_RANGE)))
+
+
+def open_events(path, mode):
+    """Opens an NDJSON file, gzipped if it ends with .gz; "-" is stdin/stdout."""
+    if path == "-":
+        return sys.stdin.buffer if "r" in mode else sys.stdout
+    if path.endswith(".gz"):
+        return gzip.open(path, mode if "b" in mode else mode + "t", compresslevel=6)
+    return open(path, mode)
+
+
+def allows_null(schema):
+    """Whether a schema's own type (not following $refs) includes null."""
+    if not isinstance(schema, dict) or is_trivial(schema):
+        return schema is not False
+    types = schema.get("type")
+    return (
+        types == "null" or isinstance(types, list) and "null" in types
+        or schema.get("const", 0) is None or None in schema.get("enum", ())
+    )
+
+
+class WebhookEventGenerator:
+    """
+    Generates webhook event payloads from the payload schemas of a parsed
+    spec, seeded by ``seed``.
+
+    Every schema is turned into a function generating its values once, so
+    generating an event doesn't interpret the schema again. $refs (e.g. in
+    "components" output, or back to a schema being resolved) are planned
+    the first time they are reached.
+
+    Past max_depth objects only get their required properties and arrays
+    their minItems. As required properties can refer back to their own
+    schema, generation stops at stop_depth, the depth
+    webhooks.ExampleGenerator stops at: values there are null where the
+    schema allows it, objects and arrays empty otherwise.
+    """
+
+    stop_depth = 32
+
+    def __init__(self, spec, events=None, seed=0, array_mean=WEBHOOK_EVENT_ARRAY_MEAN,
+                 array_max=WEBHOOK_EVENT_ARRAY_MAX, max_depth=WEBHOOK_EVENT_MAX_DEPTH):
+        self.spec = spec
+        self.random = random.Random(seed)
+        # floor() of an exponential variate is geometric, this rate gives it array_mean
+        self.array_rate = math.log1p(1 / array_mean) if array_mean > 0 else math.inf
+        self.array_max = array_max
+        self.max_depth = max_depth
+        self.version = spec["info"]["version"]
+        self._plans = {}
+        self.events = [
+            (each, self.plan(event_schema(spec, each["event"])))
+            for each in WEBHOOKS
+            if each["event"] in spec.get("webhooks", {})
+            and (not events or any(fnmatch.fnmatch(each["event"], pattern) for pattern in events))
+        ]
+        if not self.events:
+            raise ValueError("No webhook events to generate")
+        # event_ids are this prefix and the number of the event
+        self.prefix = self.random.getrandbits(64)
+        self.count = 0
+
+    def plan(self, schema, name=""):
+        """Returns a function(depth) generating values of schema for a field called name."""
+        key = (id(schema), name)
+        if key not in self._plans:
+            # The schema is kept so its id can't be reused
+            self._plans[key] = (schema, self._plan(schema, name))
+        return self._plans[key][1]
+
+    def _plan(self, schema, name):
+        rng = self.random
+        if not isinstance(schema, dict) or is_trivial(schema):
+            return self._choice(WORDS)
+        if "$ref" in schema:
+            target = self.spec["components"]["schemas"][schema["$ref"].split("/")[3]]
+            return lambda depth: self.plan(target, name)(depth)
+        if "const" in schema:
+            return lambda depth: schema["const"]
+        if "enum" in schema:
+            return self._choice(schema["enum"])
+        if schema.get("allOf"):
+            merged = {key: value for key, value in schema.items() if key != "allOf"}
+            for entry in schema["allOf"]:
+                merged.update((key, value) for key, value in entry.items() if key not in ("properties", "required"))
+                merged.setdefault("properties", {}).update(entry.get("properties", {}))
+                merged["required"] = merged.get("required", []) + entry.get("required", [])
+            return self.plan(merged, name)
+        for keyword in ("oneOf", "anyOf"):
+            if schema.get(keyword):
+                base = {key: value for key, value in schema.items() if key != keyword}
+                options = [self.plan(dict(base, **option), name) for option in schema[keyword]]
+                choose = self._choice(options)
+                nullable = [plan for option, plan in zip(schema[keyword], options) if allows_null(option)]
+                if not nullable:
+                    return lambda depth: choose(depth)(depth)
+                stop_depth = self.stop_depth
+                return lambda depth: (nullable[0] if depth >= stop_depth else choose(depth))(depth)
+
+        types = schema.get("type") or ("object" if "properties" in schema else "string")
+        types = [types] if isinstance(types, str) else types
+        value_type = next((each for each in types if each != "null"), None)
+        if value_type is None:
+            return lambda depth: None
+        generate = getattr(self, "_plan_" + value_type)(schema, name)
+        if "null" not in types:
+            return generate
+        stop_depth = self.stop_depth
+        return lambda depth: None if depth >= stop_depth or rng.random() < NULL_RATE else generate(depth)
+
+    def _plan_object(self, schema, name):
+        required = set(schema.get("required", ()))
+        properties = [
+            (key, self.plan(value, key), key in required) for key, value in (schema.get("properties") or {}).items()
+        ]
+        max_depth, stop_depth = self.max_depth, self.stop_depth
+
+        def generate(depth):
+            if depth >= stop_depth:
+                return {}
+            if depth >= max_depth:
+                return {key: value(depth + 1) for key, value, is_required in properties if is_required}
+            return {key: value(depth + 1) for key, value, _ in properties}
+
+        return generate
+
+    def _plan_array(self, schema, name):
+        rng, rate, max_depth, stop_depth = self.random, self.array_rate, self.max_depth, self.stop_depth
+        item = self.plan(schema.get("items", {}), name)
+        min_items = schema.get("minItems", 0)
+        max_items = min(schema.get("maxItems", self.array_max), max(self.array_max, min_items))
+
+        def generate(depth):
+            if depth >= stop_depth:
+                return []
+            size = min_items if depth >= max_depth else min(max(int(rng.expovariate(rate)), min_items), max_items)
+            return [item(depth + 1) for _ in range(size)]
+
+        return generate
+
+    @staticmethod
+    def _bounds(schema, default_min, default_max, step):
+        """
+        Returns the (low, high) range of values of a number schema: its
+        overlap with default_min to default_max, so e.g. int32 fields still
+        get realistic values, or the part of the schema's range nearest to it.
+        """
+        low = schema.get("minimum", default_min)
+        if "exclusiveMinimum" in schema:
+            low = max(low, schema["exclusiveMinimum"] + step)
+        high = schema.get("maximum", max(default_max, low))
+        if "exclusiveMaximum" in schema:
+            high = min(high, schema["exclusiveMaximum"] - step)
+        span = default_max - default_min
+        if low > default_max:
+            return low, min(high, low + span)
+        if high < default_min:
+            return max(low, high - span), high
+        return max(low, default_min), min(high, default_max)
+
+    def _plan_integer(self, schema, name):
+        is_id = name == "id" or name.endswith("_id")
+        low, high = self._bounds(schema, 1 if is_id else 0, 999999 if is_id else 100, 1)
+        low, high = math.ceil(low), math.floor(high)
+        rand, count = self.random.random, high - low + 1
+        return lambda depth: low + int(rand() * count)
+
+    def _plan_number(self, schema, name):
+        low, high = self._bounds(schema, 0, 500, 0.01)
+        uniform = self.random.uniform
+        return lambda depth: round(uniform(low, high), 2)
+
+    def _plan_boolean(self, schema, name):
+        rng = self.random
+        return lambda depth: rng.random() < 0.5
+
+    def _plan_string(self, schema, name):
+        min_length, max_length = schema.get("minLength", 0), schema.get("maxLength")
+        pattern = re.compile(schema["pattern"]) if "pattern" in schema else None
+        # Used when a generated value doesn't match the pattern
+        fallback = None
+        if pattern:
+            candidates = list(schema.get("examples") or ()) + ["0", "0.00", "a", "example"]
+            fallback = next((each for each in candidates if isinstance(each, str) and pattern.search(each)), None)
+
+        def fit(value):
+            if len(value) < min_length:
+                value += "x" * (min_length - len(value))
+            if max_length is not None:
+                value = value[:max_length]
+            if pattern is not None and fallback is not None and not pattern.search(value):
+                value = fallback
+            return value
+
+        format = schema.get("format") or ("email" if name.endswith("email") else None)
+        examples = [value for value in schema.get("examples") or () if isinstance(value, str)]
+        if examples or format not in FORMAT_VALUES:
+            hint = next((values for key, values in NAME_VALUES.items() if key in name), WORDS)
+            # Values picked from a list are fitted to the schema up front
+            return self._choice([fit(value) for value in examples or hint])
+        value = partial(FORMAT_VALUES[format], self.random)
+        if not min_length and max_length is None and pattern is None:
+            return lambda depth: value()
+        return lambda depth: fit(value())
+
+    def _choice(self, values):
+        """Returns a function(depth) picking one of values, quicker than Random.choice."""
+        values, rand = list(values), self.random.random
+        count = len(values)
+        return lambda depth: values[int(rand() * count)]
+
+    def event_id(self, number):
+        """
+        A UUID of the generator's prefix and number, unique for every
+        number below 2**62 (the variant bits take the top two).
+        """
+        return str(uuid.UUID(int=self.prefix << 64 | number, version=4))
+
+    def generate(self):
+        """Returns the next event payload."""
+        each, generate = self.random.choice(self.events)
+        payload = generate(0)
+        payload["api_version"] = self.version
+        payload["object"] = each["object"]
+        payload["event_id"] = self.event_id(self.count)
+        payload["event_type"] = each["event"]
+        if isinstance(payload.get("webhook"), dict):
+            payload["webhook"]["events"] = [each["event"]]
+        self.count += 1
+        return payload
+
+    def __iter__(self):
+        while True:
+            yield self.generate()
+
+
+def write_events(generator, f, count):
+    """Writes count events of generator to the text file f as NDJSON."""
+    dumps = json.JSONEncoder(separators=(",", ":")).encode
+    for _ in range(count):
+        f.write(dumps(generator.generate()))
+        f.write("\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic webhook events as NDJSON")
+    parser.add_argument("spec", help="processed admin spec (YAML or JSON)")
+    parser.add_argument("--count", type=int, default=1000, help="events to generate")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--events", nargs="*", metavar="PATTERN", help="event globs, default all")
+    parser.add_argument("--output", default="-", help="NDJSON file, gzipped if it ends with .gz, default stdout")
+    args = parser.parse_args(argv)
+
+    generator = WebhookEventGenerator(load_spec(args.spec), args.events, args.seed)
+    start = time.perf_counter()
+    f = open_events(args.output, "w")
+    try:
+        write_events(generator, f, args.count)
+    finally:
+        if f is not sys.stdout:
+            f.close()
+    elapsed = time.perf_counter() - start
+    print("Generated {} events in {:.1f}s ({:.0f}/s)".format(
+        args.count, elapsed, args.count / elapsed if elapsed else 0
+    ), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
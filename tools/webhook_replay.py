@@ -0,0 +1,179 @@
+"""
+Replays webhook events to a receiver for load testing.
+
+POSTs the events of an NDJSON file, e.g. from webhook_events.py, to a
+webhook receiver at a fixed rate and with a number of requests in flight:
+
+    python webhook_replay.py http://127.0.0.1:9000/webhook/ --input events.ndjson.gz --rate 200 --concurrency 8
+    python webhook_events.py ../public/api/admin/unstable.yaml --count 1000000 \
+        | python webhook_replay.py http://127.0.0.1:9000/webhook/ --rate 0
+
+Events are read and sent one at a time through a small queue, so memory
+use doesn't depend on the number of events. --rate 0 sends as fast as the
+receiver answers. Requests are not retried; the response statuses and a
+latency histogram are reported at the end.
+"""
+import argparse
+import json
+import queue
+import sys
+import threading
+import time
+from collections import Counter
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import FETCH_TIMEOUT
+from webhook_events import open_events
+
+# Latencies are counted per millisecond up to this, slower ones in the last bucket
+HISTOGRAM_MS = 10000
+
+
+class ReplayStats:
+    """Response statuses and latencies of the replayed events, in constant memory."""
+
+    def __init__(self):
+        self.statuses = Counter()
+        self.histogram = [0] * (HISTOGRAM_MS + 1)
+        self.sent = 0
+        self.max_latency = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, status, latency):
+        with self._lock:
+            self.sent += 1
+            self.statuses[status] += 1
+            self.histogram[min(int(latency * 1000), HISTOGRAM_MS)] += 1
+            self.max_latency = max(self.max_latency, latency)
+
+    def percentile(self, percent):
+        """The latency in seconds below which percent of the requests finished."""
+        target, seen = self.sent * percent / 100, 0
+        for ms, count in enumerate(self.histogram):
+            seen += count
+            if count and seen >= target:
+                return (ms + 1) / 1000 if ms < HISTOGRAM_MS else self.max_latency
+        return 0.0
+
+    def summary(self, elapsed):
+        ok = sum(count for status, count in self.statuses.items() if isinstance(status, int) and status < 300)
+        return {
+            "sent": self.sent,
+            "succeeded": ok,
+            "failed": self.sent - ok,
+            "statuses": {str(status): count for status, count in sorted(self.statuses.items(), key=str)},
+            "seconds": elapsed,
+            "rate": self.sent / elapsed if elapsed else 0.0,
+            "latency": {
+                "p50": self.percentile(50),
+                "p95": self.percentile(95),
+                "p99": self.percentile(99),
+                "max": self.max_latency,
+            },
+        }
+
+
+def create_replay_session(concurrency):
+    """A keep-alive session with a connection per worker and no retries."""
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency, max_retries=0)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def replay(lines, url, rate=0, concurrency=4, headers=None, timeout=FETCH_TIMEOUT, progress=None):
+    """
+    POSTs every non-empty line of lines (bytes of JSON) to url, starting at
+    most rate requests a second (0 for no limit) with up to concurrency in
+    flight. progress(stats) is called about every second. Returns the
+    ReplayStats and the elapsed seconds.
+    """
+    session = create_replay_session(concurrency)
+    headers = dict({"Content-Type": "application/json"}, **(headers or {}))
+    stats = ReplayStats()
+    pending = queue.Queue(maxsize=concurrency * 4)
+
+    def worker():
+        while True:
+            body = pending.get()
+            if body is None:
+                return
+            start = time.perf_counter()
+            try:
+                status = session.post(url, data=body, headers=headers, timeout=timeout).status_code
+            except requests.RequestException as e:
+                status = type(e).__name__
+            stats.record(status, time.perf_counter() - start)
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+
+    start = last_progress = time.perf_counter()
+    number = 0
+    try:
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            if rate:
+                delay = start + number / rate - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            pending.put(line)
+            number += 1
+            if progress and time.perf_counter() - last_progress >= 1:
+                last_progress = time.perf_counter()
+                progress(stats)
+    finally:
+        for _ in threads:
+            pending.put(None)
+        for thread in threads:
+            thread.join()
+        session.close()
+    return stats, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="POST webhook events from an NDJSON file to a receiver")
+    parser.add_argument("url", help="webhook receiver URL")
+    parser.add_argument("--input", default="-", help="NDJSON file, gzipped if it ends with .gz, default stdin")
+    parser.add_argument("--rate", type=float, default=100, help="events per second, 0 for no limit")
+    parser.add_argument("--concurrency", type=int, default=4, help="requests in flight")
+    parser.add_argument("--header", action="append", default=[], metavar="NAME:VALUE", help="extra request header")
+    parser.add_argument("--timeout", type=float, default=FETCH_TIMEOUT, help="seconds, per request")
+    parser.add_argument("--output", help="write the summary as JSON to this file")
+    args = parser.parse_args(argv)
+
+    headers = {}
+    for header in args.header:
+        name, _, value = header.partition(":")
+        headers[name.strip()] = value.strip()
+
+    def progress(stats):
+        print("Sent {} events".format(stats.sent), end="\r", file=sys.stderr)
+
+    f = open_events(args.input, "rb")
+    try:
+        stats, elapsed = replay(f, args.url, args.rate, args.concurrency, headers, args.timeout, progress)
+    finally:
+        if f is not sys.stdin.buffer:
+            f.close()
+        print(file=sys.stderr)
+
+    summary = stats.summary(elapsed)
+    print("Sent {sent} events in {seconds:.1f}s ({rate:.0f}/s), {failed} failed".format(**summary))
+    print("Statuses: " + ", ".join("{}: {}".format(status, count) for status, count in summary["statuses"].items()))
+    print("Latency ms: p50 {:.0f}, p95 {:.0f}, p99 {:.0f}, max {:.0f}".format(
+        *(summary["latency"][key] * 1000 for key in ("p50", "p95", "p99", "max"))
+    ))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,22 @@
 import copy
+import hashlib
+import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 
-from config import WEBHOOKS, CUSTOM_WEBHOOK_EVENT_PAYLOADS
-
-
-def generate_example(schema, depth=0):
-    """Recursively build a JSON example value from a schema."""
-    if not isinstance(schema, dict) or depth > 4:
-        return None
-    schema_type = schema.get("type", "object")
-    # Use explicit example/examples if provided
-    if "example" in schema:
-        return schema["example"]
-    if "examples" in schema and schema["examples"]:
-        return schema["examples"][0]
-    if schema_type == "object" or "properties" in schema:
-        props = schema.get("properties", {})
-        return {k: generate_example(v, depth + 1) for k, v in props.items()} if props else {}
-    if schema_type == "array":
-        item = generate_example(schema.get("items", {}), depth + 1)
-        return [item] if item is not None else []
+from config import (
+    WEBHOOKS,
+    CUSTOM_WEBHOOK_EVENT_PAYLOADS,
+    WEBHOOK_SCHEMA_OUTPUT,
+    EXAMPLE_MAX_NODES,
+    EXAMPLE_MAX_BYTES,
+)
+
+with open(__file__, "rb") as _f:
+    GENERATOR_HASH = hashlib.sha256(_f.read()).hexdigest()
+
+
+def _scalar_example(schema, schema_type):
     if schema_type == "integer":
         return schema.get("default", 0)
     if schema_type == "number":
@@ -43,12 +41,107 @@ def generate_example(schema, depth=0):
     return None
 
 
+def _count_nodes(value):
+    if isinstance(value, dict):
+        return 1 + sum(_count_nodes(v) for v in value.values())
+    if isinstance(value, list):
+        return 1 + sum(_count_nodes(v) for v in value)
+    return 1
+
+
+class ExampleGenerator:
+    """
+    Builds JSON example values from schemas within a size budget.
+
+    Examples are expanded one nesting level at a time and the deepest one
+    that stays within ``max_nodes`` values and ``max_bytes`` of JSON is
+    used, so large payloads are cut evenly instead of at a fixed depth.
+    Examples are memoized per schema object and depth, so schemas shared
+    between events (e.g. resolved by SchemaResolver) are only built once.
+    Returned examples are shared and must be treated as read-only.
+    """
+
+    max_depth = 32
+
+    def __init__(self, max_nodes=EXAMPLE_MAX_NODES, max_bytes=EXAMPLE_MAX_BYTES):
+        self.max_nodes = max_nodes
+        self.max_bytes = max_bytes
+        self._memo = {}
+
+    def generate(self, schema):
+        example, _, _ = self._build(schema, 0)
+        for depth in range(1, self.max_depth):
+            candidate, nodes, complete = self._build(schema, depth)
+            if nodes > self.max_nodes or len(json.dumps(candidate)) > self.max_bytes:
+                break
+            example = candidate
+            if complete:
+                break
+        return example
+
+    def _build(self, schema, depth):
+        """
+        Returns (example, node count, complete) for schema, expanding
+        ``depth`` levels of objects and arrays below it.
+        """
+        if not isinstance(schema, dict):
+            return None, 1, True
+        key = (id(schema), depth)
+        if key not in self._memo:
+            # The schema is kept in the memo so its id can't be reused
+            self._memo[key] = (schema,) + self._example(schema, depth)
+        return self._memo[key][1:]
+
+    def _example(self, schema, depth):
+        schema_type = schema.get("type", "object")
+        # Use explicit example/examples if provided
+        if "example" in schema:
+            return schema["example"], _count_nodes(schema["example"]), True
+        if "examples" in schema and schema["examples"]:
+            return schema["examples"][0], _count_nodes(schema["examples"][0]), True
+        if schema_type == "object" or "properties" in schema:
+            props = schema.get("properties", {})
+            if props and depth == 0:
+                return None, 1, False
+            example, nodes, complete = {}, 1, True
+            for k, v in props.items():
+                example[k], child_nodes, child_complete = self._build(v, depth - 1)
+                nodes += child_nodes
+                complete = complete and child_complete
+            return example, nodes, complete
+        if schema_type == "array":
+            if depth == 0:
+                return None, 1, False
+            item, nodes, complete = self._build(schema.get("items", {}), depth - 1)
+            return ([item] if item is not None else []), nodes + 1, complete
+        return _scalar_example(schema, schema_type), 1, True
+
+
+def generate_example(schema, max_nodes=EXAMPLE_MAX_NODES, max_bytes=EXAMPLE_MAX_BYTES):
+    """Build a JSON example value from a schema within a size budget."""
+    return ExampleGenerator(max_nodes, max_bytes).generate(schema)
+
+
 def get_schema(spec, ref):
     name = ref.split("/")[3]
     schema = copy.deepcopy(spec["components"]["schemas"][name])
     return schema
 
 
+def _copy_schema(schema):
+    """
+    Copy only the parts of a component schema that the handler mutates
+    (the schema dict, its properties and each property dict).
+    """
+    schema = dict(schema)
+    if isinstance(schema.get("properties"), dict):
+        schema["properties"] = {
+            k: dict(v) if isinstance(v, dict) else v
+            for k, v in schema["properties"].items()
+        }
+    return schema
+
+
 def _merge_resolved(value, resolved):
     """
     Merge a resolved schema into a field dict, preserving sibling metadata
@@ -67,72 +160,180 @@ def _merge_resolved(value, resolved):
             value[k] = v
 
 
-def webhook_data_schema_handler(spec, data_schema):
-
-    for key, value in data_schema.get("properties", {}).items():
-
-        # remove readOnly from all properties
-        if value.get("readOnly"):
-            del value["readOnly"]
-
-        # nested items array
-        if isinstance(value, dict) and value.get("items", {}).get("$ref"):
-            nested_schema = get_schema(spec, value["items"]["$ref"])
-            webhook_data_schema_handler(spec, nested_schema)
-            value["items"].clear()
-            value["items"].update(nested_schema)
-
-        # $ref
-        elif isinstance(value, dict) and value.get("$ref"):
-            nested_schema = get_schema(spec, value["$ref"])
-            webhook_data_schema_handler(spec, nested_schema)
-            _merge_resolved(value, nested_schema)
-
-        # allOf
-        elif isinstance(value, dict) and value.get("allOf"):
-            all_of = value["allOf"]
-            # Merge all allOf entries (resolve $ref entries, merge plain schemas)
-            merged = {}
-            for entry in all_of:
-                if entry.get("$ref"):
-                    nested_schema = get_schema(spec, entry["$ref"])
-                    webhook_data_schema_handler(spec, nested_schema)
-                    # Merge properties from each allOf entry
-                    for prop_key, prop_val in nested_schema.get("properties", {}).items():
-                        merged.setdefault("properties", {})[prop_key] = prop_val
-                    if "type" in nested_schema:
-                        merged["type"] = nested_schema["type"]
-                else:
-                    # Plain schema fragment (e.g. additional properties)
-                    for prop_key, prop_val in entry.get("properties", {}).items():
-                        merged.setdefault("properties", {})[prop_key] = prop_val
-                    if "type" in entry:
-                        merged["type"] = entry["type"]
-            if "type" not in merged:
-                merged["type"] = "object"
-            _merge_resolved(value, merged)
-
-        # oneOf — resolve all variants, merge their properties
-        elif (
-            isinstance(value, dict)
-            and value.get("oneOf")
-            and isinstance(value["oneOf"], list)
-        ):
-            one_of = value["oneOf"]
-            merged = {}
-            for entry in one_of:
-                if entry.get("$ref"):
-                    nested_schema = get_schema(spec, entry["$ref"])
-                    webhook_data_schema_handler(spec, nested_schema)
-                    for prop_key, prop_val in nested_schema.get("properties", {}).items():
-                        merged.setdefault("properties", {})[prop_key] = prop_val
-                    if "type" in nested_schema:
-                        merged["type"] = nested_schema["type"]
-            if "type" not in merged:
-                merged["type"] = "object"
-            _merge_resolved(value, merged)
-
-    return data_schema
+class SchemaStore:
+    """
+    Content-addressed store of resolved schemas shared between specs, e.g.
+    the admin API versions of one refresh.
+
+    Resolved schemas are keyed by the hashes of every component schema they
+    depend on, so a schema that is identical (along with everything it
+    references) in another version is reused instead of resolved again.
+    Resolvers using the store also share its example generator.
+    """
+
+    def __init__(self):
+        self.resolved = {}
+        self.examples = ExampleGenerator()
+
+
+class SchemaResolver:
+    """
+    Resolves component schemas of a single spec for webhook payloads.
+
+    Each component is resolved once and cached, so resolved schemas are
+    shared between every event and field that references them and must be
+    treated as read-only. A reference back to a component that is still
+    being resolved is left as a ``$ref`` instead of recursing forever, so
+    a component that can reach one being resolved is resolved again where
+    it's referenced rather than cached, its result depending on where the
+    reference is. Output is thus the same whichever event resolves a
+    component first. Examples of the resolved schemas are memoized in
+    ``examples``.
+
+    With a ``store``, resolved schemas outside of reference cycles are also
+    looked up in and added to the store.
+    """
+
+    def __init__(self, spec, store=None):
+        self.spec = spec
+        self.store = store
+        self.cache = {}
+        self.examples = store.examples if store else ExampleGenerator()
+        self.stats = {"refs_resolved": 0, "ref_cache_hits": 0, "store_hits": 0, "copies": 0}
+        self._resolving = set()
+        self._closures = {}
+        self._graph = None
+        self._cyclic = None
+        self._hashes = {}
+
+    @property
+    def graph(self):
+        if self._graph is None:
+            self._graph = schema_dependency_graph(self.spec)
+        return self._graph
+
+    def schema_hash(self, name):
+        if name not in self._hashes:
+            self._hashes[name] = schema_hash(self.spec["components"]["schemas"].get(name))
+        return self._hashes[name]
+
+    def closure(self, name):
+        if name not in self._closures:
+            self._closures[name] = schema_closure(self.graph, name)
+        return self._closures[name]
+
+    def store_key(self, name):
+        """
+        Returns the store key of a component: a hash of its name and of
+        every schema in its closure. None if the closure has a cycle, as
+        the result then depends on the order schemas are resolved in.
+        """
+        if self._cyclic is None:
+            self._cyclic = cyclic_schemas(self.graph)
+        closure = self.closure(name)
+        if closure & self._cyclic:
+            return None
+        return schema_hash({"name": name, "schemas": {n: self.schema_hash(n) for n in closure}})
+
+    def resolve(self, ref):
+        """Return the resolved schema for ``ref``, or None if ``ref`` is cyclic."""
+        name = ref.split("/")[3]
+        if name in self._resolving:
+            return None
+        if self._resolving and not self._resolving.isdisjoint(self.closure(name)):
+            # Cut where it refers back to a component being resolved
+            return self._resolve(name, None, cache=False)
+        if name in self.cache:
+            self.stats["ref_cache_hits"] += 1
+            return self.cache[name]
+
+        key = self.store_key(name) if self.store is not None else None
+        if key is not None and key in self.store.resolved:
+            self.stats["store_hits"] += 1
+            self.cache[name] = self.store.resolved[key]
+            return self.cache[name]
+        return self._resolve(name, key)
+
+    def _resolve(self, name, key, cache=True):
+        self._resolving.add(name)
+        self.stats["refs_resolved"] += 1
+        self.stats["copies"] += 1
+        try:
+            schema = _copy_schema(self.spec["components"]["schemas"][name])
+            resolved = self.handle(schema)
+        finally:
+            self._resolving.discard(name)
+        if cache:
+            self.cache[name] = resolved
+        if key is not None:
+            self.store.resolved[key] = resolved
+        return resolved
+
+    def _merge_entries(self, entries, refs_only=False):
+        """
+        Merge the properties of allOf/oneOf entries into a single object
+        schema. Returns None if any referenced entry is cyclic.
+        """
+        merged = {}
+        for entry in entries:
+            if entry.get("$ref"):
+                entry = self.resolve(entry["$ref"])
+                if entry is None:
+                    return None
+            elif refs_only:
+                continue
+            for prop_key, prop_val in entry.get("properties", {}).items():
+                merged.setdefault("properties", {})[prop_key] = prop_val
+            if "type" in entry:
+                merged["type"] = entry["type"]
+        if "type" not in merged:
+            merged["type"] = "object"
+        return merged
+
+    def handle(self, data_schema):
+        """Resolve the properties of ``data_schema`` in place."""
+        for key, value in data_schema.get("properties", {}).items():
+
+            # remove readOnly from all properties
+            if value.get("readOnly"):
+                del value["readOnly"]
+
+            # nested items array
+            if isinstance(value, dict) and value.get("items", {}).get("$ref"):
+                nested_schema = self.resolve(value["items"]["$ref"])
+                if nested_schema is not None:
+                    value["items"] = dict(nested_schema)
+                    self.stats["copies"] += 1
+
+            # $ref
+            elif isinstance(value, dict) and value.get("$ref"):
+                nested_schema = self.resolve(value["$ref"])
+                if nested_schema is not None:
+                    _merge_resolved(value, nested_schema)
+
+            # allOf — resolve $ref entries, merge plain schema fragments
+            elif isinstance(value, dict) and value.get("allOf"):
+                merged = self._merge_entries(value["allOf"])
+                if merged is not None:
+                    _merge_resolved(value, merged)
+
+            # oneOf — resolve all variants, merge their properties
+            elif (
+                isinstance(value, dict)
+                and value.get("oneOf")
+                and isinstance(value["oneOf"], list)
+            ):
+                merged = self._merge_entries(value["oneOf"], refs_only=True)
+                if merged is not None:
+                    _merge_resolved(value, merged)
+
+        return data_schema
+
+
+def webhook_data_schema_handler(spec, data_schema, resolver=None):
+    if resolver is None:
+        resolver = SchemaResolver(spec)
+    return resolver.handle(data_schema)
 
 
 def get_custom_webhook_event_payloads(event):
@@ -145,109 +346,315 @@ def get_custom_webhook_event_payloads(event):
     return None
 
 
-def webhook_schema_generator(spec):
-    version = spec["info"]["version"]
-    webhook_schema = {}
-    for each in WEBHOOKS:
+def webhook_data_schema_name(webhook):
+    """
+    Returns the components.schemas name used for a webhook's data schema,
+    e.g. OrderWebhookData or ProductDeletedWebhookData for custom payloads.
+    """
+    if webhook["schema_ref"]:
+        name = webhook["schema_ref"].split("/")[3]
+    else:
+        name = "".join(part.capitalize() for part in webhook["event"].split("."))
+    return name + "WebhookData"
+
+
+def _property_refs(value):
+    """Returns the $refs of a property that SchemaResolver.handle resolves."""
+    if not isinstance(value, dict):
+        return []
+    if value.get("items", {}).get("$ref"):
+        return [value["items"]["$ref"]]
+    if value.get("$ref"):
+        return [value["$ref"]]
+    if value.get("allOf"):
+        return [entry["$ref"] for entry in value["allOf"] if entry.get("$ref")]
+    if value.get("oneOf") and isinstance(value["oneOf"], list):
+        return [entry["$ref"] for entry in value["oneOf"] if entry.get("$ref")]
+    return []
+
+
+def schema_dependency_graph(spec):
+    """
+    Returns a mapping of each component schema name to the names of the
+    component schemas its webhook resolution directly depends on.
+    """
+    graph = {}
+    for name, schema in spec["components"]["schemas"].items():
+        deps = set()
+        for value in schema.get("properties", {}).values():
+            deps.update(ref.split("/")[3] for ref in _property_refs(value))
+        graph[name] = deps
+    return graph
+
+
+def schema_closure(graph, name):
+    """Returns name and every schema it transitively depends on."""
+    closure = set()
+    stack = [name]
+    while stack:
+        current = stack.pop()
+        if current in closure:
+            continue
+        closure.add(current)
+        stack.extend(graph.get(current, ()))
+    return closure
+
+
+def cyclic_schemas(graph):
+    """Returns the names of the schemas that (transitively) reference themselves."""
+    return {name for name, deps in graph.items() if any(name in schema_closure(graph, dep) for dep in deps)}
+
+
+def schema_hash(schema):
+    return hashlib.sha256(json.dumps(schema, sort_keys=True).encode()).hexdigest()
+
+
+def webhook_fingerprints(spec, output=WEBHOOK_SCHEMA_OUTPUT, events=WEBHOOKS, resolver=None):
+    """
+    Returns a hash per webhook event covering everything its output depends
+    on: the event config, the API version, the output mode, the generator
+    source and every component schema in its transitive closure.
+    """
+    resolver = resolver or SchemaResolver(spec)
+    fingerprints = {}
+    for each in events:
+        inputs = {
+            "webhook": each,
+            "version": spec["info"]["version"],
+            "output": output,
+            "example_budget": [EXAMPLE_MAX_NODES, EXAMPLE_MAX_BYTES],
+            "generator": GENERATOR_HASH,
+        }
         if each["schema_ref"]:
-            schema = get_schema(spec, each["schema_ref"])
-            cleaned_data_schema = webhook_data_schema_handler(spec, schema)
+            closure = schema_closure(resolver.graph, each["schema_ref"].split("/")[3])
+            inputs["schemas"] = {name: resolver.schema_hash(name) for name in closure}
         else:
-            cleaned_data_schema = get_custom_webhook_event_payloads(each["event"])
-
-        # Ensure the data schema has type: object
-        if isinstance(cleaned_data_schema, dict) and "type" not in cleaned_data_schema:
-            cleaned_data_schema["type"] = "object"
-
-        # Build a complete example payload for the code sample panel
-        payload_example = {
-            "api_version": version,
-            "object": each["object"],
-            "data": generate_example(cleaned_data_schema),
-            "event_id": "a7a26ff2-e851-45b6-9634-d595f45458b7",
-            "event_type": each["event"],
-            "webhook": {
-                "id": 1,
-                "store": "example",
-                "events": [each["event"]],
-                "target": "https://example.com/webhook/",
-            },
-        }
+            inputs["payload"] = get_custom_webhook_event_payloads(each["event"])
+        fingerprints[each["event"]] = schema_hash(inputs)
+    return fingerprints
 
-        webhook_schema[each["event"]] = {
-            "post": {
-                "tags": [each["tag"]],
-                "security": [],
-                "description": each["description"],
-                "requestBody": {
-                    "content": {
-                        "application/json": {
-                            "example": payload_example,
-                            "schema": {
-                                "type": "object",
-                                "properties": {
-                                    "api_version": {
-                                        "type": "string",
-                                        "examples": [version],
-                                        "description": "API Version of the object data schema.",
-                                    },
-                                    "object": {
-                                        "type": "string",
-                                        "examples": [each["object"]],
-                                        "description": "Object data type.",
-                                    },
-                                    "data": cleaned_data_schema,
-                                    "event_id": {
-                                        "type": "string",
-                                        "format": "uuid",
-                                        "description": "Unique id associated with this webhook event.",
-                                    },
-                                    "event_type": {
-                                        "type": "string",
-                                        "examples": [each["event"]],
-                                        "description": "Webhook event type of the current event.",
-                                    },
-                                    "webhook": {
-                                        "type": "object",
-                                        "properties": {
-                                            "id": {
-                                                "type": "integer",
-                                                "description": "The webhook sending the event.",
-                                            },
-                                            "store": {
-                                                "type": "string",
-                                                "nullable": True,
-                                                "examples": ["example"],
-                                                "description": "The store identifier.",
-                                            },
-                                            "events": {
-                                                "description": "See webhook docs for available events.",
-                                                "items": {"type": "string"},
-                                                "type": "array",
-                                            },
-                                            "target": {
-                                                "description": "Full url for your webhook receiver endpoint.",
-                                                "format": "uri",
-                                                "maxLength": 255,
-                                                "title": "Webhook target",
-                                                "type": "string",
-                                            },
+
+def build_webhook(spec, resolver, each, output=WEBHOOK_SCHEMA_OUTPUT):
+    """
+    Returns the webhooks path item for a single event, and the
+    [name, schema] of its data schema component in "components" output.
+    """
+    version = spec["info"]["version"]
+    if each["schema_ref"]:
+        resolved = resolver.resolve(each["schema_ref"])
+        # Shallow copy, the resolved schema is shared with other events
+        cleaned_data_schema = dict(resolved)
+        resolver.stats["copies"] += 1
+        # Examples are memoized by schema, so generate them from the shared one
+        data_example = resolver.examples.generate(resolved)
+    else:
+        cleaned_data_schema = get_custom_webhook_event_payloads(each["event"])
+        # Not memoized, the payloads are replaced when config is reloaded
+        data_example = generate_example(cleaned_data_schema)
+
+    # Ensure the data schema has type: object
+    if isinstance(cleaned_data_schema, dict) and "type" not in cleaned_data_schema:
+        cleaned_data_schema["type"] = "object"
+
+    # Build a complete example payload for the code sample panel
+    payload_example = {
+        "api_version": version,
+        "object": each["object"],
+        "data": data_example,
+        "event_id": "a7a26ff2-e851-45b6-9634-d595f45458b7",
+        "event_type": each["event"],
+        "webhook": {
+            "id": 1,
+            "store": "example",
+            "events": [each["event"]],
+            "target": "https://example.com/webhook/",
+        },
+    }
+
+    data_schema = cleaned_data_schema
+    component = None
+    if output == "components" and isinstance(cleaned_data_schema, dict):
+        component = [webhook_data_schema_name(each), cleaned_data_schema]
+        data_schema = {"$ref": "#/components/schemas/" + component[0]}
+
+    path_item = {
+        "post": {
+            "tags": [each["tag"]],
+            "security": [],
+            "description": each["description"],
+            "requestBody": {
+                "content": {
+                    "application/json": {
+                        "example": payload_example,
+                        "schema": {
+                            "type": "object",
+                            "properties": {
+                                "api_version": {
+                                    "type": "string",
+                                    "examples": [version],
+                                    "description": "API Version of the object data schema.",
+                                },
+                                "object": {
+                                    "type": "string",
+                                    "examples": [each["object"]],
+                                    "description": "Object data type.",
+                                },
+                                "data": data_schema,
+                                "event_id": {
+                                    "type": "string",
+                                    "format": "uuid",
+                                    "description": "Unique id associated with this webhook event.",
+                                },
+                                "event_type": {
+                                    "type": "string",
+                                    "examples": [each["event"]],
+                                    "description": "Webhook event type of the current event.",
+                                },
+                                "webhook": {
+                                    "type": "object",
+                                    "properties": {
+                                        "id": {
+                                            "type": "integer",
+                                            "description": "The webhook sending the event.",
+                                        },
+                                        "store": {
+                                            "type": ["string", "null"],
+                                            "examples": ["example"],
+                                            "description": "The store identifier.",
+                                        },
+                                        "events": {
+                                            "description": "See webhook docs for available events.",
+                                            "items": {"type": "string"},
+                                            "type": "array",
+                                        },
+                                        "target": {
+                                            "description": "Full url for your webhook receiver endpoint.",
+                                            "format": "uri",
+                                            "maxLength": 255,
+                                            "title": "Webhook target",
+                                            "type": "string",
                                         },
                                     },
-                                }
+                                },
                             }
                         }
-                    },
-                },
-                "responses": {
-                    "200": {
-                        "description": "Return a 200 status to indicate that the data was received successfully."
-                    },
-                    "410": {
-                        "description": "Indicates the webhook target is no longer available and will be disabled."
                     }
                 },
             },
-        }
+            "responses": {
+                "200": {
+                    "description": "Return a 200 status to indicate that the data was received successfully."
+                },
+                "410": {
+                    "description": "Indicates the webhook target is no longer available and will be disabled."
+                }
+            },
+        },
+    }
+
+    return path_item, component
+
+
+# Per-process state of build_webhooks workers, set up by _init_worker
+_worker = {}
+
+
+def _init_worker(spec, output):
+    _worker["spec"] = spec
+    _worker["output"] = output
+    _worker["resolver"] = SchemaResolver(spec)
+
+
+def _build_chunk(events):
+    return [build_webhook(_worker["spec"], _worker["resolver"], each, _worker["output"]) for each in events]
+
+
+def build_webhooks(spec, resolver, events, output=WEBHOOK_SCHEMA_OUTPUT, workers=1):
+    """
+    Returns build_webhook's result for each event, in order. With workers > 1
+    the events are split into contiguous chunks built in a process pool; the
+    spec is sent to each worker once and resolved there, so the results are
+    the same as building them serially.
+    """
+    if workers <= 1 or len(events) < 2:
+        return [build_webhook(spec, resolver, each, output) for each in events]
+    size = -(-len(events) // workers)
+    chunks = [events[i:i + size] for i in range(0, len(events), size)]
+    with ProcessPoolExecutor(
+        max_workers=len(chunks),
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(spec, output),
+    ) as executor:
+        return [result for chunk in executor.map(_build_chunk, chunks) for result in chunk]
+
+
+def generate_webhooks(spec, output=WEBHOOK_SCHEMA_OUTPUT, previous=None, events=WEBHOOKS, resolver=None, workers=1):
+    """
+    Returns the webhooks section for an admin spec, a cache entry per event
+    and the list of events that were regenerated.
+
+    ``events`` defaults to config.WEBHOOKS. ``previous`` is the cache from
+    an earlier run; events whose fingerprint is unchanged reuse its output
+    instead of being regenerated. With output="components" each data schema
+    is added to the spec's components.schemas once and referenced from
+    every event using it, instead of being inlined in each event's
+    requestBody. A ``resolver`` for the spec may be passed in to reuse
+    already resolved schemas or inspect its stats, and ``workers`` > 1 builds
+    the regenerated events in a process pool (see build_webhooks).
+    """
+    if output not in ("inline", "components"):
+        raise ValueError("Unknown webhook schema output: {}".format(output))
+    cache = dict(previous or {})
+    resolver = resolver or SchemaResolver(spec)
+    fingerprints = webhook_fingerprints(spec, output, events, resolver)
+    stale = [
+        each for each in events
+        if not cache.get(each["event"]) or cache[each["event"]]["fingerprint"] != fingerprints[each["event"]]
+    ]
+    built = build_webhooks(spec, resolver, stale, output, workers)
+    for each, (path_item, component) in zip(stale, built):
+        cache[each["event"]] = {"fingerprint": fingerprints[each["event"]], "webhook": path_item, "component": component}
+
+    webhook_schema = {}
+    entries = {}
+    for each in events:
+        entry = cache[each["event"]]
+        if entry["component"]:
+            name, schema = entry["component"]
+            spec["components"]["schemas"][name] = schema
+        webhook_schema[each["event"]] = entry["webhook"]
+        entries[each["event"]] = entry
+    regenerated = [each["event"] for each in stale]
+    return webhook_schema, entries, regenerated
+
+
+def iter_webhooks(spec, output=WEBHOOK_SCHEMA_OUTPUT, previous=None, events=WEBHOOKS, resolver=None):
+    """
+    Streaming counterpart of generate_webhooks: yields (event, cache entry,
+    regenerated) for each of ``events`` in order, building stale events
+    only when they're reached, so a consumer that writes each webhook out
+    and drops it holds one at a time. Entries are popped from ``previous``
+    as they're used. With output="components" each data schema is added to
+    the spec's components when its event is yielded.
+    """
+    if output not in ("inline", "components"):
+        raise ValueError("Unknown webhook schema output: {}".format(output))
+    previous = dict(previous or {})
+    resolver = resolver or SchemaResolver(spec)
+    fingerprints = webhook_fingerprints(spec, output, events, resolver)
+    for each in events:
+        entry = previous.pop(each["event"], None)
+        fingerprint = fingerprints[each["event"]]
+        regenerated = not entry or entry["fingerprint"] != fingerprint
+        if regenerated:
+            path_item, component = build_webhook(spec, resolver, each, output)
+            entry = {"fingerprint": fingerprint, "webhook": path_item, "component": component}
+        if entry["component"]:
+            name, schema = entry["component"]
+            spec["components"]["schemas"][name] = schema
+        yield each["event"], entry, regenerated
+
 
-    return webhook_schema
+def webhook_schema_generator(spec, output=WEBHOOK_SCHEMA_OUTPUT, events=WEBHOOKS):
+    return generate_webhooks(spec, output, events=events)[0]